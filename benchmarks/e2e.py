@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+End-to-end client benchmark against local stand-ins for RSTUF.
+
+For every artifact size, a synthetic repository of signed wheels is built,
+each wheel with the in-toto links of a supply chain of ``--links`` steps,
+and its metadata and targets are served by a local static server. Target
+additions go to an in-process fake of the RSTUF targets and task API.
+Reports throughput and p50/p99 latency of ``add_target()``,
+``upload_file()``, ``download()`` of single targets without verification,
+in-toto verification of a downloaded target, and ``download()`` of all
+targets at once with verification.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import parse
+
+from in_toto.models.layout import Inspection, Layout, Step
+from in_toto.models.link import FILENAME_FORMAT, Link
+from in_toto.models.metadata import Metablock
+from securesystemslib import interface
+
+from synthetic import (PACKAGE_DIR, build_repo, load_client, serve,
+                       target_file)
+
+DEFAULT_TARGETS = 20
+DEFAULT_LINKS = 3
+DEFAULT_SIZES = "10000,1000000,10000000"
+DEFAULT_ROUNDS = 3
+DEFAULT_LATENCY = 5  # ms
+BUILD_COMMAND = ["python3", "-m", "build", "--wheel"]
+PRIVATE_KEY = os.path.join(PACKAGE_DIR, "private_keys", "alice")
+PUBLIC_KEY = os.path.join(PACKAGE_DIR, "layouts", "keys", "alice.pub")
+
+
+class _APIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately
+    disable_nagle_algorithm = True
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        time.sleep(self.server.latency)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _targets(self):
+        length = int(self.headers.get("Content-Length", 0))
+        targets = json.loads(self.rfile.read(length))["targets"]
+        paths = [t["path"] if isinstance(t, dict) else t for t in targets]
+        self._reply(
+            202, {
+                "data": {
+                    "targets": paths,
+                    "task_id": self.server.accept(paths)
+                },
+                "message": "Job accepted"
+            })
+
+    do_POST = do_DELETE = _targets
+
+    def do_GET(self):
+        query = parse.parse_qs(parse.urlparse(self.path).query)
+        self._reply(
+            200, {
+                "data": {
+                    "task_id": query.get("task_id", [""])[0],
+                    "state": "SUCCESS",
+                    "result": {
+                        "status": True
+                    }
+                }
+            })
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeRSTUF(ThreadingHTTPServer):
+    """
+    In-process stand-in for the targets and task endpoints of the RSTUF
+    API. Every response is delayed by ``latency`` seconds, and every
+    addition or deletion is accepted as a task that already succeeded.
+    """
+    daemon_threads = True
+
+    def __init__(self, latency=0.0):
+        super().__init__(("127.0.0.1", 0), _APIHandler)
+        self.latency = latency
+        self.targets = 0
+        self.tasks = 0
+        self._lock = threading.Lock()
+
+    def accept(self, paths):
+        """Count the target ``paths`` of a request and return its task id"""
+        with self._lock:
+            self.targets += len(paths)
+            self.tasks += 1
+            return f"task-{self.tasks}"
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/api/v1/"
+
+
+@contextlib.contextmanager
+def fake_api(latency=0.0):
+    """Run a FakeRSTUF in a background thread and yield it"""
+    server = FakeRSTUF(latency)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _rules(*rules):
+    return [rule.split() for rule in rules]
+
+
+def supply_chain_layout(links, pubkey):
+    """
+    Return the layout of ``new_project_layout.toml`` for ``pubkey``, with
+    ``links - 2`` review steps between ``create`` and ``build`` that leave
+    the sources unchanged.
+    """
+    keyid = pubkey["keyid"]
+    reviews = [
+        Step(name=f"review_{i}",
+             pubkeys=[keyid],
+             expected_materials=_rules("MATCH * WITH PRODUCTS FROM create",
+                                       "DISALLOW *"),
+             expected_products=_rules("MATCH * WITH PRODUCTS FROM create",
+                                      "DISALLOW *"))
+        for i in range(links - 2)
+    ]
+    steps = [
+        Step(name="create",
+             pubkeys=[keyid],
+             expected_products=_rules("CREATE *")),
+        *reviews,
+        Step(name="build",
+             pubkeys=[keyid],
+             expected_materials=_rules(
+                 "MATCH src/* WITH PRODUCTS FROM create",
+                 "MATCH pyproject.toml WITH PRODUCTS FROM create",
+                 "ALLOW README.md", "DISALLOW *"),
+             expected_products=_rules("CREATE *-*-py3-none-any.whl",
+                                      "DISALLOW *"),
+             expected_command=BUILD_COMMAND),
+    ]
+    unzip = Inspection(
+        name="unzip",
+        run=["unzip", "*-*-py3-none-any.whl"],
+        expected_materials=_rules(
+            "MATCH *-*-py3-none-any.whl WITH PRODUCTS FROM build",
+            "ALLOW *.layout", "ALLOW *.pub", "DISALLOW *"),
+        expected_products=_rules(
+            "MATCH *.py WITH MATERIALS IN src/ FROM build",
+            "MATCH *-*-py3-none-any.whl WITH MATERIALS FROM unzip",
+            "ALLOW *-*.dist-info/*", "ALLOW *.layout", "ALLOW *.pub",
+            "DISALLOW *"))
+    return Layout(keys={keyid: pubkey}, steps=steps, inspect=[unzip])
+
+
+def project_files(name, size):
+    """Return the files of a project with a source module of ``size`` bytes"""
+    return {
+        "pyproject.toml":
+            f'[project]\nname = "{name}"\nversion = "1.0"\n'.encode(),
+        "README.md": f"# {name}\n".encode(),
+        "src/main.py": b"from payload import DATA\n",
+        "src/payload.py": random.Random(name).randbytes(size),
+    }
+
+
+def build_wheel(name, files):
+    """Return a stored wheel of the sources in ``files``"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for path, data in files.items():
+            if path.startswith("src/"):
+                archive.writestr(path[len("src/"):], data)
+        archive.writestr(f"{name}-1.0.dist-info/METADATA",
+                         f"Name: {name}\nVersion: 1.0\n")
+    return buffer.getvalue()
+
+
+def _write_signed(path, signed, signer):
+    metadata = Metablock(signed=signed)
+    metadata.create_signature(signer)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    metadata.dump(path)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def build_supply_chains(targets_dir, count, links, size):
+    """
+    Write the signed layout, its key and ``count`` wheels with sources of
+    ``size`` bytes and the links of their ``links`` steps to
+    ``targets_dir``.
+
+    Returns:
+        A tuple of the target files and the evidence of every wheel
+    """
+    from securesystemslib.signer import SSlibSigner
+
+    from rstuf_in_toto.record import load_signing_key
+
+    key = load_signing_key(PRIVATE_KEY)
+    signer = SSlibSigner(key)
+    pubkey = interface.import_rsa_publickey_from_file(PUBLIC_KEY)
+    layout = supply_chain_layout(links, pubkey)
+
+    os.makedirs(targets_dir, exist_ok=True)
+    shutil.copy(PUBLIC_KEY, os.path.join(targets_dir, "alice.pub"))
+    with open(PUBLIC_KEY, "rb") as f:
+        targets = [target_file("alice.pub", f.read())]
+    targets.append(
+        target_file(
+            "root.layout",
+            _write_signed(os.path.join(targets_dir, "root.layout"), layout,
+                          signer), {"in-toto": ["alice.pub"]}))
+
+    chains = {}
+    for i in range(count):
+        name = f"pkg_{i}"
+        files = project_files(name, size)
+        sources = {
+            path: {
+                "sha256": hashlib.sha256(data).hexdigest()
+            }
+            for path, data in files.items()
+        }
+        artifact = f"{name}-1.0-py3-none-any.whl"
+        wheel = build_wheel(name, files)
+        with open(os.path.join(targets_dir, artifact), "wb") as f:
+            f.write(wheel)
+
+        recorded = [Link(name="create", products=sources)]
+        recorded.extend(
+            Link(name=step.name, materials=sources, products=sources)
+            for step in layout.steps[1:-1])
+        recorded.append(
+            Link(name="build",
+                 materials=sources,
+                 products={
+                     artifact: {
+                         "sha256": hashlib.sha256(wheel).hexdigest()
+                     }
+                 },
+                 command=BUILD_COMMAND))
+
+        evidence = ["root.layout"]
+        for link in recorded:
+            path = f"{name}/" + FILENAME_FORMAT.format(step_name=link.name,
+                                                       keyid=key["keyid"])
+            data = _write_signed(os.path.join(targets_dir, path), link,
+                                 signer)
+            targets.append(target_file(path, data))
+            evidence.append(path)
+        targets.append(target_file(artifact, wheel, {"in-toto": evidence}))
+        chains[artifact] = evidence
+
+    return targets, chains
+
+
+def measure(operation, items, rounds):
+    """
+    Call ``operation`` on every item of ``items`` ``rounds`` times.
+
+    Raises:
+        RuntimeError: The operation failed
+
+    Returns:
+        The latency of every call in seconds
+    """
+    latencies = []
+    for _ in range(rounds):
+        for item in items:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                ok = operation(item)
+            latencies.append(time.perf_counter() - start)
+            if not ok:
+                raise RuntimeError(f"Failed on {item}")
+    return latencies
+
+
+def percentile(latencies, p):
+    """Return the nearest-rank ``p``-th percentile of ``latencies``"""
+    ordered = sorted(latencies)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def workspace_for(artifact, evidence, targets_dir, workdir):
+    """Lay out ``artifact`` and its evidence as the client does"""
+    workspace = tempfile.mkdtemp(dir=workdir)
+    for path in [artifact, "alice.pub"] + evidence:
+        shutil.copy(os.path.join(targets_dir, path),
+                    os.path.join(workspace, os.path.basename(path)))
+    return workspace
+
+
+def run(client, args, size, api):
+    """
+    Build a repository of wheels with sources of ``size`` bytes, then
+    measure every client operation on it.
+
+    Returns:
+        A dictionary of operation name to a tuple of the number of targets
+        handled by each call and the call latencies
+    """
+    from rstuf_in_toto.transport import Transport
+    from rstuf_in_toto.verify import verify_workspace
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        repo_dir = os.path.join(tmp, "repo")
+        targets_dir = os.path.join(repo_dir, "targets")
+        targets, chains = build_supply_chains(targets_dir, args.targets,
+                                              args.links, size)
+        root = build_repo(repo_dir, targets)
+        wheels = [os.path.join(targets_dir, a) for a in chains]
+
+        results["add_target"] = (1,
+                                 measure(client.add_target, wheels,
+                                         args.rounds))
+
+        transport = Transport(args.workers)
+        uploaded = api.targets
+        results["upload_file"] = (1,
+                                  measure(
+                                      lambda w: client.upload_file(
+                                          w, "root.layout", [
+                                              os.path.join(targets_dir, p)
+                                              for p in chains[
+                                                  os.path.basename(w)][1:]
+                                          ], transport), wheels,
+                                      args.rounds))
+        assert api.targets - uploaded == (args.rounds * args.targets *
+                                          args.links + args.rounds *
+                                          args.targets), api.targets
+
+        metadata_dir = os.path.join(tmp, "metadata")
+        os.mkdir(metadata_dir)
+        shutil.copy(root, metadata_dir)
+        client.build_metadata_dir = lambda url: metadata_dir
+        client.DOWNLOAD_DIR = os.path.join(tmp, "downloads")
+        with serve(repo_dir, args.latency / 1000) as url:
+            client.METADATA_URL = url
+            client.TARGET_URL = f"{url}targets/"
+
+            def download(artifacts, verify):
+                return client.download(artifacts,
+                                       not verify,
+                                       args.workers,
+                                       cache_size=0,
+                                       transport=transport)
+
+            results["download"] = (1,
+                                   measure(lambda a: download([a], False),
+                                           list(chains), args.rounds))
+            results[f"download {args.targets}"] = (args.targets,
+                                                   measure(
+                                                       lambda a: download(
+                                                           a, True),
+                                                       [list(chains)],
+                                                       args.rounds))
+
+        workspaces = {
+            artifact: workspace_for(artifact, evidence, targets_dir, tmp)
+            for artifact, evidence in chains.items()
+        }
+
+        def verify(artifact):
+            workspace = workspaces[artifact]
+            return verify_workspace(
+                artifact, workspace, os.path.join(workspace, "root.layout"),
+                [os.path.join(workspace, "alice.pub")]).success
+
+        results["verify"] = (1, measure(verify, list(chains), args.rounds))
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--targets",
+                        type=int,
+                        default=DEFAULT_TARGETS,
+                        help="Wheels in each repository")
+    parser.add_argument("--links",
+                        type=int,
+                        default=DEFAULT_LINKS,
+                        help="Steps of the supply chain, at least 2")
+    parser.add_argument("--sizes",
+                        default=DEFAULT_SIZES,
+                        help="Comma separated sizes of the wheels in bytes")
+    parser.add_argument("--rounds",
+                        type=int,
+                        default=DEFAULT_ROUNDS,
+                        help="Times every operation is repeated per wheel")
+    parser.add_argument("--workers",
+                        type=int,
+                        default=8,
+                        help="Concurrent downloads of the client")
+    parser.add_argument("--latency",
+                        type=float,
+                        default=DEFAULT_LATENCY,
+                        help="Milliseconds the servers delay each response")
+    args = parser.parse_args()
+    if args.links < 2:
+        parser.error("--links must be at least 2")
+
+    client = load_client()
+    os.environ.setdefault(client.ADD_TARGET_TOKEN, "benchmark")
+
+    print(f"{'size':>10} {'operation':>13} {'calls':>6} {'targets/s':>10} "
+          f"{'MiB/s':>8} {'p50':>9} {'p99':>9}")
+    with fake_api(args.latency / 1000) as api:
+        client.API_URL = f"{api.url}targets/"
+        client.TASK_URL = f"{api.url}task/"
+        for size in (int(s) for s in args.sizes.split(",")):
+            for name, (count, latencies) in run(client, args, size,
+                                                api).items():
+                rate = count * len(latencies) / sum(latencies)
+                print(f"{size:>10} {name:>13} {len(latencies):>6} "
+                      f"{rate:>10.1f} {rate * size / 2**20:>8.1f} "
+                      f"{percentile(latencies, 50) * 1000:>7.1f}ms "
+                      f"{percentile(latencies, 99) * 1000:>7.1f}ms")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
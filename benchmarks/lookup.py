@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Target lookup benchmark for flat and hash-bin delegated repositories.
+
+For synthetic repositories of growing size, a cold client refreshes and
+resolves a fixed batch of wheels with their in-toto evidence. Reports the
+metadata bytes fetched and the lookup time, for one ``get_targetinfo()``
+walk per path and for the batched per-bin lookups of the client, against
+a local server with a simulated network latency.
+"""
+
+import argparse
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from tuf.api.exceptions import DownloadError
+from tuf.ngclient.config import UpdaterConfig
+from tuf.ngclient.updater import Updater
+
+from synthetic import (artifact_paths, build_repo, load_client, serve,
+                       synthetic_targets)
+
+DEFAULT_SIZES = "1000,10000,50000"
+DEFAULT_BATCH = 50
+DEFAULT_TARGETS_PER_BIN = 256
+DEFAULT_LATENCY = 20  # ms
+
+
+def counting_fetcher(client):
+    """Return a TransportFetcher counting the bytes it fetched"""
+    from rstuf_in_toto.transport import Transport, TransportFetcher
+
+    class CountingFetcher(TransportFetcher):
+
+        def __init__(self):
+            super().__init__(Transport())
+            self.fetched = 0
+
+        def _fetch(self, url):
+            for chunk in super()._fetch(url):
+                self.fetched += len(chunk)
+                yield chunk
+
+    return CountingFetcher()
+
+
+def resolve_each(client, updater, targets, infos):
+    """Resolve every path with its own delegation walk"""
+    from rstuf_in_toto.evidence import in_toto_evidence
+
+    for target in targets:
+        if target in infos:
+            continue
+        info = updater.get_targetinfo(target)
+        if info is not None:
+            infos[target] = info
+            resolve_each(client, updater, in_toto_evidence(info), infos)
+
+
+def run(client, repo_dir, url, batch, resolve):
+    """
+    Refresh a cold client and resolve ``batch`` with ``resolve``.
+
+    Returns:
+        A tuple of the refresh bytes, lookup bytes and lookup seconds
+    """
+    with tempfile.TemporaryDirectory() as metadata_dir:
+        shutil.copy(os.path.join(repo_dir, "root.json"), metadata_dir)
+        fetcher = counting_fetcher(client)
+        updater = Updater(metadata_dir,
+                          url,
+                          target_base_url=url,
+                          fetcher=fetcher,
+                          config=UpdaterConfig(prefix_targets_with_hash=False))
+        updater.refresh()
+        refreshed = fetcher.fetched
+
+        infos = {}
+        start = time.perf_counter()
+        resolve(client, updater, batch, infos)
+        elapsed = time.perf_counter() - start
+        # Each wheel brings two links, all share the layout and key
+        assert len(infos) == 3 * len(batch) + 2, len(infos)
+
+    return refreshed, fetcher.fetched - refreshed, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes",
+                        default=DEFAULT_SIZES,
+                        help="Comma separated numbers of wheels")
+    parser.add_argument("--batch",
+                        type=int,
+                        default=DEFAULT_BATCH,
+                        help="Wheels resolved per run")
+    parser.add_argument("--targets-per-bin",
+                        type=int,
+                        default=DEFAULT_TARGETS_PER_BIN,
+                        help="Hash bins are sized for about this many targets")
+    parser.add_argument("--latency",
+                        type=float,
+                        default=DEFAULT_LATENCY,
+                        help="Milliseconds the server delays each response")
+    args = parser.parse_args()
+
+    client = load_client()
+    methods = {
+        "per path": resolve_each,
+        "per bin": lambda c, u, t, i: c.resolve_targets(u, t, i),
+    }
+
+    print(f"{'wheels':>8} {'layout':>10} {'lookup':>9} {'refresh':>11} "
+          f"{'fetched':>11} {'time':>9}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        targets = synthetic_targets(size)
+        batch = random.Random(size).sample(artifact_paths(size), args.batch)
+        bits = max(1, math.ceil(math.log2(len(targets) /
+                                          args.targets_per_bin)))
+        for layout, bit_length in (("flat", None), (f"{2**bits} bins", bits)):
+            with tempfile.TemporaryDirectory() as repo_dir:
+                build_repo(repo_dir, targets, bit_length)
+                with serve(repo_dir, args.latency / 1000) as url:
+                    for name, resolve in methods.items():
+                        try:
+                            refreshed, fetched, elapsed = run(
+                                client, repo_dir, url, batch, resolve)
+                        except DownloadError as e:
+                            print(f"{size:>8} {layout:>10} {name:>9} {e}")
+                            continue
+                        print(f"{size:>8} {layout:>10} {name:>9} "
+                              f"{refreshed / 1024:>8.0f}KiB "
+                              f"{fetched / 1024:>8.0f}KiB "
+                              f"{elapsed * 1000:>7.1f}ms")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Artifact rule benchmark for links with many artifacts.
+
+Applies the step and inspection rules of ``change_project_layout.toml`` to
+synthetic links recording a growing number of source files, with
+``in_toto.verifylib`` and with the indexed matcher of the client. A second
+layout matches the sources of ``update`` one package at a time, as layouts
+generated per directory do. Both matchers must accept the links, and both
+must reject them with the same error once an unexpected file is added to
+the products of the inspection.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+try:
+    import tomllib
+except ModuleNotFoundError:
+    import tomli as tomllib
+
+from in_toto import verifylib
+from in_toto.exceptions import RuleVerificationError
+from in_toto.models.layout import Inspection, Step
+from in_toto.models.link import Link
+
+from synthetic import PACKAGE_DIR
+
+DEFAULT_SIZES = "1000,10000,50000"
+LAYOUT = os.path.join(PACKAGE_DIR, "layouts", "change_project_layout.toml")
+WHEEL = "demo-1.0-py3-none-any.whl"
+PACKAGE_SIZE = 100
+
+
+def load_items(layout):
+    """Return the steps and inspections of a layout parsed from TOML"""
+
+    def rules(item, field):
+        return [rule.split() for rule in item.get(field, [])]
+
+    steps = [
+        Step(name=step["name"],
+             expected_materials=rules(step, "expected_materials"),
+             expected_products=rules(step, "expected_products"))
+        for step in layout["steps"]
+    ]
+    inspections = [
+        Inspection(name=inspection["name"],
+                   run=inspection["run"].split(),
+                   expected_materials=rules(inspection, "expected_materials"),
+                   expected_products=rules(inspection, "expected_products"))
+        for inspection in layout["inspect"]
+    ]
+    return steps + inspections
+
+
+def per_package(layout, count):
+    """
+    Return ``layout`` with the ``update`` step matching the materials of
+    every package of ``synthetic_links(count)`` separately
+    """
+    packages = [
+        f"MATCH src/pkg_{p}/* WITH PRODUCTS FROM clone"
+        for p in range((count + PACKAGE_SIZE - 1) // PACKAGE_SIZE)
+    ]
+    steps = [
+        dict(step, expected_materials=packages + step["expected_materials"])
+        if step["name"] == "update" else step for step in layout["steps"]
+    ]
+    return dict(layout, steps=steps)
+
+
+def _digest(value):
+    return {"sha256": f"{hash(value) & (2**256 - 1):064x}"}
+
+
+def synthetic_links(count):
+    """
+    Return the links of a project with ``count`` source files, changed in
+    ``update``, built into a wheel and unpacked by the inspection.
+    """
+    sources = {
+        f"pkg_{i // PACKAGE_SIZE}/mod_{i % PACKAGE_SIZE}.py": _digest(i)
+        for i in range(count)
+    }
+    sources["main.py"] = _digest("main")
+    cloned = {f"src/{path}": digest for path, digest in sources.items()}
+    cloned["pyproject.toml"] = _digest("pyproject")
+    cloned["README.md"] = _digest("readme")
+
+    updated = dict(cloned)
+    updated["pyproject.toml"] = _digest("pyproject changed")
+    updated["src/main.py"] = _digest("main changed")
+
+    wheel = {WHEEL: _digest(WHEEL)}
+    evidence = {"root.layout": _digest("layout"), "alice.pub": _digest("key")}
+    unpacked = {
+        path: updated[f"src/{path}"] for path in sources
+    }
+    unpacked.update(wheel)
+    unpacked.update(evidence)
+    unpacked["demo-1.0.dist-info/METADATA"] = _digest("metadata")
+    unpacked["demo-1.0.dist-info/RECORD"] = _digest("record")
+
+    return {
+        "clone": Link(name="clone", products=cloned),
+        "update": Link(name="update", materials=cloned, products=updated),
+        "build": Link(name="build", materials=updated, products=wheel),
+        "unzip": Link(name="unzip", materials={**wheel, **evidence},
+                      products=unpacked),
+    }
+
+
+def run(verify, items, links):
+    """
+    Return the seconds ``verify`` took on ``links`` and the first line of
+    its error, if any
+    """
+    start = time.perf_counter()
+    try:
+        verify(items, links)
+        error = None
+    except RuleVerificationError as e:
+        error = str(e).splitlines()[0]
+    return time.perf_counter() - start, error
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes",
+                        default=DEFAULT_SIZES,
+                        help="Comma separated numbers of source files")
+    args = parser.parse_args()
+
+    sys.path.insert(0, PACKAGE_DIR)
+    from rstuf_in_toto import rules
+
+    with open(LAYOUT, "rb") as f:
+        layout = tomllib.load(f)
+    methods = {
+        "verifylib": verifylib.verify_all_item_rules,
+        "indexed": rules.verify_all_item_rules,
+    }
+
+    print(f"{'files':>8} {'layout':>12} {'links':>9} {'matcher':>10} "
+          f"{'time':>10}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        links = synthetic_links(size)
+        tampered = synthetic_links(size)
+        tampered["unzip"].products["backdoor.py"] = _digest("backdoor")
+        layouts = {
+            "as shipped": load_items(layout),
+            "per package": load_items(per_package(layout, size)),
+        }
+
+        for name, items in layouts.items():
+            for case, case_links in (("valid", links),
+                                     ("tampered", tampered)):
+                errors = set()
+                for method, verify in methods.items():
+                    elapsed, error = run(verify, items, case_links)
+                    errors.add(error)
+                    print(f"{size:>8} {name:>12} {case:>9} {method:>10} "
+                          f"{elapsed * 1000:>8.1f}ms")
+                rejected = None not in errors
+                if len(errors) != 1 or rejected != (case == "tampered"):
+                    print(f"Matchers disagree on {case} links: {errors}")
+                    return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark for ``rstuf-in-toto-client.py``.
+
+Runs light commands under ``python -X importtime`` and reports their import
+time and wall-clock time. Fails if a command imports one of the heavy
+libraries, so regressions in the lazy imports of the CLI are caught. Times
+vary between runs and machines, so they are only checked against a budget
+given with ``--budget``, taking the fastest of the runs.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+CLIENT = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "rstuf-in-toto-client.py")
+
+# Commands that must start without any of the HEAVY_MODULES
+COMMANDS = [
+    ["--help"],
+    ["download", "--help"],
+    ["upload-file", "--help"],
+    ["download", "--daemon", "--socket", "{socket}", "target"],
+]
+HEAVY_MODULES = ("tuf", "requests", "urllib3", "in_toto", "securesystemslib",
+                 "cryptography", "iso8601")
+DEFAULT_RUNS = 10
+
+
+def parse_importtime(stderr):
+    """
+    Return the top-level modules imported and the total import time in
+    microseconds from ``-X importtime`` output.
+    """
+    modules = set()
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.add(name.strip().split(".")[0])
+        # Nested imports are indented and already in their parent's time
+        if not name.startswith("  ", 1):
+            total += int(cumulative)
+
+    return modules, total
+
+
+def measure(args):
+    """
+    Run the client with ``args`` once.
+
+    Returns:
+        A tuple of the modules imported, import time and wall-clock time,
+        both in milliseconds
+    """
+    env = dict(os.environ)
+    # Tokens are only needed by the API commands
+    env.pop("ADD_TARGET_TOKEN", None)
+    env.pop("DEL_TARGET_TOKEN", None)
+
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", CLIENT] + args,
+                          stdout=subprocess.DEVNULL,
+                          stderr=subprocess.PIPE,
+                          env=env,
+                          text=True)
+    wall = (time.perf_counter() - start) * 1000
+    modules, total = parse_importtime(proc.stderr)
+    return modules, total / 1000, wall
+
+
+def baseline(runs):
+    """Return the fastest import time of the bare interpreter in ms"""
+    times = []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", ""],
+                              stderr=subprocess.PIPE,
+                              text=True)
+        times.append(parse_importtime(proc.stderr)[1] / 1000)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n",
+                        "--runs",
+                        type=int,
+                        default=DEFAULT_RUNS,
+                        help="Runs per command")
+    parser.add_argument(
+        "--budget",
+        type=float,
+        help="Fail if the fastest import time of a command exceeds the "
+        "bare interpreter's by more than this many ms",
+    )
+    args = parser.parse_args()
+
+    base = baseline(args.runs)
+    print(f"{'interpreter':<40} import {base:7.1f} ms")
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # No daemon listens there, the thin client fails fast
+        socket_path = os.path.join(tmpdir, "missing.sock")
+        for command in COMMANDS:
+            command = [a.format(socket=socket_path) for a in command]
+            name = " ".join(command).replace(socket_path, "SOCKET")
+            imports, walls, heavy = [], [], set()
+            for _ in range(args.runs):
+                modules, import_ms, wall_ms = measure(command)
+                heavy |= modules.intersection(HEAVY_MODULES)
+                imports.append(import_ms)
+                walls.append(wall_ms)
+
+            best = min(imports)
+            print(f"{name:<40} import {best:7.1f} ms "
+                  f"(median {statistics.median(imports):7.1f} ms), "
+                  f"wall {min(walls):7.1f} ms")
+            if heavy:
+                failures.append(f"{name}: imports {', '.join(sorted(heavy))}")
+            if args.budget is not None and best - base > args.budget:
+                failures.append(f"{name}: {best - base:.1f} ms over the "
+                                f"interpreter, budget {args.budget} ms")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
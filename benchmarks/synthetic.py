@@ -0,0 +1,180 @@
+"""Synthetic TUF repositories and a static server for the benchmarks"""
+
+import contextlib
+import importlib.util
+import os
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+from securesystemslib.keys import generate_ecdsa_key
+from securesystemslib.signer import SSlibSigner
+from tuf.api.metadata import (TOP_LEVEL_ROLE_NAMES, Delegations, Key,
+                              Metadata, MetaFile, Root, Snapshot,
+                              SuccinctRoles, TargetFile, Targets, Timestamp)
+from tuf.api.serialization.json import JSONSerializer
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BIN_PREFIX = "bins"
+
+
+def load_client():
+    """Import ``rstuf-in-toto-client.py``, which has no importable name"""
+    sys.path.insert(0, PACKAGE_DIR)
+    spec = importlib.util.spec_from_file_location(
+        "rstuf_in_toto_client",
+        os.path.join(PACKAGE_DIR, "rstuf-in-toto-client.py"))
+    client = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(client)
+    return client
+
+
+def artifact_paths(count):
+    """Return the target paths of ``count`` synthetic wheels"""
+    return [f"pkg_{i}-1.0-py3-none-any.whl" for i in range(count)]
+
+
+def evidence_paths(artifact):
+    """Return the layout, key and links a synthetic wheel refers to"""
+    name = artifact.split("-")[0]
+    return ["root.layout", f"{name}/create.556caebd.link",
+            f"{name}/build.556caebd.link"]
+
+
+def target_file(path, data, custom=None):
+    """Return the TargetFile of ``data`` at ``path`` with ``custom`` fields"""
+    target = TargetFile.from_data(path, data, ["sha256"])
+    if custom:
+        target.unrecognized_fields["custom"] = custom
+    return target
+
+
+def synthetic_targets(count, data=None):
+    """
+    Return the target files of ``count`` wheels along with their in-toto
+    evidence. ``data(path)`` gives the content of a target, by default the
+    path itself.
+    """
+    data = data or (lambda path: path.encode())
+    targets = [
+        target_file("alice.pub", data("alice.pub")),
+        target_file("root.layout", data("root.layout"),
+                    {"in-toto": ["alice.pub"]})
+    ]
+    for artifact in artifact_paths(count):
+        evidence = evidence_paths(artifact)
+        targets.extend(target_file(p, data(p)) for p in evidence[1:])
+        targets.append(
+            target_file(artifact, data(artifact), {"in-toto": evidence}))
+    return targets
+
+
+def build_repo(out_dir, targets, bit_length=None):
+    """
+    Write signed metadata for ``targets`` to ``out_dir``. With a
+    ``bit_length``, targets are delegated to ``2**bit_length`` succinct hash
+    bins like RSTUF does, otherwise they are listed in ``targets.json``.
+
+    Returns:
+        The path of the written ``root.json``
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    key = generate_ecdsa_key()
+    signer = SSlibSigner(key)
+    public = Key.from_securesystemslib_key(key)
+    expires = datetime.utcnow().replace(microsecond=0) + timedelta(days=7)
+
+    root = Root(expires=expires, consistent_snapshot=False)
+    for role in TOP_LEVEL_ROLE_NAMES:
+        root.add_key(public, role)
+
+    top = Targets(expires=expires)
+    roles = {}
+    if bit_length:
+        succinct = SuccinctRoles([public.keyid], 1, bit_length, BIN_PREFIX)
+        top.delegations = Delegations({public.keyid: public},
+                                      succinct_roles=succinct)
+        for name in succinct.get_roles():
+            roles[name] = Targets(expires=expires)
+        for target in targets:
+            roles[succinct.get_role_for_target(target.path)].targets[
+                target.path] = target
+    else:
+        top.targets = {target.path: target for target in targets}
+
+    roles[Targets.type] = top
+    snapshot = Snapshot(expires=expires)
+    serializer = JSONSerializer(compact=True)
+    for name, signed in roles.items():
+        snapshot.meta[f"{name}.json"] = MetaFile(version=1)
+        _write(out_dir, name, signed, signer, serializer)
+    _write(out_dir, Snapshot.type, snapshot, signer, serializer)
+    _write(out_dir, Timestamp.type, Timestamp(expires=expires), signer,
+           serializer)
+    return _write(out_dir, Root.type, root, signer, serializer, version=1)
+
+
+def _write(out_dir, name, signed, signer, serializer, version=None):
+    metadata = Metadata(signed)
+    metadata.sign(signer)
+    filename = f"{version}.{name}.json" if version else f"{name}.json"
+    path = os.path.join(out_dir, filename)
+    with open(path, "wb") as f:
+        f.write(metadata.to_bytes(serializer))
+    if version:
+        # Initial trusted root for the client
+        with open(os.path.join(out_dir, f"{name}.json"), "wb") as f:
+            f.write(metadata.to_bytes(serializer))
+    return os.path.join(out_dir, f"{name}.json")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# Static file server delaying every response by argv[3] seconds
+SERVER = """
+import functools, http.server, sys, time
+
+class Handler(http.server.SimpleHTTPRequestHandler):
+    def send_head(self):
+        time.sleep(float(sys.argv[3]))
+        return super().send_head()
+
+    def log_message(self, *args):
+        pass
+
+handler = functools.partial(Handler, directory=sys.argv[1])
+http.server.ThreadingHTTPServer(("127.0.0.1", int(sys.argv[2])),
+                                handler).serve_forever()
+"""
+
+
+@contextlib.contextmanager
+def serve(directory, latency=0.0):
+    """
+    Serve ``directory`` over HTTP and yield its base URL. Every response is
+    delayed by ``latency`` seconds to mimic a remote server. The server runs
+    in its own process, so it does not compete with the client for the GIL.
+    """
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-c", SERVER, directory,
+         str(port), str(latency)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL)
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port)).close()
+                break
+            except OSError:
+                time.sleep(0.05)
+        yield f"http://127.0.0.1:{port}/"
+    finally:
+        server.terminate()
+        server.wait()
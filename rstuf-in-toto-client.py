@@ -7,30 +7,46 @@
 import argparse
 import logging
 import os
-from shutil import move
-import requests
-import shlex
-import subprocess
+import shutil
+import signal
 import sys
 import tempfile
+import threading
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from hashlib import sha256
 from pathlib import Path
+from typing import TYPE_CHECKING
+from urllib import parse
 
-from tuf.api.exceptions import DownloadError, RepositoryError
-from tuf.ngclient.config import UpdaterConfig
-from tuf.ngclient.updater import Updater
+# Only dependency-free modules are imported here. tuf, requests, in-toto
+# and the helpers built on them are imported by the commands using them, so
+# that ``--help``, ``download --daemon`` and friends start fast.
+from rstuf_in_toto import metrics
+from rstuf_in_toto.defaults import (DEFAULT_POOL_SIZE, DEFAULT_RETRIES,
+                                    DEFAULT_TIMEOUT, DEFAULT_WAIT_TIMEOUT)
 
-import securesystemslib.hash
+if TYPE_CHECKING:
+    from tuf.ngclient.updater import Updater
+
+    from rstuf_in_toto.transport import Transport
 
 # constants
 DOWNLOAD_DIR = "./"
 CLIENT_EXAMPLE_DIR = os.path.dirname(os.path.abspath(__file__))
 API_URL = "http://127.0.0.1:80/api/v1/targets/"
+TASK_URL = "http://127.0.0.1:80/api/v1/task/"
 METADATA_URL = "http://127.0.0.1:8080/"
 TARGET_URL = "http://127.0.0.1:8000/"
-ADD_TARGET_TOKEN = os.environ["ADD_TARGET_TOKEN"]
-DEL_TARGET_TOKEN = os.environ["DEL_TARGET_TOKEN"]
+DEFAULT_WORKERS = 8
+DEFAULT_CACHE_SIZE = 1024  # MiB
+DEFAULT_VERDICT_TTL = 24 * 60 * 60  # seconds
+DEFAULT_CHUNK_SIZE = 1000  # targets per request
+DEFAULT_REFRESH_INTERVAL = 0  # seconds, 0 always refreshes
+ADD_TARGET_TOKEN = "ADD_TARGET_TOKEN"  # environment variables holding the
+DEL_TARGET_TOKEN = "DEL_TARGET_TOKEN"  # RSTUF API tokens
 
 
 def build_metadata_dir(base_url: str) -> str:
@@ -40,17 +56,98 @@ def build_metadata_dir(base_url: str) -> str:
     return f"{Path.home()}/.local/share/tuf-example/{name}"
 
 
-def download(target: str, skip_in_toto_verify: bool) -> bool:
+def build_cache_dir(base_url: str) -> str:
+    """build the target cache directory next to the metadata directory"""
+    return f"{build_metadata_dir(base_url)}-targets"
+
+
+def build_verdict_dir(base_url: str) -> str:
+    """build the verdict cache directory next to the metadata directory"""
+    return f"{build_metadata_dir(base_url)}-verdicts"
+
+
+def build_signature_cache_dir(base_url: str) -> str:
+    """build the signature cache directory next to the metadata directory"""
+    return f"{build_metadata_dir(base_url)}-signatures"
+
+
+def build_http_cache_dir(base_url: str) -> str:
+    """build the conditional request cache next to the metadata directory"""
+    return f"{build_metadata_dir(base_url)}-http"
+
+
+def build_socket_path(base_url: str) -> str:
+    """build the daemon socket path next to the metadata directory"""
+    return f"{build_metadata_dir(base_url)}.sock"
+
+
+def build_transport(command_args) -> "Transport":
+    """Create the pooled HTTP transport configured on the command line"""
+    from rstuf_in_toto.transport import Transport
+
+    return Transport(command_args.pool_size, command_args.timeout,
+                     command_args.retries)
+
+
+def build_updater(transport: "Transport") -> "Updater":
+    """Create an Updater for the repository fetching over ``transport``"""
+    from tuf.ngclient.config import UpdaterConfig
+    from tuf.ngclient.updater import Updater
+
+    from rstuf_in_toto.transport import TransportFetcher
+
+    return Updater(
+        metadata_dir=build_metadata_dir(METADATA_URL),
+        metadata_base_url=METADATA_URL,
+        target_base_url=TARGET_URL,
+        fetcher=TransportFetcher(
+            transport, cache_dir=build_http_cache_dir(METADATA_URL)),
+        config=UpdaterConfig(prefix_targets_with_hash=False),
+    )
+
+
+def download(targets: list,
+             skip_in_toto_verify: bool,
+             workers: int = DEFAULT_WORKERS,
+             cache_size: int = DEFAULT_CACHE_SIZE,
+             trust_verdicts: bool = False,
+             verdict_ttl: int = DEFAULT_VERDICT_TTL,
+             transport: "Transport" = None,
+             refresh_interval: int = DEFAULT_REFRESH_INTERVAL,
+             cache_signatures: bool = False) -> bool:
     """
-    Download the target file using ``ngclient`` Updater.
+    Download the target files using ``ngclient`` Updater.
+
+    The Updater refreshes the top-level metadata once, and
+    ``download_targets()`` fetches and verifies all targets with it. With a
+    ``refresh_interval``, if another run refreshed less than
+    ``refresh_interval`` seconds ago, the metadata it verified is reused
+    without network access, as long as none of it expired. Targets
+    published in the meantime are then not seen, so this is opt-in.
+
+    Files are looked up in the persistent target cache first, which is
+    bounded to ``cache_size`` MiB. A ``cache_size`` of 0 disables the cache.
 
-    The Updater refreshes the top-level metadata, get the target information,
-    verifies if the target is already cached, and in case it is not cached,
-    downloads the target file.
+    Successful verifications are recorded in the verdict cache. With
+    ``trust_verdicts``, a target whose exact evidence was already verified
+    within ``verdict_ttl`` seconds is accepted without verifying it again.
+
+    Metadata and targets are fetched over ``transport``, so the pool reuses
+    its keep-alive connections.
+
+    With ``cache_signatures``, layout keys and layout signature checks are
+    kept on disk for later runs (see ``set_cache_dir()``).
 
     Returns:
-        A boolean indicating if process was successful
+        A boolean indicating if process was successful for all targets
     """
+    from tuf.api.exceptions import DownloadError, RepositoryError
+
+    from rstuf_in_toto.cache import TargetCache
+    from rstuf_in_toto.refresh import refresh_updater
+    from rstuf_in_toto.transport import Transport
+    from rstuf_in_toto.verdicts import VerdictCache
+
     metadata_dir = build_metadata_dir(METADATA_URL)
 
     if not os.path.isfile(f"{metadata_dir}/root.json"):
@@ -60,92 +157,638 @@ def download(target: str, skip_in_toto_verify: bool) -> bool:
 
     print(f"Using trusted root in {metadata_dir}")
 
-    if not os.path.isdir(DOWNLOAD_DIR):
-        os.mkdir(DOWNLOAD_DIR)
+    cache = None
+    if cache_size > 0:
+        cache = TargetCache(build_cache_dir(METADATA_URL),
+                            cache_size * 1024 * 1024)
+
+    verdicts = VerdictCache(build_verdict_dir(METADATA_URL), verdict_ttl)
+
+    try:
+        if cache_signatures:
+            from rstuf_in_toto.verify import set_cache_dir
+
+            set_cache_dir(build_signature_cache_dir(METADATA_URL))
+        transport = transport or Transport(workers)
+        with metrics.span("download.refresh"):
+            updater = refresh_updater(lambda: build_updater(transport),
+                                      metadata_dir, refresh_interval)
+        results = download_targets(updater, targets, DOWNLOAD_DIR,
+                                   skip_in_toto_verify, workers, cache,
+                                   verdicts, trust_verdicts)
+
+    except (OSError, RepositoryError, DownloadError) as e:
+        print(f"Failed to download targets {targets}: {e}")
+        if logging.root.level < logging.ERROR:
+            traceback.print_exc()
+        return False
+
+    return all(results.values())
+
+
+def download_targets(updater,
+                     targets,
+                     dest_dir,
+                     skip_in_toto_verify,
+                     workers=DEFAULT_WORKERS,
+                     cache=None,
+                     verdicts=None,
+                     trust_verdicts=False,
+                     lookup_lock=None):
+    """
+    Download and verify ``targets`` into ``dest_dir`` with a refreshed
+    ``updater``.
+
+    The target information of every target and of its in-toto evidence is
+    looked up once. Evidence shared between targets (layout, keys, links)
+    is only downloaded once, and all files are fetched concurrently by a
+    pool of ``workers`` threads. Each target is then verified in its own
+    workspace.
+
+    Files are streamed into a hidden work directory inside ``dest_dir``, so
+    workspaces are hard links and verified targets are moved to
+    ``dest_dir`` with an atomic rename, without copying them again.
+
+    Lookups may load delegated metadata into the updater, so callers sharing
+    an updater between threads pass a ``lookup_lock``.
+
+    Returns:
+        A dictionary of target to its downloaded path, or None on failure
+    """
+    if not os.path.isdir(dest_dir):
+        os.mkdir(dest_dir)
+
+    results = dict.fromkeys(targets)
+    with tempfile.TemporaryDirectory(prefix=".in-toto-rstuf-",
+                                     dir=dest_dir) as tmpdirname:
+        targets_dir = os.path.join(tmpdirname, "targets")
+        os.mkdir(targets_dir)
+
+        # Target lookups are done serially before handing the unique files
+        # to the pool
+        infos = {}
+        with lookup_lock or nullcontext(), metrics.span("download.lookup"):
+            found = resolve_targets(updater, results, infos, workers)
+
+        # Each unique file is downloaded once, and each layout verified
+        # once, for all the targets sharing them
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            paths, found = download_files(executor, updater, found, infos,
+                                          targets_dir, cache)
+            layouts = {}
+            if not skip_in_toto_verify:
+                with metrics.span("download.layouts"):
+                    layouts = trusted_layouts(found, infos, paths)
+            verified = executor.map(
+                lambda t: verify_target(t, infos, paths, tmpdirname,
+                                        skip_in_toto_verify, verdicts,
+                                        trust_verdicts, layouts), found)
+
+            for target, workspace in zip(found, verified):
+                if workspace is None:
+                    continue
+                dest = os.path.join(dest_dir, os.path.basename(target))
+                with metrics.span("download.move", target=target):
+                    os.replace(
+                        os.path.join(workspace, os.path.basename(target)),
+                        dest)
+                print(f"Target downloaded and available in {dest}")
+                results[target] = dest
+
+    if cache:
+        with metrics.span("download.evict"):
+            cache.evict()
+
+    return results
+
+
+def serve(socket_path: str,
+          refresh_interval: int = DEFAULT_REFRESH_INTERVAL,
+          workers: int = DEFAULT_WORKERS,
+          cache_size: int = DEFAULT_CACHE_SIZE,
+          trust_verdicts: bool = False,
+          verdict_ttl: int = DEFAULT_VERDICT_TTL,
+          transport: "Transport" = None,
+          cache_signatures: bool = False) -> bool:
+    """
+    Serve download and verify requests on the Unix domain socket at
+    ``socket_path``.
+
+    The daemon keeps its imports, the Updater with the trusted metadata, the
+    caches and the parsed layouts and keys in memory across requests. A
+    fresh Updater is refreshed once the current one is older than
+    ``refresh_interval`` seconds. With ``cache_signatures``, layout keys and
+    layout signature checks are kept on disk for later runs too.
+
+    Requests are JSON lines such as
+    ``{"targets": [...], "dest": "/abs/dir", "skip_in_toto_verify": false}``
+    and are answered with ``{"results": {target: path or null}}``.
+
+    Returns:
+        A boolean indicating if the daemon shut down cleanly
+    """
+    from rstuf_in_toto.cache import TargetCache
+    from rstuf_in_toto.daemon import DaemonServer
+    from rstuf_in_toto.refresh import refresh_updater
+    from rstuf_in_toto.transport import Transport
+    from rstuf_in_toto.verdicts import VerdictCache
+
+    metadata_dir = build_metadata_dir(METADATA_URL)
+
+    if not os.path.isfile(f"{metadata_dir}/root.json"):
+        print("Download root metadata to "
+              f"{metadata_dir}/root.json")
+        return False
+
+    transport = transport or Transport(workers)
+    cache = None
+    if cache_size > 0:
+        cache = TargetCache(build_cache_dir(METADATA_URL),
+                            cache_size * 1024 * 1024)
+    verdicts = VerdictCache(build_verdict_dir(METADATA_URL), verdict_ttl)
+    if cache_signatures:
+        from rstuf_in_toto.verify import set_cache_dir
+
+        set_cache_dir(build_signature_cache_dir(METADATA_URL))
+
+    lock = threading.Lock()
+    current = {"updater": None, "refreshed": 0.0}
+
+    def refreshed_updater():
+        with lock:
+            if time.monotonic() - current["refreshed"] > refresh_interval:
+                current["updater"] = refresh_updater(
+                    lambda: build_updater(transport), metadata_dir,
+                    refresh_interval)
+                current["refreshed"] = time.monotonic()
+            return current["updater"]
+
+    def handle(req):
+        results = download_targets(refreshed_updater(), req["targets"],
+                                   req["dest"],
+                                   req.get("skip_in_toto_verify", False),
+                                   workers, cache, verdicts, trust_verdicts,
+                                   lock)
+        return {"results": results}
 
+    # Leave through the server context on SIGTERM to remove the socket
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
     try:
-        with tempfile.TemporaryDirectory("in-toto-rstuf") as tmpdirname:
+        with DaemonServer(socket_path, handle) as server:
+            print(f"Serving downloads on {socket_path}")
+            server.serve_forever()
+
+    except KeyboardInterrupt:
+        pass
+
+    except OSError as e:
+        print(f"Failed to serve on {socket_path}: {e}")
+        return False
+
+    return True
+
+
+def download_via_daemon(socket_path: str, targets: list,
+                        skip_in_toto_verify: bool) -> bool:
+    """
+    Ask the daemon serving ``socket_path`` to download ``targets`` into
+    ``DOWNLOAD_DIR``.
+
+    Returns:
+        A boolean indicating if process was successful for all targets
+    """
+    from rstuf_in_toto.daemon import request
+
+    try:
+        response = request(
+            socket_path, {
+                "targets": targets,
+                "dest": os.path.abspath(DOWNLOAD_DIR),
+                "skip_in_toto_verify": skip_in_toto_verify,
+            })
+    except OSError as e:
+        print(f"Failed to reach daemon on {socket_path}: {e}")
+        return False
+
+    if "error" in response:
+        print(f"Failed to download targets {targets}: {response['error']}")
+        return False
+
+    for target, dest in response["results"].items():
+        if dest:
+            print(f"Target downloaded and available in {dest}")
+        else:
+            print(f"Failed to download target {target}")
+
+    return all(response["results"].values())
+
+
+def bundle(targets: list,
+           output: str,
+           workers: int = DEFAULT_WORKERS,
+           transport: "Transport" = None) -> bool:
+    """
+    Write ``targets``, all their in-toto evidence and the TUF metadata that
+    verifies them to the offline bundle ``output``, for ``install_bundle()``
+    on hosts without network access.
+
+    The metadata is refreshed from the trusted root into a scratch
+    directory, so that every file a client fetches to look up the targets
+    is bundled: timestamp, snapshot, targets and the hash bins listing the
+    targets and their evidence. Every root version is added too, for hosts
+    trusting an older root to rotate to the current one.
+
+    Returns:
+        A boolean indicating if all targets were bundled
+    """
+    from tuf.api.exceptions import DownloadError, RepositoryError
+    from tuf.ngclient.config import UpdaterConfig
+    from tuf.ngclient.updater import Updater
+
+    from rstuf_in_toto.bundle import RecordingFetcher, write_bundle
+    from rstuf_in_toto.transport import Transport
+
+    metadata_dir = build_metadata_dir(METADATA_URL)
+
+    if not os.path.isfile(f"{metadata_dir}/root.json"):
+        print("Download root metadata to "
+              f"{metadata_dir}/root.json")
+        return False
+
+    try:
+        transport = transport or Transport(workers)
+        fetcher = RecordingFetcher(transport, METADATA_URL)
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            scratch_dir = os.path.join(tmpdirname, "metadata")
+            targets_dir = os.path.join(tmpdirname, "targets")
+            os.mkdir(scratch_dir)
+            os.mkdir(targets_dir)
+            shutil.copy(f"{metadata_dir}/root.json", scratch_dir)
             updater = Updater(
-                metadata_dir=metadata_dir,
+                metadata_dir=scratch_dir,
                 metadata_base_url=METADATA_URL,
                 target_base_url=TARGET_URL,
-                target_dir=tmpdirname,
+                fetcher=fetcher,
                 config=UpdaterConfig(prefix_targets_with_hash=False),
             )
-            updater.refresh()
+            with metrics.span("bundle.refresh"):
+                updater.refresh()
+                infos = {}
+                found = resolve_targets(updater, targets, infos, workers)
+                root = updater._trusted_set.root.signed
+                for version in range(2, root.version + 1):
+                    name = f"{version}.root.json"
+                    if name not in fetcher.recorded:
+                        b"".join(fetcher.fetch(f"{METADATA_URL}{name}"))
+            fetcher.recording = False
 
-            if not download_file(updater, target):
-                return True
+            if not found:
+                print(f"No targets to bundle into {output}")
+                return False
 
-            if not skip_in_toto_verify:
-                cwd = os.getcwd()
-                os.chdir(tmpdirname)
-                cmd = ("in-toto-verify --verbose --layout root.layout "
-                       "--layout-keys alice.pub")
-                subprocess.check_output(shlex.split(cmd))
-                os.chdir(cwd)
-
-            dest = move(os.path.join(tmpdirname, target), DOWNLOAD_DIR)
-            print(f"Target downloaded and available in {dest}")
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                paths, found = download_files(executor, updater, found,
+                                              infos, targets_dir)
+            if not found:
+                print(f"No targets to bundle into {output}")
+                return False
+            with metrics.span("bundle.write"):
+                write_bundle(output, fetcher.recorded, paths, found)
 
     except (OSError, RepositoryError, DownloadError) as e:
-        print(f"Failed to download target {target}: {e}")
+        print(f"Failed to bundle targets {targets}: {e}")
         if logging.root.level < logging.ERROR:
             traceback.print_exc()
         return False
 
-    return True
+    print(f"Bundled {len(found)} targets with {len(paths) - len(found)} "
+          f"in-toto evidence files and {len(fetcher.recorded)} metadata "
+          f"files into {output}")
+    return len(found) == len(dict.fromkeys(targets))
+
+
+def install_bundle(path: str,
+                   targets: list,
+                   skip_in_toto_verify: bool,
+                   workers: int = DEFAULT_WORKERS,
+                   verdict_ttl: int = DEFAULT_VERDICT_TTL,
+                   cache_signatures: bool = False) -> bool:
+    """
+    Install ``targets`` from the offline bundle at ``path`` into
+    ``DOWNLOAD_DIR`` without network access, by default all the targets the
+    bundle was made for.
+
+    The bundled TUF metadata is verified against the trusted root like an
+    online refresh, and kept as the trusted metadata. Targets and their
+    evidence are read from the bundle by random access, without unpacking
+    it, and verified like downloads (see ``download_targets()``), keeping
+    layout keys and signature checks on disk with ``cache_signatures``.
+
+    Returns:
+        A boolean indicating if process was successful for all targets
+    """
+    from zipfile import BadZipFile
+
+    from tuf.api.exceptions import DownloadError, RepositoryError
+    from tuf.ngclient.config import UpdaterConfig
+    from tuf.ngclient.updater import Updater
 
+    from rstuf_in_toto.bundle import Bundle, BundleFetcher
+    from rstuf_in_toto.verdicts import VerdictCache
 
-def download_file(updater, target):
-    info = updater.get_targetinfo(target)
+    metadata_dir = build_metadata_dir(METADATA_URL)
 
-    if info is None:
-        print(f"Target {target} not found")
+    if not os.path.isfile(f"{metadata_dir}/root.json"):
+        print("Download root metadata to "
+              f"{metadata_dir}/root.json")
         return False
 
-    if info.custom and "in-toto" in info.custom:
-        for f in info.custom["in-toto"]:
-            if not download_file(updater, f):
-                return False
+    print(f"Using trusted root in {metadata_dir}")
 
-    path = updater.find_cached_target(info)
-    if path:
-        print(f"Target is available in {path}")
-        return True
-    path = updater.download_target(info)
-    return True
+    verdicts = VerdictCache(build_verdict_dir(METADATA_URL), verdict_ttl)
 
+    try:
+        if cache_signatures:
+            from rstuf_in_toto.verify import set_cache_dir
 
-def add_target(filename, custom=None):
-    info = {
-        "length": os.path.getsize(filename),
-        "hashes": {
-            "blake2b-256":
-            securesystemslib.hash.digest_filename(
-                filename, algorithm="blake2b-256").hexdigest()
-        }
+            set_cache_dir(build_signature_cache_dir(METADATA_URL))
+        with Bundle(path) as offline:
+            updater = Updater(
+                metadata_dir=metadata_dir,
+                metadata_base_url=offline.metadata_url,
+                target_base_url=offline.targets_url,
+                fetcher=BundleFetcher(offline),
+                config=UpdaterConfig(prefix_targets_with_hash=False),
+            )
+            with metrics.span("install.refresh"):
+                updater.refresh()
+            bundled = set(offline.files)
+            missing = [t for t in targets if t not in bundled]
+            for target in missing:
+                print(f"Target {target} is not in bundle {path}")
+            results = download_targets(
+                updater, [t for t in targets or offline.targets
+                          if t in bundled], DOWNLOAD_DIR,
+                skip_in_toto_verify, workers, verdicts=verdicts)
+
+    except (OSError, ValueError, BadZipFile, RepositoryError,
+            DownloadError) as e:
+        print(f"Failed to install bundle {path}: {e}")
+        if logging.root.level < logging.ERROR:
+            traceback.print_exc()
+        return False
+
+    return not missing and all(results.values())
+
+
+def resolve_targets(updater, targets, infos, workers=DEFAULT_WORKERS):
+    """
+    Add the target information of ``targets`` and of their in-toto evidence
+    to ``infos``, skipping paths that were already resolved.
+
+    Every path is looked up once however many targets share it, in batches
+    per hash bin (see ``EvidenceGraph.resolve()``).
+
+    Returns:
+        The targets that were found along with all their evidence, and
+        whose evidence does not refer back to itself
+    """
+    from rstuf_in_toto.evidence import EvidenceGraph
+
+    graph = EvidenceGraph(infos)
+    graph.resolve(updater, targets, workers)
+    found = []
+    for target in dict.fromkeys(targets):
+        problem = graph.problem(target)
+        if problem:
+            print(problem)
+        else:
+            found.append(target)
+
+    return found
+
+
+def trusted_layouts(targets, infos, paths):
+    """
+    Verify the layouts of ``targets`` once per layout, however many
+    targets share it (see ``load_trusted_layout()``).
+
+    Returns:
+        A dictionary of layout path to its TrustedLayout, or to the reason
+        it cannot be trusted
+    """
+    from securesystemslib.exceptions import Error as SSLibError
+
+    from rstuf_in_toto.evidence import EvidenceGraph, in_toto_evidence
+    from rstuf_in_toto.verify import load_trusted_layout
+
+    layouts = {}
+    for layout in EvidenceGraph(infos).by_layout(targets):
+        if layout is None:
+            continue
+        keys = in_toto_evidence(infos[layout])
+        try:
+            layouts[layout] = load_trusted_layout(paths[layout],
+                                                  [paths[k] for k in keys])
+        except (SSLibError, OSError, ValueError, KeyError) as e:
+            layouts[layout] = f"{type(e).__name__}: {e}"
+
+    return layouts
+
+
+def evidence_closure(target, infos):
+    """
+    Return ``target`` and all the in-toto evidence it refers to, each once.
+    Evidence of paths missing from ``infos`` cannot be followed.
+    """
+    from rstuf_in_toto.evidence import EvidenceGraph
+
+    return EvidenceGraph(infos).closure(target)
+
+
+def download_files(executor, updater, targets, infos, target_dir,
+                   cache=None):
+    """
+    Download ``targets`` and their in-toto evidence into ``target_dir``
+    concurrently on ``executor``, each file once. A file that fails to
+    download only fails the targets whose evidence includes it.
+
+    Returns:
+        The targets whose files were all downloaded, after a dictionary of
+        the paths of their files to where they were downloaded
+    """
+    from tuf.api.exceptions import DownloadError, RepositoryError
+
+    def fetch(path):
+        try:
+            return download_file(updater, infos[path], target_dir, cache)
+        except (OSError, RepositoryError, DownloadError) as e:
+            print(f"Failed to download {path}: {e}")
+            return None
+
+    needed = list(
+        dict.fromkeys(p for t in targets for p in evidence_closure(t, infos)))
+    paths = {
+        path: downloaded
+        for path, downloaded in zip(needed, executor.map(fetch, needed))
+        if downloaded
     }
+    downloaded = []
+    for target in targets:
+        missing = [
+            p for p in evidence_closure(target, infos) if p not in paths
+        ]
+        if missing:
+            print(f"Skipping {target}, failed to download "
+                  f"{', '.join(missing)}")
+        else:
+            downloaded.append(target)
+    kept = {p for t in downloaded for p in evidence_closure(t, infos)}
+
+    return {p: path for p, path in paths.items() if p in kept}, downloaded
+
+
+def download_file(updater, info, target_dir, cache=None):
+    from rstuf_in_toto.download import stream_target
+
+    path = os.path.join(target_dir, parse.quote(info.path, ""))
+    with metrics.span("download.fetch", target=info.path):
+        if cache and cache.get(info, path):
+            metrics.count("target_cache_hits")
+            print(f"Target {info.path} is available in cache")
+            return path
+
+        stream_target(updater, info, path)
+        if cache:
+            metrics.count("target_cache_misses")
+            cache.add(info, path)
+    return path
+
+
+def verify_target(target,
+                  infos,
+                  paths,
+                  workdir,
+                  skip_in_toto_verify,
+                  verdicts=None,
+                  trust_verdicts=False,
+                  layouts=None):
+    """
+    Copy ``target`` and its in-toto evidence into a fresh workspace inside
+    ``workdir`` and verify it in-process with the in-toto library. Files
+    are placed by basename, as in-toto expects links next to the layout.
+    The layout is not verified again if it is in ``layouts``, from
+    ``trusted_layouts()``.
+
+    Returns:
+        The workspace path, or None if verification failed
+    """
+    from rstuf_in_toto.cache import link_or_copy
+    from rstuf_in_toto.evidence import in_toto_evidence
+    from rstuf_in_toto.verdicts import verdict_key
+    from rstuf_in_toto.verify import verify_workspace
+
+    workspace = tempfile.mkdtemp(dir=workdir)
+    with metrics.span("download.workspace", target=target):
+        for path in evidence_closure(target, infos):
+            link_or_copy(paths[path],
+                         os.path.join(workspace, os.path.basename(path)))
+
+    if skip_in_toto_verify:
+        return workspace
+
+    key = verdict_key(infos[p] for p in evidence_closure(target, infos))
+    if verdicts and trust_verdicts:
+        if verdicts.get(key):
+            metrics.count("verdict_cache_hits")
+            print(f"Using cached verification verdict for {target}")
+            return workspace
+        metrics.count("verdict_cache_misses")
+
+    # The layout is the first in-toto entry of a target, and the layout in
+    # turn lists the public keys that signed it
+    evidence = in_toto_evidence(infos[target])
+    if not evidence:
+        print(f"Target {target} has no in-toto metadata to verify")
+        return None
+    layout = evidence[0]
+    trusted = (layouts or {}).get(layout)
+    if isinstance(trusted, str):
+        print(f"in-toto verification of {target} failed: {trusted}")
+        return None
+    keys = in_toto_evidence(infos[layout])
+    with metrics.span("download.verify", target=target):
+        result = verify_workspace(
+            target, workspace,
+            os.path.join(workspace, os.path.basename(layout)),
+            [os.path.join(workspace, os.path.basename(k)) for k in keys],
+            trusted)
+    for phase, seconds in result.timings.items():
+        metrics.observe(f"verify.{phase}", seconds, target=target)
+    if not result.success:
+        print(f"in-toto verification of {target} failed: {result.error}")
+        return None
+
+    if verdicts:
+        verdicts.put(key, target, result.layout_expires)
+
+    return workspace
+
+
+def add_target(filename, custom=None, file_hash=None, path=None):
+    from rstuf_in_toto.hashing import hash_file
+
+    length, hashes = file_hash or hash_file(filename)
+    info = {"length": length, "hashes": hashes}
     if custom:
         info["custom"] = custom
 
-    return {"path": filename, "info": info}
+    return {"path": path or filename, "info": info}
+
+
+def api_token(name):
+    """
+    Read the RSTUF API token from the environment variable ``name``.
+
+    Raises:
+        RuntimeError: The variable is not set
+    """
+    token = os.environ.get(name)
+    if not token:
+        raise RuntimeError(f"{name} is not set, export an RSTUF API token")
+    return token
+
+
+def api_headers(token):
+    return {
+        "accept": "application/json",
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json",
+    }
+
 
+def upload_layout(layout, keys, transport=None, tracker=None):
+    from rstuf_in_toto.hashing import hash_files
+    from rstuf_in_toto.transport import Transport
 
-def upload_layout(layout, keys):
     targets = []
 
     try:
-        targets.append(add_target(layout, {"in-toto": keys}))
+        headers = api_headers(api_token(ADD_TARGET_TOKEN))
+        with metrics.span("upload.hash"):
+            hashes = hash_files([layout] + keys)
+        targets.append(add_target(layout, {"in-toto": keys}, hashes[layout]))
         for k in keys:
-            targets.append(add_target(k))
-        headers = {
-            "accept": "application/json",
-            "Authorization": f"Bearer {ADD_TARGET_TOKEN}",
-            "Content-Type": "application/json",
-        }
-        r = requests.post(API_URL, headers=headers, json={"targets": targets})
+            targets.append(add_target(k, file_hash=hashes[k]))
+        transport = transport or Transport()
+        with metrics.span("upload.request", targets=len(targets)):
+            r = transport.request("POST",
+                                  API_URL,
+                                  headers=headers,
+                                  json={"targets": targets})
         r.raise_for_status()
+        if tracker:
+            tracker.add(r, headers)
         print(f"Layout {layout} uploaded successfully along with metadata")
 
     except Exception as e:
@@ -157,20 +800,30 @@ def upload_layout(layout, keys):
     return True
 
 
-def upload_file(target, layout, links):
+def upload_file(target, layout, links, transport=None, tracker=None):
+    from rstuf_in_toto.hashing import hash_files
+    from rstuf_in_toto.transport import Transport
+
     targets = []
 
     try:
-        targets.append(add_target(target, {"in-toto": [layout] + links}))
+        headers = api_headers(api_token(ADD_TARGET_TOKEN))
+        with metrics.span("upload.hash"):
+            hashes = hash_files([target] + links)
+        targets.append(
+            add_target(target, {"in-toto": [layout] + links},
+                       hashes[target]))
         for l in links:
-            targets.append(add_target(l))
-        headers = {
-            "accept": "application/json",
-            "Authorization": f"Bearer {ADD_TARGET_TOKEN}",
-            "Content-Type": "application/json",
-        }
-        r = requests.post(API_URL, headers=headers, json={"targets": targets})
+            targets.append(add_target(l, file_hash=hashes[l]))
+        transport = transport or Transport()
+        with metrics.span("upload.request", targets=len(targets)):
+            r = transport.request("POST",
+                                  API_URL,
+                                  headers=headers,
+                                  json={"targets": targets})
         r.raise_for_status()
+        if tracker:
+            tracker.add(r, headers)
         print(f"Target {target} uploaded successfully along with metadata")
 
     except Exception as e:
@@ -182,21 +835,58 @@ def upload_file(target, layout, links):
     return True
 
 
-def delete(targets):
+def publish(release_path,
+            chunk_size=DEFAULT_CHUNK_SIZE,
+            transport=None,
+            tracker=None):
+    """
+    Upload a whole release, given as a directory or a manifest, with as few
+    RSTUF API calls as possible.
+
+    The layout, its keys, the links and every artifact with its in-toto
+    linkage are sent over the pooled transport in requests of at most
+    ``chunk_size`` targets, so each chunk causes a single metadata update.
+
+    Returns:
+        A boolean indicating if process was successful
+    """
+    from rstuf_in_toto.hashing import hash_files
+    from rstuf_in_toto.publish import load_release
+    from rstuf_in_toto.transport import Transport
+
     try:
-        headers = {
-            "accept": "application/json",
-            "Authorization": f"Bearer {DEL_TARGET_TOKEN}",
-            "Content-Type": "application/json",
+        headers = api_headers(api_token(ADD_TARGET_TOKEN))
+        with metrics.span("publish.load"):
+            release = load_release(release_path)
+            entries = release.targets()
+        files = {
+            path: os.path.join(release.base_dir, path)
+            for path, _ in entries
         }
-        r = requests.delete(API_URL,
-                            headers=headers,
-                            json={"targets": targets})
-        r.raise_for_status()
-        print(f"Targets {targets} successfully deleted")
+        with metrics.span("publish.hash", files=len(files)):
+            hashes = hash_files(files.values())
+        targets = [
+            add_target(files[path], custom, hashes[files[path]], path)
+            for path, custom in entries
+        ]
+
+        transport = transport or Transport()
+        for i in range(0, len(targets), chunk_size):
+            chunk = targets[i:i + chunk_size]
+            with metrics.span("publish.request", targets=len(chunk)):
+                r = transport.request("POST",
+                                      API_URL,
+                                      headers=headers,
+                                      json={"targets": chunk})
+            r.raise_for_status()
+            if tracker:
+                tracker.add(r, headers)
+
+        print(f"Release {release_path} published successfully: "
+              f"{len(release.artifacts)} artifacts, {len(targets)} targets")
 
     except Exception as e:
-        print(f"Failed to delete targets {targets}: {e}")
+        print(f"Failed to publish release {release_path}: {e}")
         if logging.root.level < logging.ERROR:
             traceback.print_exc()
         return False
@@ -204,6 +894,238 @@ def delete(targets):
     return True
 
 
+def delete(targets,
+           transport=None,
+           tracker=None,
+           chunk_size=DEFAULT_CHUNK_SIZE,
+           workers=DEFAULT_WORKERS):
+    """
+    Delete ``targets`` from RSTUF in requests of at most ``chunk_size``
+    targets and ``MAX_CHUNK_BYTES``, sent concurrently by ``workers``
+    threads. RSTUF deletions are idempotent, so a failed chunk does not
+    stop the others and can simply be sent again.
+
+    Returns:
+        A boolean indicating if all chunks were accepted
+    """
+    from rstuf_in_toto.deletion import chunk_paths
+    from rstuf_in_toto.transport import Transport
+
+    try:
+        headers = api_headers(api_token(DEL_TARGET_TOKEN))
+    except RuntimeError as e:
+        print(f"Failed to delete targets {targets}: {e}")
+        return False
+
+    transport = transport or Transport()
+    chunks = chunk_paths(targets, chunk_size)
+
+    def send(chunk):
+        with metrics.span("delete.request", targets=len(chunk)):
+            r = transport.request("DELETE",
+                                  API_URL,
+                                  headers=headers,
+                                  json={"targets": chunk})
+        r.raise_for_status()
+        return r
+
+    success = True
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(send, chunk) for chunk in chunks]
+        for chunk, future in zip(chunks, futures):
+            try:
+                r = future.result()
+                if tracker:
+                    tracker.add(r, headers)
+            except Exception as e:
+                print(f"Failed to delete targets {chunk}: {e}")
+                if logging.root.level < logging.ERROR:
+                    traceback.print_exc()
+                success = False
+                continue
+
+            if len(chunks) == 1:
+                print(f"Targets {chunk} successfully deleted")
+            else:
+                print(f"{len(chunk)} targets successfully deleted, "
+                      f"{chunk[0]} to {chunk[-1]}")
+
+    return success
+
+
+def delete_selected(targets,
+                    globs=(),
+                    prefixes=(),
+                    versions=(),
+                    chunk_size=DEFAULT_CHUNK_SIZE,
+                    workers=DEFAULT_WORKERS,
+                    dry_run=False,
+                    transport=None,
+                    tracker=None):
+    """
+    Delete ``targets`` and the targets selected by ``globs``, ``prefixes``
+    and ``versions`` (see ``select_targets()``), along with the in-toto
+    evidence no remaining target refers to (see ``plan_deletion()``).
+
+    Targets are selected from the trusted targets metadata, refreshed over
+    the network first: a target added since the last refresh may refer to
+    the evidence that would otherwise be deleted. Current local copies of
+    the hash bins are reused.
+
+    The evidence is only deleted once the deletion of all selected targets
+    was accepted, so a failure never leaves targets without evidence.
+
+    Returns:
+        A boolean indicating if process was successful
+    """
+    from tuf.api.exceptions import DownloadError, RepositoryError
+
+    from rstuf_in_toto.deletion import (list_targets, plan_deletion,
+                                        select_targets)
+    from rstuf_in_toto.refresh import refresh_updater
+    from rstuf_in_toto.transport import Transport
+
+    metadata_dir = build_metadata_dir(METADATA_URL)
+
+    if not os.path.isfile(f"{metadata_dir}/root.json"):
+        print("Download root metadata to "
+              f"{metadata_dir}/root.json")
+        return False
+
+    try:
+        transport = transport or Transport(workers)
+        with metrics.span("delete.refresh"):
+            updater = refresh_updater(lambda: build_updater(transport),
+                                      metadata_dir, 0)
+        with metrics.span("delete.select"):
+            infos = list_targets(updater, workers)
+            plan = plan_deletion(
+                infos,
+                list(targets) +
+                select_targets(infos, globs, prefixes, versions))
+
+    except (OSError, RepositoryError, DownloadError) as e:
+        print(f"Failed to select targets to delete: {e}")
+        if logging.root.level < logging.ERROR:
+            traceback.print_exc()
+        return False
+
+    for path in plan.referenced:
+        print(f"Warning: {path} is in-toto evidence of remaining targets")
+
+    if not plan.selected:
+        print("No targets selected")
+        return True
+
+    if dry_run:
+        for path in plan.selected + plan.evidence:
+            print(path)
+        print(f"Would delete {len(plan.selected)} targets and "
+              f"{len(plan.evidence)} in-toto evidence files, keeping "
+              f"{len(plan.kept)} still in use")
+        return True
+
+    if not delete(plan.selected, transport, tracker, chunk_size, workers):
+        return False
+    return not plan.evidence or delete(plan.evidence, transport, tracker,
+                                       chunk_size, workers)
+
+
+def run_command(command_args, client_args):
+    """Run the sub command of the parsed ``command_args``"""
+    # initialize the TUF Client Example infrastructure
+    if command_args.sub_command == "download" and command_args.daemon:
+        # Thin client: the daemon already holds every heavy import
+        if not download_via_daemon(command_args.socket, command_args.targets,
+                                   command_args.skip_in_toto_verify):
+            return f"Failed to download {command_args.targets}"
+    elif command_args.sub_command == "download":
+        if not download(command_args.targets,
+                        command_args.skip_in_toto_verify,
+                        command_args.workers, command_args.cache_size,
+                        command_args.trust_cached_verdicts,
+                        command_args.verdict_ttl,
+                        build_transport(command_args),
+                        command_args.refresh_interval,
+                        command_args.cache_signatures):
+            return f"Failed to download {command_args.targets}"
+    elif command_args.sub_command == "serve":
+        if not serve(command_args.socket, command_args.refresh_interval,
+                     command_args.workers, command_args.cache_size,
+                     command_args.trust_cached_verdicts,
+                     command_args.verdict_ttl, build_transport(command_args),
+                     command_args.cache_signatures):
+            return f"Failed to serve on {command_args.socket}"
+    elif command_args.sub_command == "invalidate-verdicts":
+        from rstuf_in_toto.verdicts import VerdictCache
+
+        verdicts = VerdictCache(build_verdict_dir(METADATA_URL), 0)
+        removed = verdicts.invalidate(command_args.targets)
+        print(f"Removed {removed} cached verdicts")
+    elif command_args.sub_command == "bundle":
+        if not bundle(command_args.targets, command_args.output,
+                      command_args.workers, build_transport(command_args)):
+            return f"Failed to bundle {command_args.targets}"
+    elif command_args.sub_command == "install-bundle":
+        if not install_bundle(command_args.bundle, command_args.targets,
+                              command_args.skip_in_toto_verify,
+                              command_args.workers,
+                              cache_signatures=command_args.cache_signatures):
+            return f"Failed to install bundle {command_args.bundle}"
+    elif command_args.sub_command in ("upload-layout", "upload-file",
+                                      "publish", "delete"):
+        from rstuf_in_toto.refresh import discard_refresh
+
+        try:
+            return run_api_command(command_args)
+        finally:
+            # Downloads reusing the last refresh would miss these changes
+            discard_refresh(build_metadata_dir(METADATA_URL))
+    else:
+        client_args.print_help()
+
+
+def run_api_command(command_args):
+    """Run the RSTUF API sub command of the parsed ``command_args``"""
+    transport = build_transport(command_args)
+    # Only wait for the RSTUF tasks submitted with --wait
+    tracker = None
+    if command_args.wait:
+        from rstuf_in_toto.tasks import TaskTracker
+
+        tracker = TaskTracker(transport, TASK_URL)
+
+    if command_args.sub_command == "upload-layout":
+        if not upload_layout(command_args.layout, command_args.keys,
+                             transport, tracker):
+            return f"Failed to upload layout {command_args.layout}"
+    elif command_args.sub_command == "upload-file":
+        if not upload_file(command_args.target, command_args.layout,
+                           command_args.links, transport, tracker):
+            return f"Failed to upload target {command_args.target}"
+    elif command_args.sub_command == "publish":
+        if not publish(command_args.release, command_args.chunk_size,
+                       transport, tracker):
+            return f"Failed to publish release {command_args.release}"
+    elif (command_args.glob or command_args.prefix or command_args.version):
+        if not delete_selected(
+                command_args.targets, command_args.glob, command_args.prefix,
+                command_args.version, command_args.chunk_size,
+                command_args.workers, command_args.dry_run, transport,
+                tracker):
+            return "Failed to delete targets"
+    elif not command_args.targets:
+        return "No TARGETS, --glob, --prefix or --version to delete"
+    elif not delete(command_args.targets, transport, tracker,
+                    command_args.chunk_size, command_args.workers):
+        return "Failed to delete targets"
+
+    if tracker:
+        with metrics.span("tasks.wait", tasks=len(tracker.tasks)):
+            if not tracker.wait(command_args.wait_timeout):
+                return "Failed waiting for RSTUF tasks"
+
+
 def main():
     """Main TUF Client Example function"""
 
@@ -217,6 +1139,41 @@ def main():
         action="count",
         default=0,
     )
+    client_args.add_argument(
+        "--pool-size",
+        type=int,
+        default=DEFAULT_POOL_SIZE,
+        help="Maximum number of pooled keep-alive connections",
+    )
+    client_args.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help="HTTP timeout in seconds",
+    )
+    client_args.add_argument(
+        "--retries",
+        type=int,
+        default=DEFAULT_RETRIES,
+        help="Retries with exponential backoff on 429 and 5xx responses",
+    )
+    client_args.add_argument(
+        "--wait",
+        action="store_true",
+        help="Wait until RSTUF published the submitted changes",
+    )
+    client_args.add_argument(
+        "--wait-timeout",
+        type=float,
+        default=DEFAULT_WAIT_TIMEOUT,
+        help="Maximum seconds to wait with --wait",
+    )
+    client_args.add_argument(
+        "--metrics-out",
+        metavar="PATH",
+        help="Write timings, bytes, cache hits and retries of every phase "
+        "as JSON lines, or Prometheus text if PATH ends in .prom",
+    )
 
     # Sub commands
     sub_command = client_args.add_subparsers(dest="sub_command")
@@ -227,15 +1184,184 @@ def main():
         help="Download a target file",
     )
     download_parser.add_argument(
-        "target",
+        "targets",
         metavar="TARGET",
-        help="Target file",
+        nargs='+',
+        help="Target files",
     )
     download_parser.add_argument(
         "--skip-in-toto-verify",
         action="store_true",
         help="Force file to install without in-toto-verify",
     )
+    download_parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="Number of concurrent downloads",
+    )
+    download_parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_SIZE,
+        help="Size cap of the target cache in MiB (0 disables the cache)",
+    )
+
+    download_parser.add_argument(
+        "--trust-cached-verdicts",
+        action="store_true",
+        help="Accept targets whose exact evidence was verified before",
+    )
+    download_parser.add_argument(
+        "--verdict-ttl",
+        type=int,
+        default=DEFAULT_VERDICT_TTL,
+        help="Seconds a cached verification verdict stays valid",
+    )
+
+    download_parser.add_argument(
+        "--cache-signatures",
+        action="store_true",
+        help="Keep layout keys and signature checks on disk for later runs",
+    )
+
+    download_parser.add_argument(
+        "--refresh-interval",
+        type=int,
+        default=DEFAULT_REFRESH_INTERVAL,
+        help="Seconds a TUF metadata refresh is reused, missing targets "
+        "published meanwhile (default: 0, always refresh)",
+    )
+
+    download_parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Delegate to a running 'serve' daemon",
+    )
+    download_parser.add_argument(
+        "--socket",
+        default=build_socket_path(METADATA_URL),
+        help="Unix domain socket of the daemon with --daemon",
+    )
+
+    # Serve
+    serve_parser = sub_command.add_parser(
+        "serve",
+        help="Serve downloads from a long-running daemon",
+    )
+    serve_parser.add_argument(
+        "--socket",
+        default=build_socket_path(METADATA_URL),
+        help="Unix domain socket to listen on",
+    )
+    serve_parser.add_argument(
+        "--refresh-interval",
+        type=int,
+        default=DEFAULT_REFRESH_INTERVAL,
+        help="Seconds before TUF metadata is refreshed again (default: 0, "
+        "refresh for every request)",
+    )
+    serve_parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="Number of concurrent downloads per request",
+    )
+    serve_parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_SIZE,
+        help="Size cap of the target cache in MiB (0 disables the cache)",
+    )
+    serve_parser.add_argument(
+        "--cache-signatures",
+        action="store_true",
+        help="Keep layout keys and signature checks on disk for later runs",
+    )
+    serve_parser.add_argument(
+        "--trust-cached-verdicts",
+        action="store_true",
+        help="Accept targets whose exact evidence was verified before",
+    )
+    serve_parser.add_argument(
+        "--verdict-ttl",
+        type=int,
+        default=DEFAULT_VERDICT_TTL,
+        help="Seconds a cached verification verdict stays valid",
+    )
+
+    # Invalidate verdicts
+    invalidate_parser = sub_command.add_parser(
+        "invalidate-verdicts",
+        help="Drop cached verification verdicts",
+    )
+    invalidate_parser.add_argument(
+        "targets",
+        metavar="TARGETS",
+        nargs='*',
+        help="Targets to drop verdicts for (default: all)",
+    )
+
+    # Bundle
+    bundle_parser = sub_command.add_parser(
+        "bundle",
+        help="Bundle targets with their evidence for offline installs",
+    )
+    bundle_parser.add_argument(
+        "targets",
+        metavar="TARGET",
+        nargs='+',
+        help="Target files",
+    )
+    bundle_parser.add_argument(
+        "-o",
+        "--output",
+        required=True,
+        help="Bundle file to write",
+    )
+    bundle_parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="Number of concurrent downloads",
+    )
+
+    # Install bundle
+    install_bundle_parser = sub_command.add_parser(
+        "install-bundle",
+        help="Verify and install targets from a bundle without network",
+    )
+    install_bundle_parser.add_argument(
+        "bundle",
+        metavar="BUNDLE",
+        help="Bundle file written by 'bundle'",
+    )
+    install_bundle_parser.add_argument(
+        "targets",
+        metavar="TARGET",
+        nargs='*',
+        help="Target files to install (default: all bundled targets)",
+    )
+    install_bundle_parser.add_argument(
+        "--skip-in-toto-verify",
+        action="store_true",
+        help="Force file to install without in-toto-verify",
+    )
+    install_bundle_parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="Number of concurrent verifications",
+    )
+    install_bundle_parser.add_argument(
+        "--cache-signatures",
+        action="store_true",
+        help="Keep layout keys and signature checks on disk for later runs",
+    )
 
     # Upload layout
     upload_layout_parser = sub_command.add_parser(
@@ -276,6 +1402,23 @@ def main():
         help="in-toto link metadata of TARGET",
     )
 
+    # Publish release
+    publish_parser = sub_command.add_parser(
+        "publish",
+        help="Upload a release directory or manifest in batched requests",
+    )
+    publish_parser.add_argument(
+        "release",
+        metavar="RELEASE",
+        help="Release directory (e.g. dist/) or TOML/JSON manifest",
+    )
+    publish_parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="Maximum number of targets per request",
+    )
+
     # Delete targets
     delete_parser = sub_command.add_parser(
         "delete",
@@ -284,9 +1427,48 @@ def main():
     delete_parser.add_argument(
         "targets",
         metavar="TARGETS",
-        nargs='+',
+        nargs='*',
         help="RSTUF targets to delete",
     )
+    delete_parser.add_argument(
+        "--glob",
+        action="append",
+        default=[],
+        help="Also delete the targets matching this pattern, with the "
+        "in-toto evidence nothing else uses (repeatable)",
+    )
+    delete_parser.add_argument(
+        "--prefix",
+        action="append",
+        default=[],
+        help="Also delete the targets starting with this prefix, like "
+        "--glob (repeatable)",
+    )
+    delete_parser.add_argument(
+        "--version",
+        action="append",
+        default=[],
+        help="Also delete the wheels and sdists of this version, like "
+        "--glob (repeatable)",
+    )
+    delete_parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="Maximum number of targets per request",
+    )
+    delete_parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="Number of concurrent requests",
+    )
+    delete_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only list the targets --glob, --prefix and --version select",
+    )
 
     command_args = client_args.parse_args()
 
@@ -301,22 +1483,21 @@ def main():
 
     logging.basicConfig(level=loglevel)
 
-    # initialize the TUF Client Example infrastructure
-    if command_args.sub_command == "download":
-        if not download(command_args.target, command_args.skip_in_toto_verify):
-            return f"Failed to download {command_args.target}"
-    elif command_args.sub_command == "upload-layout":
-        if not upload_layout(command_args.layout, command_args.keys):
-            return f"Failed to upload layout {command_args.layout}"
-    elif command_args.sub_command == "upload-file":
-        if not upload_file(command_args.target, command_args.layout,
-                           command_args.links):
-            return f"Failed to upload target {command_args.target}"
-    elif command_args.sub_command == "delete":
-        if not delete(command_args.targets):
-            return f"Failed to delete targets"
-    else:
-        client_args.print_help()
+    if command_args.metrics_out:
+        try:
+            metrics.enable(command_args.metrics_out)
+        except OSError as e:
+            return f"Failed to open {command_args.metrics_out}: {e}"
+
+    try:
+        with metrics.span("command", command=command_args.sub_command):
+            return run_command(command_args, client_args)
+    finally:
+        try:
+            metrics.close()
+        except OSError as e:
+            print(f"Failed to write metrics to {command_args.metrics_out}: "
+                  f"{e}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1 @@
+"""Helpers for the RSTUF + in-toto client"""
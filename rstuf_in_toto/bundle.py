@@ -0,0 +1,177 @@
+"""Offline bundles of targets with their in-toto evidence and TUF metadata"""
+
+import json
+import logging
+import os
+import threading
+import zipfile
+from typing import Dict, Iterator, List
+
+from tuf.api import exceptions
+from tuf.ngclient import FetcherInterface
+
+from rstuf_in_toto.transport import Transport, TransportFetcher
+
+logger = logging.getLogger(__name__)
+
+# Bundle members are fetched from URLs below BUNDLE_URL, named like the
+# files below the metadata and target base URLs of the repository
+BUNDLE_URL = "bundle:///"
+METADATA_PREFIX = "metadata/"
+TARGETS_PREFIX = "targets/"
+INDEX = "index.json"
+FORMAT_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+# Targets stored as they are, deflating them again would not pay off
+COMPRESSED_SUFFIXES = (".whl", ".zip", ".gz", ".tgz", ".bz2", ".xz", ".zst")
+
+
+class RecordingFetcher(TransportFetcher):
+    """
+    TransportFetcher keeping the files it fetches from below ``base_url``
+    while ``recording``, by their name relative to ``base_url``.
+
+    Only complete downloads are kept, so the recorded metadata is what
+    ngclient fetched to refresh and look up targets, under the names it
+    fetches them by.
+    """
+
+    def __init__(self, transport: Transport, base_url: str):
+        super().__init__(transport)
+        self.base_url = base_url
+        self.recording = True
+        self.recorded: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def _fetch(self, url: str) -> Iterator[bytes]:
+        chunks = super()._fetch(url)
+        if not self.recording or not url.startswith(self.base_url):
+            return chunks
+        return self._record(url[len(self.base_url):], chunks)
+
+    def _record(self, name, chunks):
+        data = bytearray()
+        for chunk in chunks:
+            data += chunk
+            yield chunk
+        with self._lock:
+            self.recorded[name] = bytes(data)
+
+
+def write_bundle(path: str, metadata: Dict[str, bytes],
+                 files: Dict[str, str], targets: List[str]):
+    """
+    Write a bundle of the TUF ``metadata`` files by name, the target
+    ``files`` by target path to their local copy, and the index of the
+    bundled ``targets`` to the zip archive at ``path``.
+
+    Metadata and evidence are deflated, targets that are archives already
+    are stored. The bundle is written to a temporary file and renamed, so
+    that ``path`` is never a partial bundle.
+    """
+    index = {
+        "version": FORMAT_VERSION,
+        "targets": targets,
+        "files": sorted(files),
+        "metadata": sorted(metadata),
+    }
+    tmp = f"{path}.{os.getpid()}.part"
+    try:
+        with zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr(INDEX, json.dumps(index, indent=1))
+            for name, data in sorted(metadata.items()):
+                archive.writestr(METADATA_PREFIX + name, data)
+            for target_path, local_path in sorted(files.items()):
+                compression = zipfile.ZIP_DEFLATED
+                if target_path.endswith(COMPRESSED_SUFFIXES):
+                    compression = zipfile.ZIP_STORED
+                archive.write(local_path,
+                              TARGETS_PREFIX + target_path,
+                              compress_type=compression)
+        os.replace(tmp, path)
+
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class Bundle:
+    """
+    A bundle opened for reading. Members are read straight from the
+    archive through its central directory, nothing is extracted.
+
+    Raises:
+        BadZipFile: The file is not a zip archive
+        ValueError: The archive is not a bundle of a known version
+    """
+
+    metadata_url = BUNDLE_URL + METADATA_PREFIX
+    targets_url = BUNDLE_URL + TARGETS_PREFIX
+
+    def __init__(self, path: str):
+        self.path = path
+        self.archive = zipfile.ZipFile(path)
+        try:
+            self.index = json.loads(self.archive.read(INDEX))
+        except (KeyError, ValueError) as e:
+            self.archive.close()
+            raise ValueError(f"{path} is not a bundle: {e}")
+        if self.index.get("version") != FORMAT_VERSION:
+            self.archive.close()
+            raise ValueError(f"Unsupported version of bundle {path}: "
+                             f"{self.index.get('version')}")
+
+    @property
+    def targets(self) -> List[str]:
+        """The targets the bundle was made for"""
+        return self.index["targets"]
+
+    @property
+    def files(self) -> List[str]:
+        """The targets and in-toto evidence in the bundle"""
+        return self.index["files"]
+
+    def close(self):
+        self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BundleFetcher(FetcherInterface):
+    """
+    ngclient fetcher reading metadata and targets from a Bundle, for
+    refreshing and downloading fully offline. Files missing from the bundle
+    are reported like a 404, so ngclient stops looking for newer roots
+    after the last bundled one.
+
+    zipfile serializes the reads of concurrent downloads from the archive,
+    decompression runs concurrently.
+    """
+
+    def __init__(self, bundle: Bundle, chunk_size: int = CHUNK_SIZE):
+        self.bundle = bundle
+        self.chunk_size = chunk_size
+
+    def _fetch(self, url: str) -> Iterator[bytes]:
+        name = url[len(BUNDLE_URL):] if url.startswith(BUNDLE_URL) else None
+        try:
+            member = self.bundle.archive.open(name)
+        except (KeyError, TypeError):
+            raise exceptions.DownloadHTTPError(
+                f"{url} is not in bundle {self.bundle.path}", 404)
+        return self._chunks(member)
+
+    def _chunks(self, member) -> Iterator[bytes]:
+        try:
+            with member:
+                yield from iter(lambda: member.read(self.chunk_size), b"")
+        except zipfile.BadZipFile as e:
+            raise exceptions.DownloadError(
+                f"Corrupt member of bundle {self.bundle.path}: {e}")
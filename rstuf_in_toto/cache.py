@@ -0,0 +1,108 @@
+"""Persistent content-addressed cache of downloaded targets"""
+
+import logging
+import os
+import shutil
+import threading
+
+from tuf.api.exceptions import LengthOrHashMismatchError
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALGORITHM = "blake2b-256"
+
+
+def link_or_copy(src, dst):
+    """Hard link ``src`` to ``dst``, copying when linking is not possible"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class TargetCache:
+    """
+    On-disk target cache keyed by the TUF blake2b-256 hash.
+
+    Entries are stored as ``<cache_dir>/<hash[:2]>/<hash>``. Every hit bumps
+    the entry modification time, so ``evict()`` can drop the least recently
+    used entries once the cache grows beyond ``max_size`` bytes.
+
+    Entries are verified against the trusted target information on every
+    hit, a tampered or truncated entry is removed and reported as a miss.
+    """
+
+    def __init__(self, cache_dir: str, max_size: int):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_path(self, info):
+        digest = info.hashes.get(CACHE_ALGORITHM)
+        if digest is None:
+            return None
+        return os.path.join(self.cache_dir, digest[:2], digest)
+
+    def get(self, info, dest: str) -> bool:
+        """
+        Link or copy the cached entry for ``info`` to ``dest``.
+
+        Returns:
+            A boolean indicating if the target was found in the cache
+        """
+        path = self._entry_path(info)
+        if path is None:
+            return False
+
+        try:
+            with open(path, "rb") as f:
+                info.verify_length_and_hashes(f)
+        except FileNotFoundError:
+            return False
+        except LengthOrHashMismatchError as e:
+            logger.warning("Removing corrupt cache entry %s: %s", path, e)
+            os.remove(path)
+            return False
+
+        os.utime(path)
+        link_or_copy(path, dest)
+        return True
+
+    def add(self, info, src: str):
+        """Store the verified target file ``src`` in the cache"""
+        path = self._entry_path(info)
+        if path is None or os.path.exists(path):
+            return
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}-{threading.get_ident()}"
+        try:
+            link_or_copy(src, tmp)
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def evict(self):
+        """Remove least recently used entries until under ``max_size``"""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, path))
+                total += st.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
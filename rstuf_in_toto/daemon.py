@@ -0,0 +1,82 @@
+"""Unix domain socket API for a long-running download service"""
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+
+logger = logging.getLogger(__name__)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Answer one JSON line request with one JSON line response"""
+
+    def handle(self):
+        try:
+            payload = json.loads(self.rfile.readline())
+            if payload.get("ping"):
+                response = {"ping": True}
+            else:
+                response = self.server.handler(payload)
+        except Exception as e:
+            logger.exception("Failed to handle request")
+            response = {"error": f"{type(e).__name__}: {e}"}
+
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Threaded server passing every decoded request to ``handler`` and
+    sending back what it returns. The socket is only accessible to the
+    current user.
+
+    Raises:
+        OSError: ``socket_path`` is served by another daemon, or exists and
+            is not a socket
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, handler):
+        self.handler = handler
+        try:
+            mode = os.lstat(socket_path).st_mode
+        except FileNotFoundError:
+            mode = None
+        if mode is not None:
+            if not stat.S_ISSOCK(mode):
+                raise OSError(f"{socket_path} exists and is not a socket")
+            try:
+                request(socket_path, {"ping": True}, timeout=1)
+            except OSError:
+                # Stale socket left behind by a previous daemon
+                os.remove(socket_path)
+            else:
+                raise OSError(f"A daemon is already serving {socket_path}")
+
+        umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, _RequestHandler)
+        finally:
+            os.umask(umask)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.remove(self.server_address)
+        except FileNotFoundError:
+            pass
+
+
+def request(socket_path: str,
+            payload: dict,
+            timeout: float = None) -> dict:
+    """Send ``payload`` to the daemon at ``socket_path``, return its reply"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(payload).encode() + b"\n")
+        with sock.makefile("rb") as f:
+            return json.loads(f.readline())
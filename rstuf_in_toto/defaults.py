@@ -0,0 +1,10 @@
+"""
+Default settings shared by the CLI and the helpers. This module has no
+dependencies, so the CLI can build its argument parser without importing
+any of the heavy libraries.
+"""
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 10  # seconds
+DEFAULT_RETRIES = 3
+DEFAULT_WAIT_TIMEOUT = 300  # seconds
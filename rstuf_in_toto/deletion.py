@@ -0,0 +1,178 @@
+"""Select targets to delete along with the in-toto evidence only they use"""
+
+import fnmatch
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from tuf.api.metadata import TargetFile, Targets
+
+from rstuf_in_toto.lookup import DEFAULT_WORKERS, load_bins
+
+logger = logging.getLogger(__name__)
+
+SDIST_SUFFIXES = (".tar.gz", ".zip")
+# Cap of the JSON body of a single deletion request
+MAX_CHUNK_BYTES = 256 * 1024
+
+
+@dataclass
+class DeletionPlan:
+    """
+    Targets to delete: the ``selected`` targets and the in-toto
+    ``evidence`` no remaining target refers to anymore. ``kept`` is the
+    evidence of selected targets that remaining targets still refer to,
+    and ``referenced`` the selected targets that are evidence of remaining
+    targets, which fail verification once deleted.
+    """
+    selected: List[str]
+    evidence: List[str] = field(default_factory=list)
+    kept: List[str] = field(default_factory=list)
+    referenced: List[str] = field(default_factory=list)
+
+
+def list_targets(updater,
+                 workers: int = DEFAULT_WORKERS) -> Dict[str, TargetFile]:
+    """
+    Return every target of a refreshed ``updater``: the top-level targets
+    and the targets of all delegated roles.
+
+    Succinct hash bins, as RSTUF delegates to, are all loaded with
+    ``load_bins()``, reusing the local copies that are still current. Other
+    delegations are walked in the order ``Updater.get_targetinfo()`` walks
+    them. A role is only trusted for the paths delegated to it, and the
+    first role listing a path wins.
+
+    Returns:
+        A dictionary of target path to target information
+    """
+    top = updater._trusted_set.targets.signed
+    targets = dict(top.targets)
+    delegations = top.delegations
+    if delegations is None:
+        return targets
+
+    succinct = delegations.succinct_roles
+    if succinct is not None:
+        roles = list(succinct.get_roles())
+        load_bins(updater, roles, workers)
+        for role in roles:
+            signed = updater._trusted_set[role].signed
+            for path, info in signed.targets.items():
+                if succinct.get_role_for_target(path) == role:
+                    targets.setdefault(path, info)
+        return targets
+
+    stack = [(role, Targets.type)
+             for role in reversed(list(delegations.roles.values()))]
+    visited = set()
+    while stack:
+        role, parent = stack.pop()
+        if role.name in visited:
+            continue
+        visited.add(role.name)
+        signed = updater._load_targets(role.name, parent).signed
+        for path, info in signed.targets.items():
+            if role.is_delegated_path(path):
+                targets.setdefault(path, info)
+        if signed.delegations and signed.delegations.roles:
+            stack.extend(
+                (child, role.name)
+                for child in reversed(list(signed.delegations.roles.values())))
+
+    return targets
+
+
+def artifact_version(path: str) -> Optional[str]:
+    """Return the version in the file name of a wheel or sdist at ``path``"""
+    name = path.rsplit("/", 1)[-1]
+    if name.endswith(".whl"):
+        parts = name[:-len(".whl")].split("-")
+        # name-version(-build)?-python-abi-platform
+        return parts[1] if len(parts) in (5, 6) else None
+    for suffix in SDIST_SUFFIXES:
+        if name.endswith(suffix):
+            project, _, version = name[:-len(suffix)].rpartition("-")
+            return version if project else None
+    return None
+
+
+def select_targets(paths: Iterable[str],
+                   globs: Iterable[str] = (),
+                   prefixes: Iterable[str] = (),
+                   versions: Iterable[str] = ()) -> List[str]:
+    """
+    Return the ``paths`` matching the given criteria: any of the ``globs``
+    (``fnmatch`` patterns, where ``*`` also matches ``/``), any of the
+    ``prefixes`` and any of the ``versions`` of wheels and sdists. Every
+    kind of criteria that is given must match, so ``--prefix pkg/
+    --version 1.0`` selects the 1.0 artifacts below ``pkg/``.
+    """
+    globs, prefixes, versions = list(globs), tuple(prefixes), set(versions)
+    selected = []
+    for path in paths:
+        if globs and not any(fnmatch.fnmatchcase(path, g) for g in globs):
+            continue
+        if prefixes and not path.startswith(prefixes):
+            continue
+        if versions and artifact_version(path) not in versions:
+            continue
+        selected.append(path)
+    return sorted(selected)
+
+
+def _closure(paths, targets):
+    """Return ``paths`` and the in-toto evidence they refer to, if known"""
+    closure = set()
+    pending = [p for p in paths if p in targets]
+    while pending:
+        path = pending.pop()
+        if path in closure:
+            continue
+        closure.add(path)
+        info = targets[path]
+        pending.extend(p for p in (info.custom or {}).get("in-toto", [])
+                       if p in targets and p not in closure)
+    return closure
+
+
+def plan_deletion(targets: Dict[str, TargetFile],
+                  selected: Iterable[str]) -> DeletionPlan:
+    """
+    Plan the deletion of ``selected`` from ``targets``, with the evidence
+    they refer to, directly or through a layout, that no remaining target
+    refers to. Selected paths that are not ``targets`` are deleted as is.
+
+    Returns:
+        A DeletionPlan
+    """
+    selected = set(selected)
+    candidates = _closure(selected, targets) - selected
+    live = _closure(set(targets) - selected - candidates, targets)
+    for path in sorted(candidates & live):
+        logger.info("Keeping %s, used by remaining targets", path)
+    return DeletionPlan(selected=sorted(selected),
+                        evidence=sorted(candidates - live),
+                        kept=sorted(candidates & live),
+                        referenced=sorted(selected & live))
+
+
+def chunk_paths(paths: Iterable[str],
+                chunk_size: int,
+                max_bytes: int = MAX_CHUNK_BYTES) -> List[List[str]]:
+    """
+    Split ``paths`` into chunks of at most ``chunk_size`` paths, whose JSON
+    list takes at most ``max_bytes``, unless a single path is larger.
+    """
+    chunks, chunk, size = [], [], 2
+    for path in paths:
+        cost = len(json.dumps(path)) + 2
+        if chunk and (len(chunk) >= chunk_size or size + cost > max_bytes):
+            chunks.append(chunk)
+            chunk, size = [], 2
+        chunk.append(path)
+        size += cost
+    if chunk:
+        chunks.append(chunk)
+    return chunks
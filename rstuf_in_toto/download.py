@@ -0,0 +1,84 @@
+"""Stream target files to their destination with incremental checks"""
+
+import logging
+import os
+import threading
+
+from tuf.api import exceptions
+
+from rstuf_in_toto.hashing import new_hash
+
+logger = logging.getLogger(__name__)
+
+
+def target_url(updater, info) -> str:
+    """Return the URL ``Updater.download_target()`` fetches ``info`` from"""
+    path = info.path
+    if (updater._trusted_set.root.signed.consistent_snapshot
+            and updater.config.prefix_targets_with_hash):
+        dirname, sep, basename = path.rpartition("/")
+        path = f"{dirname}{sep}{next(iter(info.hashes.values()))}.{basename}"
+    return f"{updater._target_base_url}{path}"
+
+
+def stream_target(updater, info, path: str) -> str:
+    """
+    Download the target ``info`` with the fetcher of a refreshed
+    ``updater`` and write it to ``path``.
+
+    Unlike ``Updater.download_target()``, which spools the whole file to a
+    temporary file, hashes it and copies it over, chunks are written to a
+    temporary file next to ``path`` as they arrive while the length and
+    hashes are updated. The verified file is then renamed to ``path``, so
+    memory use does not depend on the target size and the file is written
+    once, on the destination filesystem.
+
+    Raises:
+        DownloadError: Download failed or exceeded the expected length
+        LengthOrHashMismatchError: Downloaded file does not match ``info``
+        OSError: Failed to write the target
+
+    Returns:
+        The path of the downloaded file
+    """
+    try:
+        hashers = {a: new_hash(a) for a in info.hashes}
+    except ValueError as e:
+        raise exceptions.LengthOrHashMismatchError(
+            f"Unsupported hash algorithm for {info.path}: {e}")
+
+    tmp = f"{path}.{os.getpid()}-{threading.get_ident()}.part"
+    length = 0
+    try:
+        with open(tmp, "wb") as f:
+            for chunk in updater._fetcher.fetch(target_url(updater, info)):
+                length += len(chunk)
+                if length > info.length:
+                    raise exceptions.DownloadLengthMismatchError(
+                        f"Downloaded more than the {info.length} bytes of "
+                        f"{info.path}")
+                for hasher in hashers.values():
+                    hasher.update(chunk)
+                f.write(chunk)
+
+        if length != info.length:
+            raise exceptions.LengthOrHashMismatchError(
+                f"Length mismatch for {info.path}: expected {info.length}, "
+                f"got {length}")
+        for algorithm, hasher in hashers.items():
+            if hasher.hexdigest() != info.hashes[algorithm]:
+                raise exceptions.LengthOrHashMismatchError(
+                    f"Observed {algorithm} hash {hasher.hexdigest()} of "
+                    f"{info.path} does not match {info.hashes[algorithm]}")
+
+        os.replace(tmp, path)
+
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+    logger.debug("Downloaded target %s", info.path)
+    return path
@@ -0,0 +1,152 @@
+"""Graph of targets and the in-toto evidence they depend on"""
+
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+from tuf.api.metadata import TargetFile
+
+from rstuf_in_toto.lookup import DEFAULT_WORKERS, lookup_targets
+
+logger = logging.getLogger(__name__)
+
+
+def in_toto_evidence(info) -> List[str]:
+    """Return the in-toto evidence paths listed in the custom metadata"""
+    return (info.custom or {}).get("in-toto", [])
+
+
+class EvidenceGraph:
+    """
+    Directed graph of target paths, with an edge from every target to each
+    in-toto evidence path listed in its custom metadata: from an artifact
+    to its layout and links, and from a layout to its keys.
+
+    ``infos`` maps the resolved paths to their target information, and
+    ``missing`` holds the paths that are not targets. Every path is looked
+    up once by ``resolve()``, however many targets share it.
+    """
+
+    def __init__(self, infos: Optional[Dict[str, TargetFile]] = None):
+        self.infos = {} if infos is None else infos
+        self.missing: Set[str] = set()
+        self._cyclic = None
+
+    def resolve(self, updater, targets: Iterable[str],
+                workers: int = DEFAULT_WORKERS):
+        """
+        Look up ``targets`` and all the evidence they depend on with a
+        refreshed ``updater``, skipping the paths already known.
+
+        Paths are looked up in batches, one level of evidence at a time,
+        so that paths falling into the same hash bin share a single bin
+        load (see ``lookup_targets()``).
+        """
+        pending = [
+            t for t in dict.fromkeys(targets)
+            if t not in self.infos and t not in self.missing
+        ]
+        while pending:
+            self._cyclic = None
+            evidence = {}
+            for path, info in lookup_targets(updater, pending,
+                                             workers).items():
+                if info is None:
+                    self.missing.add(path)
+                    continue
+
+                self.infos[path] = info
+                for f in in_toto_evidence(info):
+                    if f not in self.infos and f not in self.missing:
+                        evidence[f] = None
+            pending = list(evidence)
+
+    def closure(self, target: str) -> List[str]:
+        """
+        Return ``target`` and every path it depends on, each once, breadth
+        first. Dependencies of paths that were not resolved cannot be
+        followed.
+        """
+        closure = [target]
+        seen = {target}
+        for path in closure:
+            if path not in self.infos:
+                continue
+            for f in in_toto_evidence(self.infos[path]):
+                if f not in seen:
+                    seen.add(f)
+                    closure.append(f)
+        return closure
+
+    def cyclic(self) -> Set[str]:
+        """
+        Return the resolved paths that are part of a cycle, or depend on
+        one. These remain once paths whose dependencies are all acyclic
+        are removed one after another, like in Kahn's topological sort.
+        """
+        if self._cyclic is not None:
+            return self._cyclic
+
+        pending = {}
+        dependents = defaultdict(list)
+        for path, info in self.infos.items():
+            evidence = set(in_toto_evidence(info)) & self.infos.keys()
+            pending[path] = len(evidence)
+            for f in evidence:
+                dependents[f].append(path)
+
+        acyclic = [path for path, count in pending.items() if count == 0]
+        for path in acyclic:
+            for dependent in dependents[path]:
+                pending[dependent] -= 1
+                if pending[dependent] == 0:
+                    acyclic.append(dependent)
+
+        self._cyclic = self.infos.keys() - set(acyclic)
+        return self._cyclic
+
+    def cycle(self, target: str) -> Optional[List[str]]:
+        """Return a cycle ``target`` depends on, if there is any"""
+        cyclic = self.cyclic()
+        if target not in cyclic:
+            return None
+
+        # Every cyclic path depends on a cyclic path, walking from one to
+        # the next ends up going around a cycle
+        walk = [target]
+        index = {target: 0}
+        while True:
+            path = next(f for f in in_toto_evidence(self.infos[walk[-1]])
+                        if f in cyclic)
+            if path in index:
+                return walk[index[path]:] + [path]
+            index[path] = len(walk)
+            walk.append(path)
+
+    def problem(self, target: str) -> Optional[str]:
+        """
+        Return why ``target`` cannot be verified from the graph: it or
+        some of its evidence is missing, or its evidence refers back to
+        itself.
+        """
+        if target not in self.infos:
+            return f"Target {target} not found"
+        missing = [p for p in self.closure(target) if p not in self.infos]
+        if missing:
+            return f"Evidence {', '.join(missing)} of {target} not found"
+        cycle = self.cycle(target)
+        if cycle:
+            return f"Evidence of {target} has a cycle: {' -> '.join(cycle)}"
+        return None
+
+    def by_layout(self, targets: Iterable[str]) -> Dict[str, List[str]]:
+        """
+        Group ``targets`` by their layout, the first in-toto evidence of an
+        artifact, so that each layout is verified once for all of them.
+        Targets without in-toto evidence are grouped under ``None``.
+        """
+        groups = defaultdict(list)
+        for target in targets:
+            evidence = in_toto_evidence(self.infos[target])
+            groups[evidence[0] if evidence else None].append(target)
+        return dict(groups)
@@ -0,0 +1,65 @@
+"""Single-pass multi-algorithm hashing of target files"""
+
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+HASH_ALGORITHMS = ("blake2b-256", "sha256")
+CHUNK_SIZE = 1024 * 1024
+
+# Every thread reuses one read buffer instead of allocating per chunk
+_local = threading.local()
+
+
+def new_hash(algorithm):
+    """
+    Return a hashlib object for a TUF hash ``algorithm`` name.
+
+    Raises:
+        ValueError: The algorithm is not supported
+    """
+    if algorithm == "blake2b-256":
+        return hashlib.blake2b(digest_size=32)
+    return hashlib.new(algorithm)
+
+
+def hash_file(path, algorithms=HASH_ALGORITHMS):
+    """
+    Read ``path`` once and compute its length and its digests for every
+    algorithm in ``algorithms``.
+
+    Returns:
+        A ``(length, {algorithm: hexdigest})`` tuple
+    """
+    buf = getattr(_local, "buf", None)
+    if buf is None:
+        buf = _local.buf = bytearray(CHUNK_SIZE)
+    view = memoryview(buf)
+
+    hashers = {algorithm: new_hash(algorithm) for algorithm in algorithms}
+    length = 0
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            length += n
+            for hasher in hashers.values():
+                hasher.update(view[:n])
+
+    return length, {a: h.hexdigest() for a, h in hashers.items()}
+
+
+def hash_files(paths, algorithms=HASH_ALGORITHMS, workers=None):
+    """
+    Hash independent files in parallel. hashlib releases the GIL while
+    hashing, so threads hash on several cores.
+
+    Returns:
+        A dictionary of path to ``(length, {algorithm: hexdigest})``
+    """
+    paths = list(dict.fromkeys(paths))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(
+            zip(paths, executor.map(lambda p: hash_file(p, algorithms),
+                                    paths)))
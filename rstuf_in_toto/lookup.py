@@ -0,0 +1,97 @@
+"""Batched target lookups for repositories using hash-bin delegations"""
+
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+from tuf.api import exceptions
+from tuf.api.metadata import TargetFile, Targets
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 8
+
+
+def _download_bin(updater, role):
+    """Download the bin ``role`` as listed in the trusted snapshot"""
+    metainfo = updater._trusted_set.snapshot.signed.meta.get(f"{role}.json")
+    if metainfo is None:
+        raise exceptions.RepositoryError(
+            f"Role {role} was delegated but is not part of snapshot")
+
+    length = metainfo.length or updater.config.targets_max_length
+    version = None
+    if updater._trusted_set.root.signed.consistent_snapshot:
+        version = metainfo.version
+    return updater._download_metadata(role, length, version)
+
+
+def load_bins(updater, roles, workers: int = DEFAULT_WORKERS):
+    """
+    Load the hash bins ``roles`` into ``updater`` like
+    ``Updater._load_targets()`` does, but download the bins without a
+    current local copy concurrently. Every bin is still verified against
+    the trusted snapshot and the top-level targets delegation before use.
+    """
+    trusted_set = updater._trusted_set
+    missing = []
+    for role in roles:
+        if role in trusted_set:
+            continue
+        try:
+            trusted_set.update_delegated_targets(
+                updater._load_local_metadata(role), role, Targets.type)
+        except (OSError, exceptions.RepositoryError) as e:
+            logger.debug("Failed to load local %s: %s", role, e)
+            missing.append(role)
+
+    if not missing:
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        downloads = executor.map(lambda r: _download_bin(updater, r), missing)
+        for role, data in zip(missing, downloads):
+            trusted_set.update_delegated_targets(data, role, Targets.type)
+            updater._persist_metadata(role, data)
+
+
+def lookup_targets(updater,
+                   paths: Iterable[str],
+                   workers: int = DEFAULT_WORKERS
+                   ) -> Dict[str, Optional[TargetFile]]:
+    """
+    Look up the target information of many ``paths`` with a refreshed
+    ``updater``.
+
+    If the top-level targets delegate with succinct hash bins, as RSTUF
+    does, paths are grouped per bin and only the bins holding them are
+    loaded, once each (see ``load_bins()``). The result is the same as
+    calling ``updater.get_targetinfo()`` per path, which is used for any
+    other delegation layout.
+
+    Returns:
+        A dictionary of path to its target information, or None if the
+        path is not a target
+    """
+    top = updater._trusted_set.targets.signed
+    delegations = top.delegations
+    succinct = delegations.succinct_roles if delegations else None
+
+    results = {}
+    bins = defaultdict(list)
+    for path in paths:
+        if path in top.targets:
+            results[path] = top.targets[path]
+        elif succinct is not None:
+            bins[succinct.get_role_for_target(path)].append(path)
+        else:
+            results[path] = updater.get_targetinfo(path)
+
+    load_bins(updater, bins, workers)
+    for role, group in bins.items():
+        targets = updater._trusted_set[role].signed.targets
+        for path in group:
+            results[path] = targets.get(path)
+
+    return results
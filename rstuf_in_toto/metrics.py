@@ -0,0 +1,181 @@
+"""
+Timed spans and counters of the client phases, written to a metrics file.
+
+Instrumented code calls the module functions ``span()``, ``observe()`` and
+``count()``, which do nothing until ``enable()`` is called, so they cost a
+function call when metrics are disabled. This module has no dependencies,
+like ``defaults``, so the CLI imports it at startup.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Optional
+
+PREFIX = "rstuf_in_toto"
+PROMETHEUS_SUFFIX = ".prom"
+
+_metrics = None
+_disabled = nullcontext()
+
+
+def _escape(value) -> str:
+    return (str(value).replace("\\", "\\\\").replace('"', '\\"').replace(
+        "\n", "\\n"))
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class Metrics:
+    """
+    Collect the timed spans and counters of a client run for ``path``.
+
+    A path ending in ``.prom`` gets the Prometheus text format, as read by
+    the textfile collector of the node exporter: the number and total
+    seconds of the spans of every name, and the counter totals, written on
+    ``close()``. Any other path gets JSON lines, one per span as it ends,
+    with its start time, thread and labels, followed by the counter totals
+    on ``close()``.
+
+    Only the aggregates are kept in memory, so a long-running daemon can
+    collect metrics for its whole life.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.prometheus = path.endswith(PROMETHEUS_SUFFIX)
+        self.spans = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._file = None if self.prometheus else open(path, "w")
+
+    @contextmanager
+    def span(self, name: str, labels: dict):
+        """Time the block as the span ``name`` with ``labels``"""
+        start = time.time()
+        begin = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - begin, labels, start,
+                         error)
+
+    def observe(self,
+                name: str,
+                seconds: float,
+                labels: dict,
+                start: Optional[float] = None,
+                error: Optional[str] = None):
+        """Record a span ``name`` that took ``seconds``"""
+        with self._lock:
+            total = self.spans.setdefault(name, [0, 0.0])
+            total[0] += 1
+            total[1] += seconds
+            if self._file is None:
+                return
+            record = {
+                "type": "span",
+                "name": name,
+                "start": start if start is not None else time.time() - seconds,
+                "seconds": seconds,
+                "thread": threading.current_thread().name,
+                "labels": labels,
+            }
+            if error:
+                record["error"] = error
+            self._file.write(json.dumps(record) + "\n")
+
+    def count(self, name: str, value: float, labels: dict):
+        """Add ``value`` to the counter ``name`` with ``labels``"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def _prometheus(self) -> str:
+        lines = [f"# TYPE {PREFIX}_span_seconds summary"]
+        for name, (count, seconds) in sorted(self.spans.items()):
+            labels = _labels([("span", name)])
+            lines.append(f"{PREFIX}_span_seconds_sum{labels} {seconds}")
+            lines.append(f"{PREFIX}_span_seconds_count{labels} {count}")
+        typed = set()
+        for (name, labels), value in sorted(self.counters.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+                typed.add(name)
+            lines.append(f"{PREFIX}_{name}_total{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        """Write the counters, and the spans in Prometheus format"""
+        with self._lock:
+            if self._file is not None:
+                for (name, labels), value in sorted(self.counters.items()):
+                    self._file.write(
+                        json.dumps({
+                            "type": "counter",
+                            "name": name,
+                            "value": value,
+                            "labels": dict(labels),
+                        }) + "\n")
+                self._file.close()
+                self._file = None
+                return
+
+            # Replace the file at once, the collector may read it any time
+            tmp = f"{self.path}.{os.getpid()}"
+            with open(tmp, "w") as f:
+                f.write(self._prometheus())
+            os.replace(tmp, self.path)
+
+
+def enable(path: str) -> Metrics:
+    """
+    Start collecting metrics for ``path``, see ``Metrics``.
+
+    Raises:
+        OSError: The metrics file cannot be written
+    """
+    global _metrics
+    _metrics = Metrics(path)
+    return _metrics
+
+
+def close():
+    """Write the collected metrics and stop collecting"""
+    global _metrics
+    if _metrics is not None:
+        metrics, _metrics = _metrics, None
+        metrics.close()
+
+
+def enabled() -> bool:
+    return _metrics is not None
+
+
+def span(name: str, **labels):
+    """Return a context manager timing its block as the span ``name``"""
+    if _metrics is None:
+        return _disabled
+    return _metrics.span(name, labels)
+
+
+def observe(name: str, seconds: float, **labels):
+    """Record a span ``name`` timed by the caller"""
+    if _metrics is not None:
+        _metrics.observe(name, seconds, labels)
+
+
+def count(name: str, value: float = 1, **labels):
+    """Add ``value`` to the counter ``name``"""
+    if _metrics is not None:
+        _metrics.count(name, value, labels)
@@ -0,0 +1,423 @@
+"""Run the steps of an in-toto layout for many projects concurrently"""
+
+import glob
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+try:
+    import tomllib
+except ModuleNotFoundError:
+    import tomli as tomllib
+
+from in_toto.models.metadata import Metadata
+from in_toto.rulelib import unpack_rule
+from securesystemslib.exceptions import Error as SSLibError
+
+from rstuf_in_toto.record import (DigestCache, load_signing_key, record_start,
+                                  record_stop, run_step)
+
+logger = logging.getLogger(__name__)
+
+LINK_NAME = re.compile(r"^(?P<step>.+)\.[0-9a-f]{8}\.link$")
+
+
+@dataclass
+class StepRun:
+    """
+    How projects perform a step of the layout. Materials and products are
+    paths relative to the project, and may be glob patterns. ``changes``
+    maps paths of the project to files copied over them while the step is
+    recorded, like a manual change between ``in-toto-record start`` and
+    ``stop``.
+    """
+    name: str
+    key: dict
+    materials: List[str] = field(default_factory=list)
+    products: List[str] = field(default_factory=list)
+    command: List[str] = field(default_factory=list)
+    changes: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class Pipeline:
+    """
+    The steps of a layout with the steps each one depends on, and the
+    patterns of the artifacts to collect from every project
+    """
+    steps: Dict[str, StepRun]
+    dependencies: Dict[str, List[str]]
+    artifacts: List[str] = field(default_factory=list)
+
+
+@dataclass
+class ProjectResult:
+    """Outcome of the pipeline for a single project"""
+    project: str
+    out_dir: str
+    links: Dict[str, List[str]] = field(default_factory=dict)
+    artifacts: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+@dataclass
+class _Changes:
+    """The files a step wrote and deleted in its work directory"""
+    workdir: str
+    written: List[str]
+    deleted: List[str]
+
+
+def step_dependencies(layout) -> Dict[str, List[str]]:
+    """
+    Return the steps of a ``layout`` parsed from TOML with the steps whose
+    links their MATCH rules refer to, in an order running every step after
+    the ones it depends on.
+
+    Raises:
+        FormatError: A rule is malformed
+        ValueError: Steps depend on each other
+    """
+    names = [step["name"] for step in layout.get("steps", [])]
+    dependencies = {}
+    for step in layout.get("steps", []):
+        needs = []
+        for rule in (step.get("expected_materials", []) +
+                     step.get("expected_products", [])):
+            rule_data = unpack_rule(rule.split())
+            source = rule_data.get("dest_name")
+            if source in names and source != step["name"]:
+                needs.append(source)
+        dependencies[step["name"]] = sorted(set(needs))
+
+    ordered = {}
+    while len(ordered) < len(dependencies):
+        ready = [
+            name for name, needs in dependencies.items()
+            if name not in ordered and all(n in ordered for n in needs)
+        ]
+        if not ready:
+            raise ValueError("Steps depend on each other: " + ", ".join(
+                name for name in dependencies if name not in ordered))
+        for name in ready:
+            ordered[name] = dependencies[name]
+
+    return ordered
+
+
+def load_pipeline(layout_path: str, config_path: str) -> Pipeline:
+    """
+    Build the pipeline of the layout at ``layout_path`` (in TOML, as given
+    to ``in-toto-layout-gen``) with the steps of the pipeline configuration
+    at ``config_path``, e.g.::
+
+        artifacts = ["*-py3-none-any.whl"]
+
+        [steps.build]
+        key = "../private_keys/alice"
+        materials = ["pyproject.toml", "README.md", "src"]
+        products = ["*-py3-none-any.whl"]
+        command = ["python3", "-m", "build", "--wheel", "--outdir", "."]
+
+    Key paths and change sources are relative to the configuration.
+
+    Raises:
+        FormatError: A rule of the layout is malformed
+        ValueError: A step of the layout is not configured, is configured
+            with both a command and changes, or steps depend on each other
+    """
+    with open(layout_path, "rb") as f:
+        dependencies = step_dependencies(tomllib.load(f))
+    with open(config_path, "rb") as f:
+        config = tomllib.load(f)
+
+    config_dir = os.path.dirname(os.path.abspath(config_path))
+    keys = {}
+    steps = {}
+    for name in dependencies:
+        step = config.get("steps", {}).get(name)
+        if step is None:
+            raise ValueError(f"Step {name} of {layout_path} is not "
+                             f"configured in {config_path}")
+        if step.get("command") and step.get("changes"):
+            raise ValueError(f"Step {name} in {config_path} has both a "
+                             "command and changes")
+
+        key_path = os.path.join(config_dir, step["key"])
+        if key_path not in keys:
+            keys[key_path] = load_signing_key(key_path)
+        steps[name] = StepRun(
+            name=name,
+            key=keys[key_path],
+            materials=step.get("materials", []),
+            products=step.get("products", []),
+            command=step.get("command", []),
+            changes={
+                path: os.path.join(config_dir, source)
+                for path, source in step.get("changes", {}).items()
+            },
+        )
+
+    return Pipeline(steps, dependencies, config.get("artifacts", []))
+
+
+def _artifacts(patterns, project) -> List[str]:
+    """Return the files of ``project`` matching ``patterns``"""
+    paths = set()
+    for pattern in patterns:
+        paths.update(
+            os.path.relpath(path, project)
+            for path in glob.glob(os.path.join(project, pattern))
+            if os.path.isfile(path))
+    return sorted(paths)
+
+
+def find_links(directory: str) -> Dict[str, List[str]]:
+    """
+    Return the paths of the link files in ``directory`` by step name
+
+    Returns:
+        A dictionary of step name to link paths
+    """
+    links = {}
+    for name in sorted(os.listdir(directory)):
+        match = LINK_NAME.match(name)
+        if match:
+            links.setdefault(match.group("step"), []).append(
+                os.path.join(directory, name))
+    return links
+
+
+def _ancestors(dependencies, step) -> List[str]:
+    """
+    Return the steps ``step`` depends on, directly or not, in the order of
+    ``dependencies`` (see ``step_dependencies()``)
+    """
+    needed = set(dependencies[step])
+    for name in reversed(list(dependencies)):
+        if name in needed:
+            needed.update(dependencies[name])
+    return [name for name in dependencies if name in needed]
+
+
+def _snapshot(directory) -> Dict[str, tuple]:
+    """
+    Return the size, mtime, inode and mode of the files and symbolic links
+    below ``directory`` by relative path
+    """
+    files = {}
+    for root, dirs, names in os.walk(directory):
+        links = [d for d in dirs if os.path.islink(os.path.join(root, d))]
+        for name in names + links:
+            path = os.path.join(root, name)
+            st = os.lstat(path)
+            files[os.path.relpath(path, directory)] = (st.st_size,
+                                                       st.st_mtime_ns,
+                                                       st.st_ino, st.st_mode)
+    return files
+
+
+def _apply(changes: _Changes, directory: str):
+    """Repeat the ``changes`` of a step in ``directory``"""
+    for path in changes.deleted:
+        try:
+            os.remove(os.path.join(directory, path))
+        except FileNotFoundError:
+            pass
+    for path in changes.written:
+        target = os.path.join(directory, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.lexists(target):
+            os.remove(target)
+        shutil.copy2(os.path.join(changes.workdir, path), target,
+                     follow_symlinks=False)
+
+
+def _run_isolated(run: StepRun, base: str, workdir: str,
+                  ancestors: List[_Changes], out_dir: str,
+                  cache: Optional[DigestCache]) -> _Changes:
+    """
+    Perform and record the step ``run`` in ``workdir``, a copy of ``base``
+    with the changes of the steps it depends on, ``ancestors``, so that it
+    does not see the changes of steps running at the same time.
+
+    Raises:
+        subprocess.CalledProcessError: The command of the step failed
+
+    Returns:
+        The changes of the step
+    """
+    shutil.copytree(base, workdir, symlinks=True)
+    for changes in ancestors:
+        _apply(changes, workdir)
+
+    before = _snapshot(workdir)
+    _run(run, workdir, out_dir, cache)
+    after = _snapshot(workdir)
+    return _Changes(workdir,
+                    [path for path, st in after.items()
+                     if before.get(path) != st],
+                    [path for path in before if path not in after])
+
+
+def _run(run: StepRun, project: str, out_dir: str,
+         cache: Optional[DigestCache]):
+    """
+    Perform and record the step ``run`` in ``project``, with its link
+    written to ``out_dir``.
+
+    Raises:
+        subprocess.CalledProcessError: The command of the step failed
+    """
+    logger.info("Running step %s in %s", run.name, project)
+    if run.changes:
+        record_start(run.name, run.key, run.materials, project, cache)
+        for path, source in run.changes.items():
+            shutil.copyfile(source, os.path.join(project, path))
+        record_stop(run.name, run.key, run.products, project, out_dir, cache)
+        return
+
+    link = run_step(run.name, run.key, run.materials, run.products,
+                    run.command, project, out_dir, cache)
+    returncode = Metadata.load(link).signed.byproducts.get("return-value")
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, run.command)
+
+
+def run_pipeline(pipeline: Pipeline,
+                 projects: List[str],
+                 out_root: str,
+                 jobs: int,
+                 cache: Optional[DigestCache] = None
+                 ) -> List[ProjectResult]:
+    """
+    Put every project directory of ``projects`` through the steps of
+    ``pipeline``, in up to ``jobs`` concurrent steps.
+
+    Each project is copied to a work directory inside ``out_root`` first,
+    so the steps and their changes leave the project itself untouched and
+    every run records the same materials. Steps run once the steps they
+    depend on are done, so independent steps of a project and the steps of
+    different projects run concurrently. Every step runs in its own copy,
+    with the changes of the steps it depends on but not those of the steps
+    running at the same time. Links are written to
+    ``<out_root>/<project name>``, along with the artifacts of the project,
+    and found there after the run. A failed step only skips the steps
+    depending on it, directly or not; the other steps of the project still
+    run, but the project is failed and its artifacts are not collected.
+
+    Raises:
+        ValueError: Several projects have the same name
+
+    Returns:
+        A ProjectResult per project
+    """
+    names = [os.path.basename(os.path.abspath(p)) for p in projects]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Project names are not unique: {names}")
+
+    os.makedirs(out_root, exist_ok=True)
+    work_root = tempfile.mkdtemp(prefix=".pipeline-", dir=out_root)
+    try:
+        return _run_projects(pipeline, projects, names, out_root, work_root,
+                             jobs, cache)
+    finally:
+        shutil.rmtree(work_root, ignore_errors=True)
+
+
+def _run_projects(pipeline, projects, names, out_root, work_root, jobs,
+                  cache):
+    """Run ``pipeline`` in copies of ``projects`` inside ``work_root``"""
+    results = {}
+    workdirs = {}
+    remaining = {}
+    failed = {}
+    changes = {}
+    for project, name in zip(projects, names):
+        out_dir = os.path.join(out_root, name)
+        os.makedirs(out_dir, exist_ok=True)
+        results[project] = ProjectResult(name, out_dir)
+        workdirs[project] = os.path.join(work_root, name)
+        shutil.copytree(project, os.path.join(workdirs[project], "base"),
+                        symlinks=True)
+        remaining[project] = {
+            step: set(needs) for step, needs in pipeline.dependencies.items()
+        }
+        failed[project] = set()
+        changes[project] = {}
+
+    def skip_dependents(project):
+        """Drop the steps depending on a failed or skipped step"""
+        skipped = True
+        while skipped:
+            skipped = [
+                step for step, needs in remaining[project].items()
+                if needs & failed[project]
+            ]
+            for step in skipped:
+                logger.warning("Skipping step %s of %s", step, project)
+                del remaining[project][step]
+                failed[project].add(step)
+
+    running = {}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+
+        def submit_ready(project):
+            for step, needs in list(remaining[project].items()):
+                if not needs:
+                    del remaining[project][step]
+                    future = executor.submit(
+                        _run_isolated, pipeline.steps[step],
+                        os.path.join(workdirs[project], "base"),
+                        os.path.join(workdirs[project], "steps", step), [
+                            changes[project][name] for name in _ancestors(
+                                pipeline.dependencies, step)
+                        ], results[project].out_dir, cache)
+                    running[future] = (project, step)
+
+        for project in projects:
+            submit_ready(project)
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                project, step = running.pop(future)
+                try:
+                    changes[project][step] = future.result()
+                except (OSError, SSLibError, ValueError,
+                        subprocess.SubprocessError) as e:
+                    logger.error("Step %s of %s failed: %s", step, project, e)
+                    error = f"Step {step} failed: {type(e).__name__}: {e}"
+                    result = results[project]
+                    result.error = (error if result.error is None else
+                                    f"{result.error}; {error}")
+                    failed[project].add(step)
+                    skip_dependents(project)
+                    continue
+
+                for needs in remaining[project].values():
+                    needs.discard(step)
+                submit_ready(project)
+
+    for project, result in results.items():
+        if result.error is None:
+            # The project after all its steps
+            workdir = os.path.join(workdirs[project], "base")
+            for step in pipeline.dependencies:
+                _apply(changes[project][step], workdir)
+            for path in _artifacts(pipeline.artifacts, workdir):
+                shutil.move(os.path.join(workdir, path),
+                            os.path.join(result.out_dir, path))
+                result.artifacts.append(path)
+        result.links = find_links(result.out_dir)
+        missing = [s for s in pipeline.steps if s not in result.links]
+        if result.error is None and missing:
+            result.error = f"No links of {', '.join(missing)}"
+
+    return list(results.values())
@@ -0,0 +1,145 @@
+"""Collect a release (artifacts with layout, keys and links) for publishing"""
+
+import glob
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+try:
+    import tomllib
+except ModuleNotFoundError:
+    import tomli as tomllib
+
+from in_toto.exceptions import SignatureVerificationError
+from in_toto.models.link import FILENAME_FORMAT
+from in_toto.models.metadata import Metadata
+from securesystemslib import interface
+
+EVIDENCE_SUFFIXES = (".layout", ".pub", ".link")
+
+
+@dataclass
+class Release:
+    """
+    A release to publish. All paths are target paths, relative to
+    ``base_dir``.
+    """
+    base_dir: str
+    layout: str
+    keys: List[str]
+    artifacts: Dict[str, List[str]] = field(default_factory=dict)
+
+    def targets(self):
+        """
+        Return ``(path, custom)`` pairs for every file of the release. The
+        evidence comes first, so chunked uploads never publish an artifact
+        before the evidence it refers to.
+        """
+        entries = {self.layout: {"in-toto": self.keys}}
+        for key in self.keys:
+            entries[key] = None
+        for links in self.artifacts.values():
+            for link in links:
+                entries[link] = None
+        for artifact, links in self.artifacts.items():
+            entries[artifact] = {"in-toto": [self.layout] + links}
+
+        return list(entries.items())
+
+
+def _layout_keys(layout_path, key_paths):
+    """Return the key files whose keys signed the layout"""
+    metadata = Metadata.load(layout_path)
+    signers = []
+    for path in key_paths:
+        for key in interface.import_publickeys_from_file([path]).values():
+            try:
+                metadata.verify_signature(key)
+            except SignatureVerificationError:
+                continue
+            signers.append(path)
+
+    return metadata.get_payload(), signers
+
+
+def _layout_links(layout, base_dir):
+    """Return the link files present in ``base_dir`` for the layout steps"""
+    links = []
+    for step in layout.steps:
+        for keyid in step.pubkeys:
+            name = FILENAME_FORMAT.format(step_name=step.name, keyid=keyid)
+            if os.path.isfile(os.path.join(base_dir, name)):
+                links.append(name)
+
+    return links
+
+
+def scan_release(base_dir):
+    """
+    Build a release from a directory such as ``dist/``. The directory must
+    hold exactly one ``*.layout``. Layout keys are the ``*.pub`` files that
+    verify the layout signature, links are the ``*.link`` files named after
+    the layout steps, and every other file is an artifact.
+
+    Raises:
+        ValueError: The directory does not hold a single signed layout
+    """
+    names = sorted(
+        os.path.relpath(p, base_dir)
+        for p in glob.glob(os.path.join(base_dir, "*")) if os.path.isfile(p))
+    layouts = [n for n in names if n.endswith(".layout")]
+    if len(layouts) != 1:
+        raise ValueError(
+            f"Expected one layout in {base_dir}, found {len(layouts)}")
+
+    pubs = [n for n in names if n.endswith(".pub")]
+    layout, keys = _layout_keys(os.path.join(base_dir, layouts[0]),
+                                [os.path.join(base_dir, p) for p in pubs])
+    if not keys:
+        raise ValueError(f"No key in {base_dir} signed {layouts[0]}")
+
+    links = _layout_links(layout, base_dir)
+    artifacts = {
+        n: links
+        for n in names if not n.endswith(EVIDENCE_SUFFIXES)
+    }
+    return Release(base_dir, layouts[0],
+                   [os.path.relpath(k, base_dir) for k in keys], artifacts)
+
+
+def load_manifest(path):
+    """
+    Build a release from a TOML or JSON manifest, e.g.::
+
+        layout = "root.layout"
+        keys = ["alice.pub"]
+
+        [artifacts]
+        "test_project-0.0.1-py3-none-any.whl" = [
+            "create.556caebd.link",
+            "build.556caebd.link",
+        ]
+
+    Paths are relative to the directory of the manifest.
+    """
+    if path.endswith(".json"):
+        with open(path) as f:
+            manifest = json.load(f)
+    else:
+        with open(path, "rb") as f:
+            manifest = tomllib.load(f)
+
+    return Release(
+        os.path.dirname(os.path.abspath(path)),
+        manifest["layout"],
+        manifest["keys"],
+        manifest.get("artifacts", {}),
+    )
+
+
+def load_release(path):
+    """Build a release from a directory or a manifest file"""
+    if os.path.isdir(path):
+        return scan_release(path)
+    return load_manifest(path)
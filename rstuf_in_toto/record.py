@@ -0,0 +1,290 @@
+"""Record and sign in-toto links reusing the digests of unchanged files"""
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import stat
+import subprocess
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import in_toto.settings
+from in_toto.models.link import (FILENAME_FORMAT, UNFINISHED_FILENAME_FORMAT,
+                                 Link)
+from in_toto.models.metadata import Metablock, Metadata
+from pathspec import PathSpec
+from securesystemslib import interface
+from securesystemslib.signer import SSlibSigner
+
+logger = logging.getLogger(__name__)
+
+# Files modified this recently may still change within the resolution of
+# their mtime, their digests are not cached
+RACY_WINDOW_NS = 2 * 10**9
+
+
+def artifact_exclude() -> PathSpec:
+    """Return the artifact exclude patterns of the in-toto settings"""
+    return PathSpec.from_lines("gitwildmatch",
+                               in_toto.settings.ARTIFACT_EXCLUDE_PATTERNS)
+
+
+def hash_file(path) -> Dict[str, str]:
+    """Return the in-toto hash dictionary of the file at ``path``"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return {"sha256": digest.hexdigest()}
+
+
+class DigestCache:
+    """
+    Digests of recorded files stored in the JSON file ``path``, keyed on
+    their absolute path, size, mtime and inode.
+
+    A file whose size, mtime or inode changed, or which was replaced, is
+    hashed again. Files modified less than ``RACY_WINDOW_NS`` before they
+    were hashed are never cached, so that a change within the mtime
+    resolution of the filesystem is not missed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._changed = False
+        try:
+            with open(path) as f:
+                self._entries = json.load(f)
+        except FileNotFoundError:
+            self._entries = {}
+        except ValueError:
+            logger.warning("Ignoring unreadable digest cache %s", path)
+            self._entries = {}
+
+    def digest(self, path: str, st: Optional[os.stat_result] = None
+               ) -> Dict[str, str]:
+        """Return the hash dictionary of the file at ``path`` with ``st``"""
+        key = os.path.abspath(path)
+        st = st or os.stat(key)
+        fingerprint = [st.st_size, st.st_mtime_ns, st.st_ino]
+        entry = self._entries.get(key)
+        if entry and entry[:3] == fingerprint:
+            self.hits += 1
+            return dict(entry[3])
+
+        hashes = hash_file(key)
+        self.misses += 1
+        if time.time_ns() - st.st_mtime_ns > RACY_WINDOW_NS:
+            with self._lock:
+                self._entries[key] = fingerprint + [hashes]
+                self._changed = True
+        return hashes
+
+    def save(self):
+        """
+        Write the cache back to its file, if it changed, without the
+        entries of files that no longer exist, such as those of removed
+        work copies, so that the cache does not grow with every run
+        """
+        with self._lock:
+            gone = [key for key in self._entries if not os.path.exists(key)]
+            for key in gone:
+                del self._entries[key]
+            self._changed = self._changed or bool(gone)
+        if not self._changed:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)),
+                    exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}-{threading.get_ident()}"
+        with open(tmp, "w") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp, self.path)
+        self._changed = False
+
+
+def _expand(patterns, base_path):
+    for pattern in patterns:
+        if not glob.has_magic(pattern):
+            yield pattern
+            continue
+        for path in glob.glob(os.path.join(base_path, pattern)):
+            yield os.path.relpath(path, base_path)
+
+
+def _walk(directory, rel_dir, exclude):
+    """
+    Yield the relative path, path and stat of the files below
+    ``directory`` not matching ``exclude``. Like in-toto, symbolic links
+    to files are followed, but not those to directories.
+    """
+    with os.scandir(directory) as entries:
+        entries = list(entries)
+    for entry in entries:
+        rel_path = entry.name if rel_dir == "." else f"{rel_dir}/{entry.name}"
+        if exclude.match_file(rel_path):
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            yield from _walk(entry.path, rel_path, exclude)
+            continue
+        try:
+            st = entry.stat()
+        except FileNotFoundError:
+            logger.info("File '%s' appears to be a broken symlink. "
+                        "Skipping...", rel_path)
+            continue
+        if stat.S_ISREG(st.st_mode):
+            yield rel_path, entry.path, st
+
+
+def record_artifacts(paths: Iterable[str],
+                     base_path: str = ".",
+                     cache: Optional[DigestCache] = None
+                     ) -> Dict[str, Dict[str, str]]:
+    """
+    Record the files at ``paths`` relative to ``base_path``, recursing into
+    directories, like ``in-toto-run`` records its materials and products,
+    without changing the process working directory. Paths may be glob
+    patterns, expanded when recording, as a shell would have expanded them
+    in ``base_path``. Files are hashed through ``cache`` if given, with the
+    stat of the directory walk.
+
+    Returns:
+        A dictionary of relative artifact paths to hash dictionaries
+    """
+    exclude = artifact_exclude()
+    paths = {
+        os.path.normpath(path).replace("\\", "/")
+        for path in _expand(paths, base_path)
+    }
+    artifacts = {}
+    for path in sorted(paths - set(exclude.match_files(paths))):
+        full_path = os.path.join(base_path, path)
+        if os.path.isfile(full_path):
+            files = [(path, full_path, None)]
+        elif os.path.isdir(full_path):
+            files = _walk(full_path, path, exclude)
+        else:
+            logger.info("path: %s does not exist, skipping..", path)
+            continue
+
+        for rel_path, file_path, st in files:
+            if cache:
+                artifacts[rel_path] = cache.digest(file_path, st)
+            else:
+                artifacts[rel_path] = hash_file(file_path)
+
+    return artifacts
+
+
+def load_signing_key(path: str) -> dict:
+    """Load the unencrypted RSA private key at ``path``"""
+    return interface.import_rsa_privatekey_from_file(path)
+
+
+def _sign(link, key, path_format, directory) -> str:
+    metadata = Metablock(signed=link)
+    metadata.create_signature(SSlibSigner(key))
+    path = os.path.join(directory,
+                        path_format.format(step_name=link.name,
+                                           keyid=key["keyid"]))
+    metadata.dump(path)
+    return path
+
+
+def run_step(name: str,
+             key: dict,
+             materials: Iterable[str] = (),
+             products: Iterable[str] = (),
+             command: Optional[List[str]] = None,
+             base_path: str = ".",
+             metadata_directory: str = ".",
+             cache: Optional[DigestCache] = None) -> str:
+    """
+    Record the step ``name`` like ``in-toto-run``: record ``materials``,
+    run ``command`` in ``base_path`` if any, record ``products``, and
+    write the link signed with ``key`` to ``metadata_directory``.
+
+    Returns:
+        The path of the link
+    """
+    logger.info("Running '%s'...", name)
+    recorded = record_artifacts(materials, base_path, cache)
+    byproducts = {}
+    if command:
+        logger.info("Running command '%s'...", " ".join(command))
+        process = subprocess.run(
+            command,
+            cwd=base_path,
+            check=False,
+            timeout=float(in_toto.settings.LINK_CMD_EXEC_TIMEOUT),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        byproducts = {
+            "stdout": "",
+            "stderr": "",
+            "return-value": process.returncode
+        }
+
+    link = Link(name=name,
+                materials=recorded,
+                products=record_artifacts(products, base_path, cache),
+                command=command or [],
+                byproducts=byproducts)
+    return _sign(link, key, FILENAME_FORMAT, metadata_directory)
+
+
+def record_start(name: str,
+                 key: dict,
+                 materials: Iterable[str] = (),
+                 base_path: str = ".",
+                 cache: Optional[DigestCache] = None) -> str:
+    """
+    Start recording the step ``name`` like ``in-toto-record start``, with
+    the preliminary link written to ``base_path``.
+
+    Returns:
+        The path of the preliminary link
+    """
+    logger.info("Start recording '%s'...", name)
+    link = Link(name=name,
+                materials=record_artifacts(materials, base_path, cache))
+    return _sign(link, key, UNFINISHED_FILENAME_FORMAT, base_path)
+
+
+def record_stop(name: str,
+                key: dict,
+                products: Iterable[str] = (),
+                base_path: str = ".",
+                metadata_directory: str = ".",
+                cache: Optional[DigestCache] = None) -> str:
+    """
+    Stop recording the step ``name`` started with ``record_start()``, like
+    ``in-toto-record stop``, and write the link signed with ``key`` to
+    ``metadata_directory``.
+
+    Raises:
+        SignatureVerificationError: The preliminary link is not signed by
+            ``key``
+
+    Returns:
+        The path of the link
+    """
+    logger.info("Stop recording '%s'...", name)
+    unfinished = os.path.join(
+        base_path,
+        UNFINISHED_FILENAME_FORMAT.format(step_name=name, keyid=key["keyid"]))
+    metadata = Metadata.load(unfinished)
+    metadata.verify_signature(key)
+
+    link = metadata.get_payload()
+    link.products = record_artifacts(products, base_path, cache)
+    path = _sign(link, key, FILENAME_FORMAT, metadata_directory)
+    os.remove(unfinished)
+    return path
@@ -0,0 +1,84 @@
+"""Throttle TUF metadata refreshes between close client runs"""
+
+import logging
+import os
+import time
+
+from tuf.api import exceptions
+from tuf.api.metadata import Snapshot, Targets, Timestamp
+
+from rstuf_in_toto import metrics
+
+logger = logging.getLogger(__name__)
+
+STAMP_FILE = ".refreshed"
+
+
+def load_trusted(updater):
+    """
+    Load the top-level metadata persisted by an earlier refresh into a new
+    ``updater``, without network access.
+
+    The metadata goes through the same checks as in ``Updater.refresh()``:
+    signatures, versions and expiry of root, timestamp, snapshot and
+    targets, so expired metadata is never used.
+
+    Raises:
+        OSError: Local metadata is missing
+        RepositoryError: Local metadata is not valid, e.g. expired
+    """
+    trusted_set = updater._trusted_set
+    trusted_set.update_timestamp(updater._load_local_metadata(Timestamp.type))
+    trusted_set.update_snapshot(updater._load_local_metadata(Snapshot.type),
+                                trusted=True)
+    trusted_set.update_targets(updater._load_local_metadata(Targets.type))
+
+
+def refresh_updater(build_updater, metadata_dir: str, max_age: float):
+    """
+    Return an Updater with verified top-level metadata, created by
+    ``build_updater()``.
+
+    If a network refresh succeeded less than ``max_age`` seconds ago, its
+    persisted metadata is loaded with ``load_trusted()``, so that rapid or
+    batched calls share one verified snapshot. Otherwise, or if the local
+    metadata is not valid anymore, the Updater is refreshed over the
+    network. A ``max_age`` of 0 always refreshes.
+
+    Returns:
+        A refreshed ``Updater``
+    """
+    stamp = os.path.join(metadata_dir, STAMP_FILE)
+    try:
+        age = time.time() - os.stat(stamp).st_mtime
+    except FileNotFoundError:
+        age = None
+
+    if age is not None and 0 <= age < max_age:
+        updater = build_updater()
+        try:
+            load_trusted(updater)
+            logger.info("Reusing metadata refreshed %.1fs ago", age)
+            metrics.count("metadata_reused")
+            return updater
+        except (OSError, exceptions.RepositoryError) as e:
+            # The trusted set cannot be rolled back, refresh a new Updater
+            logger.info("Local metadata not usable, refreshing: %s", e)
+
+    updater = build_updater()
+    updater.refresh()
+    with open(stamp, "a"):
+        os.utime(stamp)
+
+    return updater
+
+
+def discard_refresh(metadata_dir: str):
+    """
+    Make the next ``refresh_updater()`` call refresh over the network, e.g.
+    after this client changed the repository.
+    """
+    try:
+        os.remove(os.path.join(metadata_dir, STAMP_FILE))
+    except FileNotFoundError:
+        pass
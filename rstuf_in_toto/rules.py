@@ -0,0 +1,260 @@
+"""Indexed evaluation of in-toto artifact rules for large links"""
+
+import bisect
+import fnmatch
+import functools
+import logging
+import os
+import re
+import sys
+
+from in_toto.exceptions import RuleVerificationError
+from in_toto.rulelib import unpack_rule
+
+logger = logging.getLogger(__name__)
+
+_META = re.compile(r"[*?[]")
+
+# Paths are only case folded where the filesystem is case-insensitive
+_CASE_FOLDING = os.path.normcase("A") != "A"
+
+
+@functools.lru_cache(maxsize=4096)
+def _compile(pattern):
+    return re.compile(fnmatch.translate(os.path.normcase(pattern))).match
+
+
+def _literal_prefix(pattern):
+    meta = _META.search(pattern)
+    return pattern[:meta.start()] if meta else pattern
+
+
+def _literal_suffix(pattern):
+    # Stop at any character that may close a wildcard or class
+    for i in range(len(pattern) - 1, -1, -1):
+        if pattern[i] in "*?[]":
+            return pattern[i + 1:]
+    return pattern
+
+
+def _range(index, literal):
+    """Return the slice of the sorted ``index`` starting with ``literal``"""
+    start = bisect.bisect_left(index, literal)
+    if not literal or literal[-1] == chr(sys.maxunicode):
+        end = len(index)
+    else:
+        # The first string sorting after all those starting with literal
+        successor = literal[:-1] + chr(ord(literal[-1]) + 1)
+        end = bisect.bisect_left(index, successor, start)
+    return start, end
+
+
+class ArtifactQueue:
+    """
+    The queue of artifacts still to be consumed by the rules of one item,
+    indexed for pattern lookups.
+
+    Paths are kept sorted, and sorted reversed, so that the candidates of a
+    pattern are found by bisecting on its literal prefix or suffix instead
+    of matching the pattern against every artifact. Each index is built on
+    first use, consumed paths are dropped from the live set only.
+    """
+
+    def __init__(self, paths):
+        self.paths = set(paths)
+        if _CASE_FOLDING:
+            self._keys = {os.path.normcase(p): p for p in self.paths}
+        else:
+            self._keys = None
+        self._by_prefix = None
+        self._by_suffix = None
+
+    def _prefix_range(self, prefix):
+        if self._by_prefix is None:
+            self._by_prefix = sorted(self._keys or self.paths)
+        start, end = _range(self._by_prefix, prefix)
+        return self._by_prefix[start:end]
+
+    def _suffix_range(self, suffix):
+        if self._by_suffix is None:
+            self._by_suffix = sorted(k[::-1] for k in self._keys or self.paths)
+        start, end = _range(self._by_suffix, suffix[::-1])
+        return [k[::-1] for k in self._by_suffix[start:end]]
+
+    def candidates(self, prefix, suffix):
+        """
+        Return the live paths starting with ``prefix`` and ending with
+        ``suffix``, found through whichever index yields fewer candidates.
+        """
+        if not prefix and not suffix:
+            return list(self.paths)
+
+        prefix, suffix = os.path.normcase(prefix), os.path.normcase(suffix)
+        if not suffix:
+            keys = self._prefix_range(prefix)
+        elif not prefix:
+            keys = self._suffix_range(suffix)
+        else:
+            keys = min(self._prefix_range(prefix), self._suffix_range(suffix),
+                       key=len)
+            keys = [
+                k for k in keys if k.startswith(prefix) and k.endswith(suffix)
+            ]
+
+        if self._keys is not None:
+            keys = (self._keys[k] for k in keys)
+        return [p for p in keys if p in self.paths]
+
+    def filter(self, pattern, prefix=""):
+        """
+        Return the live paths below ``prefix`` whose remainder matches
+        ``pattern``, like ``fnmatch.filter()`` on the queue does.
+        """
+        literal_prefix = _literal_prefix(pattern)
+        literal_suffix = _literal_suffix(pattern)
+        candidates = self.candidates(prefix + literal_prefix, literal_suffix)
+
+        # A single star between the literals matches every candidate long
+        # enough for the literals not to overlap
+        if (len(literal_prefix) + len(literal_suffix) + 1 == len(pattern)
+                and pattern[len(literal_prefix)] == "*"):
+            if not literal_suffix:
+                return candidates
+            minimum = len(prefix) + len(pattern) - 1
+            return [path for path in candidates if len(path) >= minimum]
+
+        match = _compile(pattern)
+        return [
+            path for path in candidates
+            if match(os.path.normcase(path[len(prefix):]))
+        ]
+
+    def consume(self, paths):
+        self.paths.difference_update(paths)
+
+
+def _match(rule, queue, artifacts, links):
+    dest_link = links.get(rule["dest_name"])
+    if not dest_link:
+        return set()
+
+    dest_artifacts = getattr(dest_link, rule["dest_type"])
+    source_prefix = ""
+    if rule["source_prefix"]:
+        source_prefix = os.path.join(rule["source_prefix"],
+                                     "").replace("\\", "/")
+
+    dest_prefix = ""
+    if rule["dest_prefix"]:
+        dest_prefix = os.path.join(rule["dest_prefix"], "")
+
+    consumed = set()
+    for source_path in queue.filter(rule["pattern"], source_prefix):
+        path = source_path[len(source_prefix):]
+        dest_path = path
+        if dest_prefix:
+            # Same as os.path.join(), unless path is absolute
+            dest_path = (dest_prefix + path if not os.path.isabs(path) else
+                         path).replace("\\", "/")
+        if (dest_path in dest_artifacts
+                and artifacts[source_path] == dest_artifacts[dest_path]):
+            consumed.add(source_path)
+
+    return consumed
+
+
+def _trace(source_name, source_type, link, paths, applied):
+    """Format the rule trace ``verifylib`` attaches to rule errors"""
+    trace = (f"Full trace for 'expected_{source_type}' of item "
+             f"'{source_name}':\n")
+    for artifact_type in ("materials", "products"):
+        used = " (used for queue)" if artifact_type == source_type else ""
+        trace += (f"Available {artifact_type}{used}:\n"
+                  f"{list(getattr(link, artifact_type))}\n")
+
+    queue = set(paths)
+    for rule, consumed in applied:
+        queue -= consumed
+        trace += f"Queue after '{' '.join(rule)}':\n{sorted(queue)}\n"
+    return trace
+
+
+def verify_item_rules(source_name, source_type, rules, links):
+    """
+    Apply the artifact ``rules`` of ``source_type`` of the item
+    ``source_name`` to its link in ``links``, with the semantics of
+    ``verifylib.verify_item_rules()``.
+
+    Every rule only looks at the candidates of its pattern in an
+    ``ArtifactQueue``, and the rule trace is only formatted on failure,
+    so verification time grows about linearly with the number of
+    artifacts.
+
+    Raises:
+        RuleVerificationError: A DISALLOW rule matched or a REQUIRE rule
+            did not find its artifact
+    """
+    link = links[source_name]
+    materials, products = link.materials, link.products
+    artifacts = getattr(link, source_type)
+    queue = ArtifactQueue(artifacts)
+    applied = []
+
+    for rule in rules:
+        data = unpack_rule(rule)
+        rule_type, pattern = data["rule_type"], data["pattern"]
+        consumed = set()
+        if rule_type == "match":
+            consumed = _match(data, queue, artifacts, links)
+        elif rule_type == "create":
+            consumed = {
+                p for p in queue.filter(pattern)
+                if p in products and p not in materials
+            }
+        elif rule_type == "delete":
+            consumed = {
+                p for p in queue.filter(pattern)
+                if p in materials and p not in products
+            }
+        elif rule_type == "modify":
+            consumed = {
+                p for p in queue.filter(pattern)
+                if p in materials and p in products
+                and materials[p] != products[p]
+            }
+        elif rule_type == "allow":
+            consumed = set(queue.filter(pattern))
+        elif rule_type == "disallow":
+            matched = queue.filter(pattern)
+            if matched:
+                trace = _trace(source_name, source_type, link, artifacts,
+                               applied)
+                raise RuleVerificationError(
+                    f"'DISALLOW {pattern}' matched the following artifacts: "
+                    f"{sorted(matched)}\n{trace}")
+        elif rule_type == "require":
+            if pattern not in queue.paths:
+                trace = _trace(source_name, source_type, link, artifacts,
+                               applied)
+                raise RuleVerificationError(
+                    f"'REQUIRE {pattern}' did not find {pattern} in: "
+                    f"{sorted(queue.paths)}\n{trace}")
+
+        queue.consume(consumed)
+        applied.append((rule, consumed))
+
+
+def verify_all_item_rules(items, links):
+    """
+    Verify the material and product rules of all ``items`` (steps or
+    inspections), like ``verifylib.verify_all_item_rules()``.
+
+    Raises:
+        RuleVerificationError: An artifact rule failed
+    """
+    for item in items:
+        logger.debug("Verifying artifact rules for '%s'", item.name)
+        verify_item_rules(item.name, "materials", item.expected_materials,
+                          links)
+        verify_item_rules(item.name, "products", item.expected_products,
+                          links)
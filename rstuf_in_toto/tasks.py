@@ -0,0 +1,93 @@
+"""Track asynchronous RSTUF tasks until their metadata is published"""
+
+import asyncio
+import logging
+
+from rstuf_in_toto.defaults import DEFAULT_WAIT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+TASK_SUCCESS = "SUCCESS"
+TASK_FAILURES = ("FAILURE", "ERRORED", "REVOKED", "REJECTED")
+
+
+class TaskError(Exception):
+    """An RSTUF task failed or did not finish in time"""
+
+
+class TaskTracker:
+    """
+    Collect the task ids RSTUF returns for target additions and deletions,
+    and poll the task endpoint for all of them concurrently.
+
+    Each task is polled with exponential backoff, from ``min_delay`` up to
+    ``max_delay`` seconds between polls.
+    """
+
+    def __init__(self,
+                 transport,
+                 task_url: str,
+                 min_delay: float = 0.5,
+                 max_delay: float = 10):
+        self.transport = transport
+        self.task_url = task_url
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.tasks = []
+
+    def add(self, response, headers):
+        """Track the task of an accepted API ``response``"""
+        task_id = response.json()["data"]["task_id"]
+        logger.info("Tracking RSTUF task %s", task_id)
+        self.tasks.append((task_id, headers))
+
+    def _poll(self, task_id, headers):
+        r = self.transport.request("GET",
+                                   self.task_url,
+                                   params={"task_id": task_id},
+                                   headers=headers)
+        r.raise_for_status()
+        data = r.json()["data"]
+        return data.get("state"), data.get("result")
+
+    async def _wait_task(self, task_id, headers, deadline):
+        loop = asyncio.get_running_loop()
+        delay = self.min_delay
+        while True:
+            state, result = await asyncio.to_thread(self._poll, task_id,
+                                                    headers)
+            if state == TASK_SUCCESS:
+                if isinstance(result, dict) and result.get("status") is False:
+                    raise TaskError(f"Task {task_id} failed: {result}")
+                return task_id
+            if state in TASK_FAILURES:
+                raise TaskError(f"Task {task_id} ended in {state}: {result}")
+            if loop.time() + delay > deadline:
+                raise TaskError(f"Task {task_id} still {state} at timeout")
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_delay)
+
+    async def _wait_all(self, timeout):
+        deadline = asyncio.get_running_loop().time() + timeout
+        return await asyncio.gather(
+            *(self._wait_task(t, h, deadline) for t, h in self.tasks),
+            return_exceptions=True)
+
+    def wait(self, timeout: float = DEFAULT_WAIT_TIMEOUT) -> bool:
+        """
+        Block until every tracked task is published, or failed.
+
+        Returns:
+            A boolean indicating if all tasks were published
+        """
+        success = True
+        for result in asyncio.run(self._wait_all(timeout)):
+            if isinstance(result, Exception):
+                print(f"RSTUF task not published: {result}")
+                success = False
+            else:
+                print(f"RSTUF task {result} published")
+
+        self.tasks = []
+        return success
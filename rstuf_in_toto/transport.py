@@ -0,0 +1,191 @@
+"""Shared HTTP transport for RSTUF API calls and TUF fetches"""
+
+import json
+import logging
+import os
+import threading
+from typing import Iterator, Optional
+from urllib import parse
+
+import requests
+from requests.adapters import HTTPAdapter
+from tuf.api import exceptions
+from tuf.ngclient import FetcherInterface
+from urllib3.util.retry import Retry
+
+from rstuf_in_toto import metrics
+from rstuf_in_toto.defaults import (DEFAULT_POOL_SIZE, DEFAULT_RETRIES,
+                                    DEFAULT_TIMEOUT)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKOFF = 0.5  # seconds, doubled on every retry
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Metadata fetched under an unversioned name, worth a conditional request
+CONDITIONAL_FILES = ("timestamp.json",)
+CONDITIONAL_MAX_SIZE = 1024 * 1024
+
+
+class Transport:
+    """
+    One ``requests.Session`` for the whole client, with keep-alive
+    connection pooling, a default timeout and exponential-backoff retries on
+    429 and 5xx responses (honouring ``Retry-After``).
+
+    RSTUF target additions and deletions are idempotent, so all methods are
+    retried.
+    """
+
+    def __init__(self,
+                 pool_size: int = DEFAULT_POOL_SIZE,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 retries: int = DEFAULT_RETRIES,
+                 backoff: float = DEFAULT_BACKOFF):
+        self.timeout = timeout
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=None,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size,
+                              max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        response = self.session.request(method, url, **kwargs)
+        if metrics.enabled():
+            _count_response(method, response, kwargs.get("stream", False))
+        return response
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _count_response(method, response, streamed):
+    """
+    Count the request, its retries and the bytes sent and received. The
+    body of a streamed response is counted by its reader.
+    """
+    metrics.count("http_requests", method=method,
+                  status=response.status_code)
+    retries = getattr(response.raw, "retries", None)
+    if retries is not None and retries.history:
+        metrics.count("http_retries", len(retries.history), method=method)
+    if response.request.body:
+        metrics.count("sent_bytes", len(response.request.body))
+    if not streamed:
+        metrics.count("received_bytes", len(response.content))
+
+
+class TransportFetcher(FetcherInterface):
+    """
+    ngclient fetcher downloading metadata and targets over a Transport.
+
+    With a ``cache_dir``, responses for ``CONDITIONAL_FILES`` with a strong
+    ``ETag`` are kept, and fetched again with an ``If-None-Match``
+    request. On ``304 Not Modified`` the kept response is
+    returned, and ngclient verifies it like any other download.
+    """
+
+    def __init__(self,
+                 transport: Transport,
+                 chunk_size: int = 400000,
+                 cache_dir: Optional[str] = None):
+        self.transport = transport
+        self.chunk_size = chunk_size
+        self.cache_dir = cache_dir
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _cache_path(self, url: str) -> Optional[str]:
+        if self.cache_dir and url.endswith(CONDITIONAL_FILES):
+            return os.path.join(self.cache_dir, parse.quote(url, ""))
+        return None
+
+    def _fetch(self, url: str) -> Iterator[bytes]:
+        cache_path = self._cache_path(url)
+        headers, kept = {}, None
+        if cache_path:
+            try:
+                with open(f"{cache_path}.validators") as f:
+                    etag = json.load(f)["If-None-Match"]
+                headers = {"If-None-Match": etag}
+                with open(cache_path, "rb") as f:
+                    kept = f.read()
+            except (OSError, ValueError, KeyError, TypeError):
+                headers, kept = {}, None
+
+        try:
+            response = self.transport.request("GET",
+                                              url,
+                                              stream=True,
+                                              headers=headers)
+        except requests.exceptions.Timeout as e:
+            raise exceptions.SlowRetrievalError from e
+
+        if response.status_code == 304 and kept is not None:
+            response.close()
+            metrics.count("http_not_modified")
+            logger.debug("%s not modified", url)
+            return iter([kept])
+
+        try:
+            response.raise_for_status()
+        except requests.HTTPError as e:
+            response.close()
+            raise exceptions.DownloadHTTPError(str(e), response.status_code)
+
+        if cache_path:
+            return self._keep(response, cache_path)
+        return self._chunks(response)
+
+    def _keep(self, response: requests.Response,
+              cache_path: str) -> Iterator[bytes]:
+        """Pass on the chunks of ``response`` and keep the whole response"""
+        # Last-Modified has a resolution of one second, so a file
+        # republished within the same second would look unchanged. Weak
+        # ETags do not promise identical bytes either.
+        validators = {}
+        etag = response.headers.get("ETag", "")
+        if etag and not etag.startswith("W/"):
+            validators["If-None-Match"] = etag
+
+        body = bytearray()
+        for chunk in self._chunks(response):
+            if len(body) <= CONDITIONAL_MAX_SIZE:
+                body += chunk
+            yield chunk
+
+        if not validators or len(body) > CONDITIONAL_MAX_SIZE:
+            return
+
+        suffix = f"{os.getpid()}-{threading.get_ident()}"
+        for path, data in ((cache_path, bytes(body)),
+                           (f"{cache_path}.validators",
+                            json.dumps(validators).encode())):
+            with open(f"{path}.{suffix}", "wb") as f:
+                f.write(data)
+            os.replace(f"{path}.{suffix}", path)
+
+    def _chunks(self, response: requests.Response) -> Iterator[bytes]:
+        try:
+            for chunk in response.iter_content(self.chunk_size):
+                metrics.count("received_bytes", len(chunk))
+                yield chunk
+        except (requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout) as e:
+            raise exceptions.SlowRetrievalError from e
+        finally:
+            response.close()
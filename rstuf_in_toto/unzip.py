@@ -0,0 +1,131 @@
+"""Native ``unzip`` inspection hashing archive members in memory"""
+
+import fnmatch
+import hashlib
+import logging
+import os
+import stat
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 8
+CHUNK_SIZE = 1024 * 1024
+
+
+def _archive(command, workspace) -> Optional[str]:
+    """
+    Return the path of the single archive ``command`` extracts in
+    ``workspace``, if it is a plain ``unzip <archive>`` command.
+    """
+    if len(command) != 2 or command[0] != "unzip":
+        return None
+
+    pattern = command[1]
+    if pattern.startswith("-"):
+        return None
+    # unzip matches a wildcard archive name itself, like fnmatch does
+    names = fnmatch.filter(sorted(os.listdir(workspace)), pattern)
+    if len(names) != 1:
+        return None
+
+    path = os.path.join(workspace, names[0])
+    return path if os.path.isfile(path) else None
+
+
+def _extractable(info, workspace, dirs, files) -> bool:
+    """
+    Tell if ``unzip`` would write the member ``info`` as a new regular
+    file, at the path it has in the archive, after the members ``files``
+    and their parent ``dirs``.
+    """
+    name = info.filename
+    parts = name.split("/")
+    if (name.startswith("/") or "\\" in name or ".." in parts
+            or "" in parts or info.flag_bits & 0x1
+            or stat.S_ISLNK(info.external_attr >> 16)):
+        return False
+    if (name in files or name in dirs
+            or os.path.lexists(os.path.join(workspace, name))):
+        return False
+
+    # Existing parents must be directories
+    for i in range(1, len(parts)):
+        parent = "/".join(parts[:i])
+        if parent in files:
+            return False
+        if parent not in dirs:
+            path = os.path.join(workspace, parent)
+            if os.path.lexists(path) and not os.path.isdir(path):
+                return False
+            dirs.add(parent)
+    return True
+
+
+def _hash_member(archive, info):
+    digest = hashlib.sha256()
+    with archive.open(info) as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return {"sha256": digest.hexdigest()}
+
+
+def unzip_products(command,
+                   workspace,
+                   materials,
+                   exclude,
+                   workers: int = DEFAULT_WORKERS
+                   ) -> Optional[Dict[str, dict]]:
+    """
+    Return the products ``in-toto-run`` records for ``command``, an unzip
+    inspection in ``workspace`` with ``materials``, without running it.
+
+    The members of the archive are listed from its central directory and
+    hashed from the archive in ``workers`` threads, instead of extracting
+    them and hashing the extracted files. Members matching the PathSpec
+    ``exclude`` are not recorded, like the excluded files of the workspace.
+
+    Only plain ``unzip <archive>`` commands extracting new regular files
+    are handled natively. Anything else, such as options, several archives,
+    members overwriting files, symbolic links, unsafe paths, encrypted or
+    corrupt members, returns None, so that the command is run instead.
+
+    Returns:
+        A dictionary of relative artifact paths to hash dictionaries, or
+        None
+    """
+    path = _archive(command, workspace)
+    if path is None:
+        return None
+
+    try:
+        with zipfile.ZipFile(path) as archive:
+            dirs, files = set(), set()
+            members = []
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                if not _extractable(info, workspace, dirs, files):
+                    logger.debug("Running unzip for member %s of %s",
+                                 info.filename, path)
+                    return None
+                files.add(info.filename)
+                if not exclude.match_file(info.filename):
+                    members.append(info)
+
+            # Members share the archive file, reads are serialized by
+            # zipfile while decompression and hashing run concurrently
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                hashes = executor.map(lambda i: _hash_member(archive, i),
+                                      members)
+                products = dict(materials)
+                for info, digest in zip(members, hashes):
+                    products[info.filename] = digest
+
+    except (zipfile.BadZipFile, NotImplementedError, RuntimeError) as e:
+        logger.debug("Running unzip for %s: %s", path, e)
+        return None
+
+    return products
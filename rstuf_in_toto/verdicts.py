@@ -0,0 +1,102 @@
+"""Local cache of successful in-toto verification verdicts"""
+
+import json
+import logging
+import os
+import threading
+import time
+from hashlib import sha256
+from typing import Optional
+
+import iso8601
+
+logger = logging.getLogger(__name__)
+
+
+def verdict_key(infos) -> str:
+    """
+    Build the verdict key of a target and its in-toto evidence from the TUF
+    target paths and hashes in ``infos``.
+    """
+    entries = sorted(
+        (info.path, sorted(info.hashes.items())) for info in infos)
+    return sha256(json.dumps(entries).encode()).hexdigest()
+
+
+class VerdictCache:
+    """
+    Successful verification verdicts stored as ``<cache_dir>/<key>.json``.
+
+    A verdict is keyed on the digests of the target, its layout, the layout
+    keys and all its links (see ``verdict_key()``), so any change in any of
+    them misses the cache. Verdicts expire after ``ttl`` seconds or when the
+    layout they were verified against expires, whichever comes first.
+    """
+
+    def __init__(self, cache_dir: str, ttl: int):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the verdict stored for ``key`` if it is still valid"""
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                verdict = json.load(f)
+            expires = min(
+                verdict["verified_at"] + self.ttl,
+                iso8601.parse_date(verdict["layout_expires"]).timestamp())
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Removing unreadable verdict %s", path)
+            os.remove(path)
+            return None
+
+        if time.time() > expires:
+            os.remove(path)
+            return None
+
+        return verdict
+
+    def put(self, key: str, target: str, layout_expires: str):
+        """Record a successful verification of ``target``"""
+        verdict = {
+            "target": target,
+            "verified_at": time.time(),
+            "layout_expires": layout_expires,
+        }
+        tmp = f"{self._path(key)}.{os.getpid()}-{threading.get_ident()}"
+        with open(tmp, "w") as f:
+            json.dump(verdict, f)
+        os.replace(tmp, self._path(key))
+
+    def invalidate(self, targets=None) -> int:
+        """
+        Remove the verdicts of ``targets``, or all verdicts if no targets are
+        given.
+
+        Returns:
+            The number of removed verdicts
+        """
+        removed = 0
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if targets:
+                try:
+                    with open(path) as f:
+                        if json.load(f).get("target") not in targets:
+                            continue
+                except (OSError, ValueError):
+                    pass
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+
+        return removed
@@ -0,0 +1,561 @@
+"""In-process in-toto verification of a download workspace"""
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import in_toto.settings
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
+from in_toto import verifylib
+from in_toto.exceptions import (BadReturnValueError,
+                                SignatureVerificationError,
+                                ThresholdVerificationError)
+from in_toto.models.layout import Layout
+from in_toto.models.link import Link
+from in_toto.models.metadata import Metablock, Metadata
+from in_toto.rulelib import unpack_rule
+from securesystemslib import interface
+from securesystemslib.exceptions import Error as SSLibError
+from securesystemslib.formats import (ANY_VERIFICATION_KEY_SCHEMA,
+                                      SIGNATURE_SCHEMA)
+from securesystemslib.gpg.exceptions import KeyExpirationError
+
+from rstuf_in_toto import record, rules
+from rstuf_in_toto.unzip import unzip_products
+
+logger = logging.getLogger(__name__)
+
+# Layout keys read from their files, and layouts whose signatures were
+# verified with them, by digest of the files, and public keys deserialized
+# from PEM by digest of the PEM. Long-running and batch callers verify many
+# targets against the same few layouts and keys. With a cache directory
+# (see ``set_cache_dir()``), keys and layout signature checks are kept for
+# later runs too.
+_key_cache = {}
+_layout_cache = {}
+_public_keys = {}
+_cache_dir = None
+
+# Signature checks and rule evaluation are CPU-bound (canonical JSON, RSA,
+# pattern matching), so larger verifications fan them out to a process
+# pool, created on first use and shared by all verifications. Smaller ones
+# stay in-process, where they are faster than the round trip to the pool.
+PARALLEL_MIN_SIGNATURES = 8
+RSA_PSS_SCHEME = "rsassa-pss-sha256"
+PARALLEL_MIN_ARTIFACTS = 2000
+_pool = None
+_pool_lock = threading.Lock()
+
+
+@dataclass
+class TrustedLayout:
+    """A layout whose signatures and expiration were verified"""
+    metadata: Metadata
+    layout: Layout
+
+
+@dataclass
+class VerificationResult:
+    """Outcome of the in-toto verification of a single target"""
+    target: str
+    success: bool
+    error: Optional[str] = None
+    layout_expires: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+def record_artifacts(base_path):
+    """
+    Record all files below ``base_path`` like ``in-toto-run`` records ``.``,
+    without changing the process working directory.
+
+    Returns:
+        A dictionary of relative artifact paths to hash dictionaries
+    """
+    return record.record_artifacts(["."], base_path)
+
+
+def set_cache_dir(cache_dir: Optional[str]):
+    """
+    Keep the layout keys and the signature checks of layouts in
+    ``cache_dir`` for later runs, or only in memory if None. Layouts are
+    still parsed by every run, as in-toto models are not serializable
+    without pickle.
+
+    Entries are trusted like the files they were made from, so
+    ``cache_dir`` must only be writable by the user verifying.
+    """
+    global _cache_dir
+    if cache_dir:
+        os.makedirs(os.path.join(cache_dir, "keys"), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, "signatures"), exist_ok=True)
+    _cache_dir = cache_dir
+
+
+def _cache_path(kind, digest):
+    if _cache_dir is None:
+        return None
+    return os.path.join(_cache_dir, kind, f"{digest}.json")
+
+
+def _read_cached(kind, digest):
+    """Return the entry ``digest`` of the cache directory, if there is one"""
+    path = _cache_path(kind, digest)
+    if path is None:
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable cache entry %s: %s", path, e)
+        return None
+
+
+def _write_cached(kind, digest, entry):
+    """Store ``entry`` as ``digest`` in the cache directory, if there is one"""
+    path = _cache_path(kind, digest)
+    if path is None:
+        return
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}"
+    try:
+        with open(tmp, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning("Cannot cache %s: %s", path, e)
+
+
+def _file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _load_keys(key_paths):
+    """Return the keys at ``key_paths`` and the digests of their files"""
+    keys = {}
+    digests = []
+    for path in key_paths:
+        digest = _file_digest(path)
+        if digest not in _key_cache:
+            cached = _read_cached("keys", digest)
+            if cached is None:
+                cached = interface.import_publickeys_from_file([path])
+                _write_cached("keys", digest, cached)
+            _key_cache[digest] = cached
+        keys.update(_key_cache[digest])
+        digests.append(digest)
+
+    return keys, digests
+
+
+def load_layout_keys(key_paths):
+    """
+    Load the public keys at ``key_paths``, reusing keys already parsed from
+    files with the same content.
+
+    Returns:
+        A dictionary of keyid to key
+    """
+    return _load_keys(key_paths)[0]
+
+
+def run_inspection(inspection, workspace, native=False):
+    """
+    Run ``inspection`` inside ``workspace`` and record its link.
+
+    If ``native``, an ``unzip`` inspection records the members of the
+    archive without extracting them (see ``unzip_products()``), leaving
+    ``workspace`` unchanged, and the command is only run if that is not
+    possible.
+
+    Raises:
+        BadReturnValueError: The inspection command returned non-zero
+    """
+    logger.info("Executing command for inspection '%s'...", inspection.name)
+    materials = record_artifacts(workspace)
+    if native:
+        products = unzip_products(inspection.run, workspace, materials,
+                                  record.artifact_exclude())
+        if products is not None:
+            return Link(
+                name=inspection.name,
+                materials=materials,
+                products=products,
+                byproducts={"return-value": 0},
+                command=inspection.run,
+            )
+
+    process = subprocess.run(
+        inspection.run,
+        cwd=workspace,
+        check=False,
+        timeout=float(in_toto.settings.LINK_CMD_EXEC_TIMEOUT),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    if process.returncode != 0:
+        raise BadReturnValueError(
+            f"Inspection command '{inspection.run}' returned non-zero "
+            f"value '{process.returncode}'")
+
+    return Link(
+        name=inspection.name,
+        materials=materials,
+        products=record_artifacts(workspace),
+        byproducts={"return-value": process.returncode},
+        command=inspection.run,
+    )
+
+
+def load_trusted_layout(layout_path, key_paths) -> TrustedLayout:
+    """
+    Load the layout at ``layout_path``, and verify that it is signed by
+    the keys at ``key_paths`` and not expired, once for all the targets
+    verified against it (see ``verify_workspace()``).
+
+    A layout is parsed and its signatures are verified once for the same
+    layout and key files, then only its expiration is checked again. With a
+    cache directory, later runs parse the layout but skip the signature
+    check.
+
+    Raises:
+        SignatureVerificationError: The layout is not validly signed
+        LayoutExpiredError: The layout expired
+        OSError: The layout or a key cannot be read
+        ValueError, KeyError: The layout is malformed
+
+    Returns:
+        A TrustedLayout
+    """
+    keys, key_digests = _load_keys(key_paths)
+    with open(layout_path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(
+        json.dumps([hashlib.sha256(data).hexdigest()] +
+                   sorted(key_digests)).encode()).hexdigest()
+
+    trusted = _layout_cache.get(digest)
+    if trusted is None:
+        metadata = Metadata.from_dict(json.loads(data))
+        if _read_cached("signatures", digest) is None:
+            verifylib.verify_metadata_signatures(metadata, keys)
+            _write_cached("signatures", digest, {"keyids": sorted(keys)})
+        trusted = TrustedLayout(metadata, metadata.get_payload())
+        _layout_cache[digest] = trusted
+
+    verifylib.verify_layout_expiration(trusted.layout)
+    return trusted
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Forked workers would inherit the locks of the download threads
+            _pool = ProcessPoolExecutor(
+                mp_context=multiprocessing.get_context("forkserver"))
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+
+def _use_pool(work, minimum) -> bool:
+    """Tell if ``work`` is worth the round trip to the process pool"""
+    if work < minimum:
+        return False
+    try:
+        return len(os.sched_getaffinity(0)) > 1
+    except AttributeError:
+        return (os.cpu_count() or 1) > 1
+
+
+def _submit(parallel, fn, *args) -> Future:
+    """Run ``fn`` on the process pool, or inline if not ``parallel``"""
+    if parallel:
+        return _get_pool().submit(fn, *args)
+
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def _public_key(pem: str):
+    """Return the public key object of ``pem``, deserialized once"""
+    digest = hashlib.sha256(pem.encode()).hexdigest()
+    public_key = _public_keys.get(digest)
+    if public_key is None:
+        public_key = _public_keys[digest] = load_pem_public_key(pem.encode())
+    return public_key
+
+
+def verify_signature(metadata, key):
+    """
+    Verify the signature of ``metadata`` by ``key`` like
+    ``Metadata.verify_signature()``. For a Metablock, RSASSA-PSS keys are
+    deserialized once (see ``_public_key()``) instead of for every
+    signature; DSSE envelopes, other keys and other signatures are verified
+    by in-toto.
+
+    Raises:
+        SignatureVerificationError: No signature of ``key``, or it is
+            invalid
+        FormatError: ``key`` is malformed
+    """
+    if (not isinstance(metadata, Metablock) or key.get("keytype") != "rsa"
+            or key.get("scheme") != RSA_PSS_SCHEME or key.get("subkeys")):
+        metadata.verify_signature(key)
+        return
+
+    ANY_VERIFICATION_KEY_SCHEMA.check_match(key)
+    signature = next(
+        (s for s in metadata.signatures if s["keyid"] == key["keyid"]), None)
+    if signature is None:
+        raise SignatureVerificationError(
+            f"No signature found for key '{key['keyid']}'")
+    if not SIGNATURE_SCHEMA.matches(signature):
+        metadata.verify_signature(key)
+        return
+
+    try:
+        _public_key(key["keyval"]["public"]).verify(
+            bytes.fromhex(signature["sig"]), metadata.signed.signable_bytes,
+            padding.PSS(mgf=padding.MGF1(hashes.SHA256()),
+                        salt_length=padding.PSS.AUTO), hashes.SHA256())
+    except InvalidSignature as e:
+        raise SignatureVerificationError(
+            f"Invalid signature for keyid '{key['keyid']}'") from e
+
+
+def _check_signature(metadata, key) -> Optional[str]:
+    """Return why ``metadata`` is not validly signed by ``key``, if it isn't"""
+    try:
+        verify_signature(metadata, key)
+    except (SignatureVerificationError, KeyExpirationError) as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+def _check_layout_signatures(metadata, keys):
+    verifylib.verify_metadata_signatures(metadata, keys)
+
+
+def _verification_keys(layout, link_keyid, pubkeys):
+    """
+    Return the layout key verifying a link signed by ``link_keyid`` for a
+    step authorizing ``pubkeys``, with the subkey semantics of
+    ``verifylib.verify_link_signature_thresholds()``.
+    """
+    main_keys_for_subkeys = {}
+    for main_key in layout.keys.values():
+        for sub_keyid in main_key.get("subkeys", []):
+            main_keys_for_subkeys[sub_keyid] = main_key
+
+    for authorized_keyid in pubkeys:
+        authorized_key = layout.keys.get(authorized_keyid)
+        main_key_for_subkey = main_keys_for_subkeys.get(authorized_keyid)
+        if authorized_key and link_keyid == authorized_keyid:
+            return authorized_key
+        if main_key_for_subkey and link_keyid == authorized_keyid:
+            return main_key_for_subkey
+        if (authorized_key
+                and link_keyid in authorized_key.get("subkeys", {}).keys()):
+            return authorized_key
+    return None
+
+
+def verify_signatures(metadata, layout_keys, layout, steps_metadata):
+    """
+    Verify the layout signatures and the signatures of all links at once,
+    on the process pool if there are at least ``PARALLEL_MIN_SIGNATURES``
+    and several CPUs, and apply the step thresholds like
+    ``verifylib.verify_link_signature_thresholds()``. The layout signatures
+    are not checked again if ``metadata`` is None, for a TrustedLayout.
+
+    Raises:
+        SignatureVerificationError: The layout is not validly signed
+        ThresholdVerificationError: A step lacks validly signed links
+
+    Returns:
+        The links with valid signatures by authorized functionaries
+    """
+    checks = []
+    for step in layout.steps:
+        for keyid, link in steps_metadata.get(step.name, {}).items():
+            key = _verification_keys(layout, keyid, step.pubkeys)
+            if key is None:
+                logger.info("Skipping link. Keyid '%s' is not authorized to "
+                            "sign links for step '%s'", keyid, step.name)
+                continue
+            checks.append((step, keyid, link, key))
+
+    parallel = _use_pool(len(checks) + 1, PARALLEL_MIN_SIGNATURES)
+    layout_check = None
+    if metadata is not None:
+        layout_check = _submit(parallel, _check_layout_signatures, metadata,
+                               layout_keys)
+    link_checks = [
+        _submit(parallel, _check_signature, link, key)
+        for _, _, link, key in checks
+    ]
+    if layout_check:
+        layout_check.result()
+
+    verified = {step.name: {} for step in layout.steps}
+    used_main_keyids = {step.name: set() for step in layout.steps}
+    for (step, keyid, link, key), check in zip(checks, link_checks):
+        error = check.result()
+        if error:
+            logger.info("Skipping link of step '%s' signed with keyid '%s': "
+                        "%s", step.name, keyid, error)
+            continue
+        used_main_keyids[step.name].add(key["keyid"])
+        verified[step.name][keyid] = link
+
+    for step in layout.steps:
+        if len(used_main_keyids[step.name]) < step.threshold:
+            raise ThresholdVerificationError(
+                f"Step '{step.name}' requires at least '{step.threshold}' "
+                "links validly signed by different authorized "
+                f"functionaries. Only found "
+                f"'{len(used_main_keyids[step.name])}'")
+
+    return verified
+
+
+def _rule_links(item, links):
+    """Return the links the rules of ``item`` refer to"""
+    names = {item.name}
+    for rule in item.expected_materials + item.expected_products:
+        rule_data = unpack_rule(rule)
+        if rule_data["rule_type"] == "match":
+            names.add(rule_data["dest_name"])
+    return {name: links[name] for name in names if name in links}
+
+
+def verify_workspace(target,
+                     workspace,
+                     layout_path,
+                     key_paths,
+                     trusted: Optional[TrustedLayout] = None):
+    """
+    Verify the supply chain of ``target`` against the layout at
+    ``layout_path`` signed by the keys at ``key_paths``, with links and
+    inspections taken from ``workspace``. Targets sharing a layout pass
+    the ``trusted`` layout from ``load_trusted_layout()`` instead, which
+    is neither loaded nor checked again.
+
+    This follows ``verifylib.in_toto_verify()``, but runs inspections in
+    ``workspace`` instead of the process working directory, and returns the
+    outcome instead of raising.
+
+    All signatures are checked at once (see ``verify_signatures()``). Then
+    the rules of every step are evaluated concurrently while inspections
+    run, and the rules of every inspection once all inspections ran. With
+    at least ``PARALLEL_MIN_ARTIFACTS`` recorded artifacts and several CPUs,
+    rules are evaluated on the process pool. The wall time of each phase is
+    logged and kept in the result.
+
+    Returns:
+        A VerificationResult
+    """
+    timings = {}
+    start = phase = time.perf_counter()
+
+    def timed(name):
+        nonlocal phase
+        now = time.perf_counter()
+        timings[name] = now - phase
+        phase = now
+
+    try:
+        if trusted:
+            metadata, layout_keys, layout = None, None, trusted.layout
+        else:
+            metadata = Metadata.load(layout_path)
+            layout_keys = load_layout_keys(key_paths)
+            layout = metadata.get_payload()
+        steps_metadata = verifylib.load_links_for_layout(layout, workspace)
+        timed("load")
+
+        steps_metadata = verify_signatures(metadata, layout_keys, layout,
+                                           steps_metadata)
+        if not trusted:
+            verifylib.verify_layout_expiration(layout)
+        timed("signatures")
+
+        chain_link_dict = verifylib.verify_sublayouts(layout, steps_metadata,
+                                                      workspace)
+        verifylib.verify_all_steps_command_alignment(layout, chain_link_dict)
+        verifylib.verify_threshold_constraints(layout, chain_link_dict)
+        links = verifylib.reduce_chain_links(chain_link_dict)
+        timed("chain")
+
+        artifacts = sum(
+            len(link.materials) + len(link.products)
+            for link in links.values())
+        parallel = _use_pool(artifacts, PARALLEL_MIN_ARTIFACTS)
+        step_rules = [
+            _submit(parallel, rules.verify_all_item_rules, [step],
+                    _rule_links(step, links))
+            for step in layout.steps
+        ]
+
+        # Inspections see the products of earlier inspections, so they run
+        # one after another, overlapping with the step rules. Only the last
+        # one may skip writing its products.
+        for inspection in layout.inspect:
+            links[inspection.name] = run_inspection(
+                inspection, workspace, inspection is layout.inspect[-1])
+        timed("inspections")
+
+        inspection_rules = [
+            _submit(parallel, rules.verify_all_item_rules, [inspection],
+                    _rule_links(inspection, links))
+            for inspection in layout.inspect
+        ]
+        for check in step_rules + inspection_rules:
+            check.result()
+        timed("rules")
+
+    except BrokenProcessPool as e:
+        _reset_pool()
+        return VerificationResult(target, False, f"BrokenProcessPool: {e}",
+                                  timings=timings)
+
+    # Malformed layouts and links fail with ValueError (including
+    # json.JSONDecodeError) or KeyError for missing fields
+    except (SSLibError, OSError, subprocess.SubprocessError, ValueError,
+            KeyError) as e:
+        return VerificationResult(target, False, f"{type(e).__name__}: {e}",
+                                  timings=timings)
+
+    timings["total"] = time.perf_counter() - start
+    logger.info(
+        "Verified %s in %s", target,
+        ", ".join(f"{name} {seconds * 1000:.1f}ms"
+                  for name, seconds in timings.items()))
+    return VerificationResult(target,
+                              True,
+                              layout_expires=layout.expires,
+                              timings=timings)
@@ -7,8 +7,15 @@ import subprocess
 import argparse
 from shutil import copyfile, move, rmtree
 
+from rstuf_in_toto.record import (DigestCache, load_signing_key, record_start,
+                                  record_stop, run_step)
+
 NO_PROMPT = False
 TESTREPO = "alanssitis/test-project"
+PROJECT_FILES = ["pyproject.toml", "README.md", "src"]
+# Digests of unchanged project files are reused between recordings and runs
+DIGEST_CACHE = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                            ".record-cache.json")
 
 
 def prompt_key(prompt):
@@ -23,7 +30,9 @@ def prompt_key(prompt):
             pass
 
 
-def supply_chain():
+def supply_chain(cache):
+    alice = load_signing_key("private_keys/alice")
+    bob = load_signing_key("private_keys/bob")
     if not os.path.exists("dist"):
         os.mkdir("dist")
     if not os.path.exists("client"):
@@ -48,34 +57,31 @@ def supply_chain():
     subprocess.call(shlex.split(generate_new_layout_cmd))
     move("root.layout", "../dist")
     os.chdir("../dist")
-    upload_layout_cmd = (
-        "../rstuf-in-toto-client.py upload-layout root.layout alice.pub")
+    upload_layout_cmd = ("../rstuf-in-toto-client.py --wait upload-layout "
+                         "root.layout alice.pub")
     print(upload_layout_cmd)
     subprocess.call(shlex.split(upload_layout_cmd))
 
     prompt_key("Create project [Alice]")
     os.chdir("../test-project")
-    create_project_in_toto_run_cmd = (
-        "in-toto-run --verbose --step-name create "
-        "--key ../private_keys/alice -p pyproject.toml README.md src "
-        "--metadata-directory ../dist --no-command")
-    print(create_project_in_toto_run_cmd)
-    subprocess.call(shlex.split(create_project_in_toto_run_cmd))
+    print("Recording step create [Alice]: -p pyproject.toml README.md src")
+    run_step("create", alice, products=PROJECT_FILES,
+             metadata_directory="../dist", cache=cache)
 
     prompt_key("Build project [Alice]")
-    build_project_alice_in_toto_run_cmd = (
-        "in-toto-run --verbose --step-name build "
-        "--key ../private_keys/alice -m pyproject.toml README.md src "
-        "-p test_project-0.0.1-py3-none-any.whl --metadata-directory ../dist "
-        "-- python3 -m build --wheel --outdir .")
-    print(build_project_alice_in_toto_run_cmd)
-    subprocess.call(shlex.split(build_project_alice_in_toto_run_cmd))
+    build_project_cmd = "python3 -m build --wheel --outdir ."
+    print("Recording step build [Alice]: -m pyproject.toml README.md src "
+          f"-p test_project-0.0.1-py3-none-any.whl -- {build_project_cmd}")
+    run_step("build", alice, materials=PROJECT_FILES,
+             products=["test_project-0.0.1-py3-none-any.whl"],
+             command=shlex.split(build_project_cmd),
+             metadata_directory="../dist", cache=cache)
     move("test_project-0.0.1-py3-none-any.whl", "../dist")
 
     prompt_key("Upload wheel and in-toto metadata to RSTUF [Alice]")
     os.chdir("../dist")
     upload_to_rstuf_cmd = (
-        "../rstuf-in-toto-client.py upload-file "
+        "../rstuf-in-toto-client.py --wait upload-file "
         "test_project-0.0.1-py3-none-any.whl root.layout "
         "build.556caebd.link create.556caebd.link")
     print(upload_to_rstuf_cmd)
@@ -84,6 +90,7 @@ def supply_chain():
     prompt_key("Download and verify wheel [Client]")
     os.chdir("../client")
     special_client_download_cmd = ("../rstuf-in-toto-client.py download "
+                                   "--refresh-interval 0 "
                                    "test_project-0.0.1-py3-none-any.whl")
     print(special_client_download_cmd)
     subprocess.call(shlex.split(special_client_download_cmd))
@@ -98,10 +105,10 @@ def supply_chain():
     os.chdir("..")
     rmtree("dist")
     rmtree("client")
+    # The wheel goes along with its layout, key and links, which no other
+    # target uses
     delete_rstuf_cmd = (
-        "./rstuf-in-toto-client.py delete root.layout alice.pub "
-        "create.556caebd.link build.556caebd.link "
-        "test_project-0.0.1-py3-none-any.whl")
+        "./rstuf-in-toto-client.py --wait delete --version 0.0.1")
     print(delete_rstuf_cmd)
     subprocess.call(shlex.split(delete_rstuf_cmd))
 
@@ -132,44 +139,35 @@ def supply_chain():
 
     prompt_key("Pull project [Bob]")
     os.chdir("../test-project")
-    clone_project_in_toto_run_cmd = (
-        "in-toto-run --verbose --step-name clone "
-        "--key ../private_keys/bob -p pyproject.toml README.md src "
-        "--metadata-directory ../dist --no-command")
-    print(clone_project_in_toto_run_cmd)
-    subprocess.call(shlex.split(clone_project_in_toto_run_cmd))
+    print("Recording step clone [Bob]: -p pyproject.toml README.md src")
+    run_step("clone", bob, products=PROJECT_FILES,
+             metadata_directory="../dist", cache=cache)
 
     prompt_key("Make changes [Bob]")
 
-    in_toto_record_start_bob_changes_cmd = (
-        "in-toto-record start --verbose --step-name update "
-        "--key ../private_keys/bob -m pyproject.toml README.md src")
-    print(in_toto_record_start_bob_changes_cmd)
-    subprocess.call(shlex.split(in_toto_record_start_bob_changes_cmd))
+    print("Start recording step update [Bob]: -m pyproject.toml README.md "
+          "src")
+    record_start("update", bob, materials=PROJECT_FILES, cache=cache)
 
     print("Copying pre-created files to project")
     copyfile("../project_files/pyproject.toml.changed", "pyproject.toml")
     copyfile("../project_files/main.py.changed", "src/main.py")
 
-    in_toto_record_stop_bob_changes_cmd = (
-        "in-toto-record stop --verbose --step-name update "
-        "--key ../private_keys/bob -p pyproject.toml README.md src")
-    print(in_toto_record_stop_bob_changes_cmd)
-    subprocess.call(shlex.split(in_toto_record_stop_bob_changes_cmd))
-    move("update.776a00e2.link", "../dist")
+    print("Stop recording step update [Bob]: -p pyproject.toml README.md src")
+    record_stop("update", bob, products=PROJECT_FILES,
+                metadata_directory="../dist", cache=cache)
 
     prompt_key("Build and upload wheel and metadata [Alice]")
-    build_project_alice_in_toto_run_cmd = (
-        "in-toto-run --verbose --step-name build "
-        "--key ../private_keys/alice -m pyproject.toml README.md src "
-        "-p test_project-0.0.2-py3-none-any.whl --metadata-directory ../dist "
-        "-- python3 -m build --wheel --outdir .")
-    print(build_project_alice_in_toto_run_cmd)
-    subprocess.call(shlex.split(build_project_alice_in_toto_run_cmd))
+    print("Recording step build [Alice]: -m pyproject.toml README.md src "
+          f"-p test_project-0.0.2-py3-none-any.whl -- {build_project_cmd}")
+    run_step("build", alice, materials=PROJECT_FILES,
+             products=["test_project-0.0.2-py3-none-any.whl"],
+             command=shlex.split(build_project_cmd),
+             metadata_directory="../dist", cache=cache)
     move("test_project-0.0.2-py3-none-any.whl", "../dist")
     os.chdir("../dist")
     upload_to_rstuf_cmd = (
-        "../rstuf-in-toto-client.py upload-file "
+        "../rstuf-in-toto-client.py --wait upload-file "
         "test_project-0.0.2-py3-none-any.whl root.layout "
         "clone.776a00e2.link update.776a00e2.link build.556caebd.link")
     print(upload_to_rstuf_cmd)
@@ -178,6 +176,7 @@ def supply_chain():
     prompt_key("Download and verify updated wheel [Client]")
     os.chdir("../client")
     special_client_download_cmd = ("../rstuf-in-toto-client.py download "
+                                   "--refresh-interval 0 "
                                    "test_project-0.0.2-py3-none-any.whl")
     print(special_client_download_cmd)
     subprocess.call(shlex.split(special_client_download_cmd))
@@ -206,7 +205,7 @@ def supply_chain():
     move("test_project-0.0.2-py3-none-any.whl", "../dist")
     os.chdir("../dist")
     upload_to_rstuf_cmd = (
-        "../rstuf-in-toto-client.py upload-file "
+        "../rstuf-in-toto-client.py --wait upload-file "
         "test_project-0.0.2-py3-none-any.whl root.layout "
         "clone.776a00e2.link update.776a00e2.link build.556caebd.link")
     print(upload_to_rstuf_cmd)
@@ -219,6 +218,7 @@ def supply_chain():
         os.mkdir("client")
     os.chdir("client")
     special_client_download_cmd = ("../rstuf-in-toto-client.py download "
+                                   "--refresh-interval 0 "
                                    "test_project-0.0.2-py3-none-any.whl")
     print(special_client_download_cmd)
     subprocess.call(shlex.split(special_client_download_cmd))
@@ -226,7 +226,8 @@ def supply_chain():
     prompt_key("Adversarial changes in wheel successfully caught\n"
                "Force download compromised wheel and run it")
     client_force_download_cmd = (
-        "../rstuf-in-toto-client.py download --skip-in-toto-verify "
+        "../rstuf-in-toto-client.py download --refresh-interval 0 "
+        "--skip-in-toto-verify "
         "test_project-0.0.2-py3-none-any.whl")
     print(client_force_download_cmd)
     subprocess.call(shlex.split(client_force_download_cmd))
@@ -251,11 +252,8 @@ def clean():
     if os.path.exists("client"):
         rmtree("client")
     subprocess.call(
-        shlex.split(
-            "./rstuf-in-toto-client.py delete root.layout alice.pub "
-            "create.556caebd.link build.556caebd.link clone.776a00e2.link "
-            "update.776a00e2.link test_project-0.0.1-py3-none-any.whl "
-            "test_project-0.0.2-py3-none-any.whl"))
+        shlex.split("./rstuf-in-toto-client.py --wait delete "
+                    "--glob 'test_project-*'"))
 
 
 def main():
@@ -279,7 +277,11 @@ def main():
         global NO_PROMPT
         NO_PROMPT = True
 
-    supply_chain()
+    cache = DigestCache(DIGEST_CACHE)
+    try:
+        supply_chain(cache)
+    finally:
+        cache.save()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Put projects through the steps of a supply chain layout, concurrently.
+
+Every project directory goes through the steps of the layout, as set up in
+the pipeline configuration. Links and artifacts of each project are written
+to ``<out-dir>/<project name>``, with copies of the ``--evidence`` files,
+e.g. the signed layout and its keys, so that each of them can be published
+with ``rstuf-in-toto-client.py publish``.
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import sys
+
+from rstuf_in_toto.pipeline import load_pipeline, run_pipeline
+from rstuf_in_toto.record import DigestCache
+
+BASE_DIR = os.path.dirname(os.path.realpath(__file__))
+DEFAULT_CONFIG = os.path.join(BASE_DIR, "layouts", "pipeline.toml")
+DEFAULT_DIGEST_CACHE = os.path.join(BASE_DIR, ".record-cache.json")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-v",
+                        "--verbose",
+                        help="Output verbosity level (-v, -vv, ...)",
+                        action="count",
+                        default=0)
+    parser.add_argument("--layout",
+                        required=True,
+                        help="Layout in TOML to read the steps from")
+    parser.add_argument("--config",
+                        default=DEFAULT_CONFIG,
+                        help="Pipeline configuration of the steps")
+    parser.add_argument("--out-dir",
+                        default="dist",
+                        help="Directory for the links and artifacts")
+    parser.add_argument("--evidence",
+                        nargs="*",
+                        default=[],
+                        help="Files copied next to every project's links")
+    parser.add_argument("-j",
+                        "--jobs",
+                        type=int,
+                        default=os.cpu_count() or 1,
+                        help="Maximum number of concurrent steps")
+    parser.add_argument("--digest-cache",
+                        default=DEFAULT_DIGEST_CACHE,
+                        help="Cache of the digests of recorded files")
+    parser.add_argument("projects", nargs="+", help="Project directories")
+    args = parser.parse_args()
+
+    loglevel = [logging.WARNING, logging.INFO, logging.DEBUG]
+    logging.basicConfig(level=loglevel[min(args.verbose, 2)])
+
+    pipeline = load_pipeline(args.layout, args.config)
+    cache = DigestCache(args.digest_cache)
+    try:
+        results = run_pipeline(pipeline, args.projects, args.out_dir,
+                               args.jobs, cache)
+    finally:
+        cache.save()
+
+    failed = 0
+    for result in results:
+        if result.error:
+            failed += 1
+            print(f"{result.project}: {result.error}")
+            continue
+        for path in args.evidence:
+            shutil.copy(path, result.out_dir)
+        steps = ", ".join(
+            f"{step} ({len(links)})" for step, links in result.links.items())
+        print(f"{result.project}: {', '.join(result.artifacts)} with links "
+              f"of {steps} in {result.out_dir}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
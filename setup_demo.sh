@@ -13,11 +13,11 @@ pip install -r requirements.txt
 
 # Add environment variables
 echo "export ADD_TARGET_TOKEN=$( \
-    rstuf admin token generate -s write:targets \
+    rstuf admin token generate -s write:targets -s read:tasks \
     | jq '.access_token' \
     | tr -d '"')" >> venv/bin/activate
 echo "export DEL_TARGET_TOKEN=$( \
-    rstuf admin token generate -s delete:targets \
+    rstuf admin token generate -s delete:targets -s read:tasks \
     | jq '.access_token' \
     | tr -d '"')" >> venv/bin/activate
 
@@ -0,0 +1,59 @@
+import functools
+import http.server
+import importlib.util
+import os
+import shutil
+import sys
+import threading
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+sys.path.insert(0, os.path.join(BASE_DIR, "benchmarks"))
+from e2e import build_supply_chains  # noqa: E402
+from synthetic import build_repo  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    """The rstuf-in-toto-client.py script, loaded as a module"""
+    spec = importlib.util.spec_from_file_location(
+        "rstuf_in_toto_client",
+        os.path.join(BASE_DIR, "rstuf-in-toto-client.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def repository(tmp_path):
+    """
+    Serve a TUF repository of two wheels with their signed layout and links
+    in hash bins. Yields its URL, directory and target files.
+    """
+    targets, _ = build_supply_chains(str(tmp_path / "repo" / "targets"), 2,
+                                     2, 1000)
+    build_repo(str(tmp_path / "repo" / "metadata"), targets, bit_length=2)
+
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0),
+        functools.partial(QuietHandler, directory=str(tmp_path / "repo")))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/", tmp_path / "repo", targets
+    server.shutdown()
+    server.server_close()
+
+
+def trust_root(client, monkeypatch, repo, metadata_dir):
+    metadata_dir.mkdir()
+    shutil.copy(repo / "metadata" / "root.json", metadata_dir)
+    monkeypatch.setattr(client, "build_metadata_dir",
+                        lambda base_url: str(metadata_dir))
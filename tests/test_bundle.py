@@ -0,0 +1,102 @@
+import os
+import zipfile
+
+from conftest import BASE_DIR, trust_root
+from in_toto.models.metadata import Metablock
+from securesystemslib.signer import SSlibSigner
+from synthetic import build_repo, target_file
+
+from rstuf_in_toto.bundle import INDEX, TARGETS_PREFIX, Bundle
+from rstuf_in_toto.record import load_signing_key
+
+WHEEL = "pkg_0-1.0-py3-none-any.whl"
+BUILD_LINK = "pkg_0/build.556caebd.link"
+
+
+def make_bundle(client, monkeypatch, tmp_path, url, repo):
+    monkeypatch.setattr(client, "METADATA_URL", f"{url}metadata/")
+    monkeypatch.setattr(client, "TARGET_URL", f"{url}targets/")
+    trust_root(client, monkeypatch, repo, tmp_path / "online")
+    bundle_path = str(tmp_path / "bundle.zip")
+    assert client.bundle([WHEEL], bundle_path)
+    return bundle_path
+
+
+def go_offline(client, monkeypatch, tmp_path, repo):
+    """Trust only the root of ``repo``, without network"""
+    monkeypatch.setattr(client, "METADATA_URL", "http://127.0.0.1:9/")
+    monkeypatch.setattr(client, "TARGET_URL", "http://127.0.0.1:9/")
+    trust_root(client, monkeypatch, repo, tmp_path / "offline")
+    out = tmp_path / "out"
+    monkeypatch.setattr(client, "DOWNLOAD_DIR", str(out))
+    return out
+
+
+def tamper(bundle_path, tampered_path, name, data):
+    """Copy the bundle at ``bundle_path`` with ``data`` as ``name``"""
+    with zipfile.ZipFile(bundle_path) as src, \
+            zipfile.ZipFile(tampered_path, "w") as dst:
+        assert INDEX in src.namelist()
+        assert name in src.namelist()
+        for member in src.namelist():
+            dst.writestr(member,
+                         data if member == name else src.read(member))
+
+
+def test_bundle_round_trip(client, monkeypatch, tmp_path, repository):
+    url, repo, _ = repository
+    bundle_path = make_bundle(client, monkeypatch, tmp_path, url, repo)
+
+    with Bundle(bundle_path) as offline:
+        assert offline.targets == [WHEEL]
+        assert sorted(offline.files) == sorted([
+            WHEEL, "root.layout", "alice.pub", "pkg_0/create.556caebd.link",
+            BUILD_LINK
+        ])
+
+    out = go_offline(client, monkeypatch, tmp_path, repo)
+    assert client.install_bundle(bundle_path, [], False)
+    assert (out / WHEEL).read_bytes() == (repo / "targets" /
+                                          WHEEL).read_bytes()
+    assert os.listdir(out) == [WHEEL]
+
+
+def test_tampered_bundle_is_rejected(client, monkeypatch, tmp_path,
+                                     repository):
+    url, repo, _ = repository
+    bundle_path = make_bundle(client, monkeypatch, tmp_path, url, repo)
+    out = go_offline(client, monkeypatch, tmp_path, repo)
+
+    for name in (WHEEL, BUILD_LINK, "root.layout"):
+        tampered_path = str(tmp_path / "tampered.zip")
+        tamper(bundle_path, tampered_path, TARGETS_PREFIX + name,
+               b"backdoor")
+        assert not client.install_bundle(tampered_path, [], False)
+        assert not (out / WHEEL).exists()
+
+
+def test_bundle_failing_in_toto_is_rejected(client, monkeypatch, tmp_path,
+                                            repository):
+    url, repo, targets = repository
+    # Validly signed and published, but the build step did not produce
+    # the wheel
+    path = str(repo / "targets" / BUILD_LINK)
+    metadata = Metablock.load(path)
+    metadata.signed.products = {WHEEL: {"sha256": "0" * 64}}
+    metadata.signatures = []
+    metadata.create_signature(
+        SSlibSigner(
+            load_signing_key(os.path.join(BASE_DIR, "private_keys",
+                                          "alice"))))
+    metadata.dump(path)
+    with open(path, "rb") as f:
+        link = target_file(BUILD_LINK, f.read())
+    build_repo(str(repo / "metadata"),
+               [link if t.path == BUILD_LINK else t for t in targets],
+               bit_length=2)
+    bundle_path = make_bundle(client, monkeypatch, tmp_path, url, repo)
+    out = go_offline(client, monkeypatch, tmp_path, repo)
+
+    assert not client.install_bundle(bundle_path, [], False)
+    assert not (out / WHEEL).exists()
+    assert client.install_bundle(bundle_path, [], True)
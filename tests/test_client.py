@@ -0,0 +1,20 @@
+import os
+import subprocess
+import sys
+
+CLIENT = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.realpath(__file__))), "rstuf-in-toto-client.py")
+
+
+def run_client(*args, home):
+    return subprocess.run([sys.executable, CLIENT, *args],
+                          capture_output=True,
+                          text=True,
+                          env=dict(os.environ, HOME=str(home)),
+                          check=False)
+
+
+def test_daemon_flag_does_not_take_the_target(tmp_path):
+    proc = run_client("download", "--daemon", "foo.whl", home=tmp_path)
+    assert "Failed to reach daemon on " + str(tmp_path) in proc.stdout
+    assert "Failed to download ['foo.whl']" in proc.stderr
@@ -0,0 +1,33 @@
+import socket
+import threading
+
+import pytest
+
+from rstuf_in_toto.daemon import DaemonServer, request
+
+
+def test_refuses_to_replace_a_file(tmp_path):
+    path = tmp_path / "daemon.sock"
+    path.write_text("not a socket")
+
+    with pytest.raises(OSError, match="is not a socket"):
+        DaemonServer(str(path), lambda payload: {})
+    assert path.read_text() == "not a socket"
+
+
+def test_replaces_a_stale_socket(tmp_path):
+    path = str(tmp_path / "daemon.sock")
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+
+    server = DaemonServer(path, lambda payload: {"echo": payload["value"]})
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        assert request(path, {"value": 1}, timeout=5) == {"echo": 1}
+        with pytest.raises(OSError, match="already serving"):
+            DaemonServer(path, lambda payload: {})
+    finally:
+        server.shutdown()
+        server.server_close()
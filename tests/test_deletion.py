@@ -0,0 +1,103 @@
+from tuf.api.metadata import TargetFile
+
+from rstuf_in_toto.deletion import (artifact_version, chunk_paths,
+                                    plan_deletion, select_targets)
+
+
+def target(path, evidence=None):
+    custom = {"in-toto": evidence} if evidence else None
+    return TargetFile(4, {"sha256": "00" * 32}, path, {"custom": custom}
+                      if custom else None)
+
+
+TARGETS = {
+    "alice.pub": target("alice.pub"),
+    "root.layout": target("root.layout", ["alice.pub"]),
+    "build.1.link": target("build.1.link"),
+    "build.2.link": target("build.2.link"),
+    "pkg-0.0.1-py3-none-any.whl": target("pkg-0.0.1-py3-none-any.whl",
+                                         ["root.layout", "build.1.link"]),
+    "pkg-0.0.2-py3-none-any.whl": target("pkg-0.0.2-py3-none-any.whl",
+                                         ["root.layout", "build.2.link"]),
+    "sub/pkg-0.0.1.tar.gz": target("sub/pkg-0.0.1.tar.gz"),
+}
+
+
+def test_artifact_version():
+    assert artifact_version("pkg-0.0.1-py3-none-any.whl") == "0.0.1"
+    assert artifact_version("pkg-0.0.1-1-py3-none-any.whl") == "0.0.1"
+    assert artifact_version("sub/pkg-0.0.1.tar.gz") == "0.0.1"
+    assert artifact_version("root.layout") is None
+
+
+def test_select_targets():
+    assert select_targets(TARGETS, versions=["0.0.1"]) == [
+        "pkg-0.0.1-py3-none-any.whl", "sub/pkg-0.0.1.tar.gz"
+    ]
+    assert select_targets(TARGETS, globs=["*.whl"],
+                          versions=["0.0.2"]) == ["pkg-0.0.2-py3-none-any.whl"]
+    # * matches / too
+    assert select_targets(TARGETS, globs=["*.tar.gz"]) == [
+        "sub/pkg-0.0.1.tar.gz"
+    ]
+    assert select_targets(TARGETS, prefixes=["sub/"],
+                          versions=["0.0.2"]) == []
+
+
+def test_plan_keeps_shared_evidence():
+    plan = plan_deletion(TARGETS, ["pkg-0.0.1-py3-none-any.whl"])
+    assert plan.selected == ["pkg-0.0.1-py3-none-any.whl"]
+    assert plan.evidence == ["build.1.link"]
+    assert plan.kept == ["alice.pub", "root.layout"]
+    assert plan.referenced == []
+
+
+def test_plan_deletes_evidence_nothing_else_uses():
+    plan = plan_deletion(TARGETS, select_targets(TARGETS, globs=["*.whl"]))
+    assert plan.evidence == [
+        "alice.pub", "build.1.link", "build.2.link", "root.layout"
+    ]
+    assert plan.kept == []
+
+
+def test_plan_reports_referenced_evidence():
+    plan = plan_deletion(TARGETS, ["root.layout"])
+    assert plan.referenced == ["root.layout"]
+    assert plan.evidence == []
+
+
+def test_chunk_paths():
+    paths = [f"p{i}" for i in range(5)]
+    assert chunk_paths(paths, 2) == [["p0", "p1"], ["p2", "p3"], ["p4"]]
+    # Each path takes its quoted JSON string and a separator
+    assert chunk_paths(paths, 10, max_bytes=14) == [["p0", "p1"],
+                                                     ["p2", "p3"], ["p4"]]
+
+
+class NoTaskResponse:
+    status_code = 202
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        raise ValueError("not JSON")
+
+
+class FakeTransport:
+
+    def request(self, method, url, **kwargs):
+        return NoTaskResponse()
+
+
+def test_delete_fails_chunks_without_task(client, monkeypatch, capsys):
+    from rstuf_in_toto.tasks import TaskTracker
+
+    monkeypatch.setenv(client.DEL_TARGET_TOKEN, "token")
+    transport = FakeTransport()
+    tracker = TaskTracker(transport, client.TASK_URL)
+
+    assert not client.delete(["a", "b", "c"], transport, tracker,
+                             chunk_size=2)
+    assert capsys.readouterr().out.count("Failed to delete targets") == 2
+    assert tracker.tasks == []
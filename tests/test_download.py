@@ -0,0 +1,25 @@
+import os
+
+from conftest import trust_root
+
+
+def test_failed_file_only_fails_its_targets(client, monkeypatch, tmp_path,
+                                            repository, capsys):
+    url, repo, _ = repository
+    monkeypatch.setattr(client, "METADATA_URL", f"{url}metadata/")
+    monkeypatch.setattr(client, "TARGET_URL", f"{url}targets/")
+    trust_root(client, monkeypatch, repo, tmp_path / "metadata")
+    out = tmp_path / "out"
+    monkeypatch.setattr(client, "DOWNLOAD_DIR", str(out))
+    os.remove(repo / "targets" / "pkg_1" / "build.556caebd.link")
+
+    assert not client.download(
+        ["pkg_0-1.0-py3-none-any.whl", "pkg_1-1.0-py3-none-any.whl"],
+        True,
+        cache_size=0)
+
+    assert os.listdir(out) == ["pkg_0-1.0-py3-none-any.whl"]
+    output = capsys.readouterr().out
+    assert "Failed to download pkg_1/build.556caebd.link" in output
+    assert ("Skipping pkg_1-1.0-py3-none-any.whl, failed to download "
+            "pkg_1/build.556caebd.link") in output
@@ -0,0 +1,55 @@
+from tuf.api.metadata import TargetFile
+
+from rstuf_in_toto.evidence import EvidenceGraph, in_toto_evidence
+
+
+def target(path, evidence=None):
+    unrecognized = {"custom": {"in-toto": evidence}} if evidence else None
+    return TargetFile(4, {"sha256": "00" * 32}, path, unrecognized)
+
+
+def graph(**evidence):
+    return EvidenceGraph({
+        path: target(path, paths) for path, paths in evidence.items()
+    })
+
+
+def test_in_toto_evidence():
+    assert in_toto_evidence(target("a", ["b", "c"])) == ["b", "c"]
+    assert in_toto_evidence(target("a")) == []
+
+
+def test_closure_lists_shared_evidence_once():
+    g = graph(wheel=["layout", "link", "key"], layout=["key"], link=[],
+              key=[])
+    assert g.closure("wheel") == ["wheel", "layout", "link", "key"]
+    assert g.problem("wheel") is None
+
+
+def test_missing_evidence():
+    g = graph(wheel=["layout", "link"], layout=["key"])
+    assert g.problem("other") == "Target other not found"
+    assert g.problem("wheel") == "Evidence link, key of wheel not found"
+
+
+def test_cycle_is_detected():
+    g = graph(wheel=["layout"], layout=["key"], key=["layout"], other=[])
+    assert g.cyclic() == {"wheel", "layout", "key"}
+    assert g.cycle("wheel") == ["layout", "key", "layout"]
+    assert g.cycle("other") is None
+    assert g.problem("wheel") == ("Evidence of wheel has a cycle: "
+                                  "layout -> key -> layout")
+
+
+def test_self_reference_is_a_cycle():
+    g = graph(layout=["layout"])
+    assert g.cycle("layout") == ["layout", "layout"]
+
+
+def test_by_layout():
+    g = graph(a=["layout-1", "link"], b=["layout-1"], c=["layout-2"], d=[])
+    assert g.by_layout(["a", "b", "c", "d"]) == {
+        "layout-1": ["a", "b"],
+        "layout-2": ["c"],
+        None: ["d"],
+    }
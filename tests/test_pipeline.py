@@ -0,0 +1,125 @@
+import json
+import os
+import sys
+
+from in_toto.models.metadata import Metadata
+
+from rstuf_in_toto.pipeline import load_pipeline, run_pipeline
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+LAYOUT = """
+[[steps]]
+name = "create"
+expected_products = ["CREATE *"]
+pubkeys = ["alice"]
+
+[[steps]]
+name = "update"
+expected_materials = ["MATCH * WITH PRODUCTS FROM create"]
+pubkeys = ["alice"]
+
+[[steps]]
+name = "build"
+expected_materials = ["MATCH * WITH PRODUCTS FROM update"]
+pubkeys = ["alice"]
+
+[[steps]]
+name = "lint"
+expected_materials = ["MATCH * WITH PRODUCTS FROM create"]
+pubkeys = ["alice"]
+"""
+
+CONFIG = """
+artifacts = ["*.whl"]
+
+[steps.create]
+key = {key}
+products = ["main.py"]
+
+[steps.update]
+key = {key}
+materials = ["main.py"]
+products = ["main.py"]
+
+[steps.update.changes]
+"main.py" = "main.py.changed"
+
+[steps.build]
+key = {key}
+materials = ["main.py"]
+products = ["*.whl"]
+command = {build}
+
+[steps.lint]
+key = {key}
+materials = ["main.py"]
+command = {lint}
+"""
+
+
+def make_pipeline(tmp_path, build_exit=0):
+    (tmp_path / "layout.toml").write_text(LAYOUT)
+    (tmp_path / "main.py.changed").write_text("print('changed')\n")
+    build = [
+        sys.executable, "-c",
+        f"open('demo-py3-none-any.whl', 'w').close(); exit({build_exit})"
+    ]
+    # Fails if it sees the change of update, which runs at the same time
+    lint = [
+        sys.executable, "-c", "import time; time.sleep(0.5); "
+        "exit(open('main.py').read() != \"print('original')\\n\")"
+    ]
+    (tmp_path / "pipeline.toml").write_text(
+        CONFIG.format(key=json.dumps(
+            os.path.join(BASE_DIR, "private_keys", "alice")),
+                      build=json.dumps(build),
+                      lint=json.dumps(lint)))
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "main.py").write_text("print('original')\n")
+    return (load_pipeline(str(tmp_path / "layout.toml"),
+                          str(tmp_path / "pipeline.toml")), project)
+
+
+def test_project_is_left_untouched(tmp_path):
+    pipeline, project = make_pipeline(tmp_path)
+    out = tmp_path / "dist"
+
+    [result] = run_pipeline(pipeline, [str(project)], str(out), 2)
+
+    assert result.error is None
+    assert result.artifacts == ["demo-py3-none-any.whl"]
+    assert sorted(result.links) == ["build", "create", "lint", "update"]
+    assert os.listdir(project) == ["main.py"]
+    assert (project / "main.py").read_text() == "print('original')\n"
+    assert sorted(os.listdir(out)) == ["project"]
+
+
+def test_failed_step_only_skips_its_dependents(tmp_path):
+    pipeline, project = make_pipeline(tmp_path, build_exit=1)
+
+    [result] = run_pipeline(pipeline, [str(project)],
+                            str(tmp_path / "dist"), 2)
+
+    assert result.error.startswith("Step build failed")
+    assert result.artifacts == []
+    # lint does not depend on build and still ran
+    assert sorted(result.links) == ["build", "create", "lint", "update"]
+
+
+def test_steps_only_see_the_steps_they_depend_on(tmp_path):
+    pipeline, project = make_pipeline(tmp_path)
+
+    [result] = run_pipeline(pipeline, [str(project)],
+                            str(tmp_path / "dist"), 4)
+
+    def link(step):
+        [path] = result.links[step]
+        return Metadata.load(path).signed
+
+    assert result.error is None
+    # lint runs next to update, but only depends on create
+    assert link("lint").materials == link("create").products
+    assert link("build").materials == link("update").products
+    assert link("update").products != link("create").products
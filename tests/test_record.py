@@ -0,0 +1,80 @@
+import os
+
+from in_toto.models.metadata import Metadata
+from in_toto.runlib import record_artifacts_as_dict as in_toto_record
+from securesystemslib import interface
+
+from rstuf_in_toto.record import (DigestCache, load_signing_key,
+                                  record_artifacts, record_start, record_stop,
+                                  run_step)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def test_links_are_signed_with_the_key(tmp_path):
+    key = load_signing_key(os.path.join(BASE_DIR, "private_keys", "alice"))
+    pubkey = interface.import_rsa_publickey_from_file(
+        os.path.join(BASE_DIR, "layouts", "keys", "alice.pub"))
+    (tmp_path / "main.py").write_text("print('hello')\n")
+
+    link = run_step("create", key, products=["main.py"],
+                    base_path=str(tmp_path),
+                    metadata_directory=str(tmp_path))
+    metadata = Metadata.load(link)
+    metadata.verify_signature(pubkey)
+    assert list(metadata.signed.products) == ["main.py"]
+
+    record_start("update", key, ["main.py"], str(tmp_path))
+    (tmp_path / "main.py").write_text("print('changed')\n")
+    link = record_stop("update", key, ["main.py"], str(tmp_path),
+                       str(tmp_path))
+    metadata = Metadata.load(link)
+    metadata.verify_signature(pubkey)
+    assert (metadata.signed.materials["main.py"] !=
+            metadata.signed.products["main.py"])
+
+
+def test_digest_cache_skips_racy_files(tmp_path):
+    path = tmp_path / "file"
+    path.write_text("data")
+    cache = DigestCache(str(tmp_path / "cache.json"))
+    first = cache.digest(str(path))
+    # Just written, so hashed again rather than trusted
+    assert cache.digest(str(path)) == first
+    assert cache.misses == 2
+
+    os.utime(path, ns=(0, 0))
+    cache.digest(str(path))
+    assert cache.digest(str(path)) == first
+    assert cache.hits == 1
+
+
+
+def test_digest_cache_drops_removed_files(tmp_path):
+    kept = tmp_path / "kept"
+    removed = tmp_path / "removed"
+    for path in (kept, removed):
+        path.write_text("data")
+        os.utime(path, ns=(0, 0))
+    cache = DigestCache(str(tmp_path / "cache.json"))
+    cache.digest(str(kept))
+    cache.digest(str(removed))
+    cache.save()
+    removed.unlink()
+
+    cache = DigestCache(str(tmp_path / "cache.json"))
+    cache.save()
+    cache = DigestCache(str(tmp_path / "cache.json"))
+    assert list(cache._entries) == [str(kept)]
+
+def test_symlinks_are_recorded_like_in_toto(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "main.py").write_text("print('hello')\n")
+    (tmp_path / "src" / "loop").symlink_to(tmp_path / "src")
+    (tmp_path / "linked").symlink_to(tmp_path / "src")
+    (tmp_path / "main_link.py").symlink_to(tmp_path / "src" / "main.py")
+    (tmp_path / "broken").symlink_to(tmp_path / "missing")
+
+    expected = in_toto_record(["."], base_path=str(tmp_path))
+    assert record_artifacts(["."], str(tmp_path)) == expected
+    assert sorted(expected) == ["main_link.py", "src/main.py"]
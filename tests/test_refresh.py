@@ -0,0 +1,56 @@
+import os
+
+from rstuf_in_toto.refresh import (STAMP_FILE, discard_refresh,
+                                   refresh_updater)
+
+
+class FakeTrustedSet:
+
+    def update_timestamp(self, data):
+        pass
+
+    def update_snapshot(self, data, trusted=False):
+        pass
+
+    def update_targets(self, data):
+        pass
+
+
+class FakeUpdater:
+
+    def __init__(self, log):
+        self.log = log
+        self._trusted_set = FakeTrustedSet()
+
+    def _load_local_metadata(self, role):
+        return b"{}"
+
+    def refresh(self):
+        self.log.append("refresh")
+
+
+def test_refresh_interval_0_always_refreshes(tmp_path):
+    log = []
+    for _ in range(3):
+        refresh_updater(lambda: FakeUpdater(log), str(tmp_path), 0)
+    assert log == ["refresh"] * 3
+
+
+def test_recent_refresh_is_reused(tmp_path):
+    log = []
+    refresh_updater(lambda: FakeUpdater(log), str(tmp_path), 60)
+    refresh_updater(lambda: FakeUpdater(log), str(tmp_path), 60)
+    assert log == ["refresh"]
+    assert os.path.exists(tmp_path / STAMP_FILE)
+
+
+def test_discard_refresh_forces_network_refresh(tmp_path):
+    log = []
+    refresh_updater(lambda: FakeUpdater(log), str(tmp_path), 60)
+    discard_refresh(str(tmp_path))
+    refresh_updater(lambda: FakeUpdater(log), str(tmp_path), 60)
+    assert log == ["refresh", "refresh"]
+
+
+def test_discard_refresh_without_stamp(tmp_path):
+    discard_refresh(str(tmp_path))
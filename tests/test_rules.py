@@ -0,0 +1,105 @@
+import random
+import re
+
+import pytest
+from in_toto import verifylib
+from in_toto.exceptions import RuleVerificationError
+from in_toto.models.layout import Step
+from in_toto.models.link import Link
+
+from rstuf_in_toto import rules
+
+PATHS = [
+    "README.md", "pyproject.toml", "src/main.py", "src/util.py",
+    "src/sub/deep.py", "pkg-1.0-py3-none-any.whl", "docs/index.txt"
+]
+PATTERNS = [
+    "*", "src/*", "*.py", "README.md", "src/main.py", "pkg-*.whl", "?rc/*",
+    "[ds]*", "sub/*", "main.py", "*/deep.py", "missing"
+]
+
+
+def random_artifacts(rng):
+    return {
+        path: {"sha256": rng.choice("ab") * 64}
+        for path in rng.sample(PATHS, rng.randint(0, len(PATHS)))
+    }
+
+
+def random_rule(rng):
+    kind = rng.choice(["MATCH", "MATCH", "MATCH", "CREATE", "DELETE",
+                       "MODIFY", "ALLOW", "DISALLOW", "REQUIRE"])
+    pattern = rng.choice(PATTERNS)
+    if kind == "REQUIRE":
+        return [kind, rng.choice(PATHS)]
+    if kind != "MATCH":
+        return [kind, pattern]
+    rule = [kind, pattern]
+    if rng.random() < 0.3:
+        rule += ["IN", "src"]
+    rule += ["WITH", rng.choice(["MATERIALS", "PRODUCTS"])]
+    if rng.random() < 0.3:
+        rule += ["IN", "src"]
+    return rule + ["FROM", rng.choice(["create", "build", "absent"])]
+
+
+def outcome(verify, items, links):
+    try:
+        verify(items, links)
+    except RuleVerificationError as e:
+        # Artifacts are listed in the order of the implementation
+        line = str(e).splitlines()[0]
+        return (re.sub(r"(set\(\)|[[{]).*", "", line),
+                sorted(re.findall(r"'([^']*)'", line)))
+    return None
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_indexed_rules_match_verifylib(seed):
+    rng = random.Random(seed)
+    links = {
+        name: Link(name=name,
+                   materials=random_artifacts(rng),
+                   products=random_artifacts(rng))
+        for name in ("create", "build")
+    }
+    items = [
+        Step(name=name,
+             expected_materials=[
+                 random_rule(rng) for _ in range(rng.randint(0, 5))
+             ],
+             expected_products=[
+                 random_rule(rng) for _ in range(rng.randint(0, 5))
+             ]) for name in links
+    ]
+
+    assert (outcome(rules.verify_all_item_rules, items, links) ==
+            outcome(verifylib.verify_all_item_rules, items, links))
+
+
+def test_layout_rules_of_the_demo():
+    cloned = {
+        "README.md": {"sha256": "a" * 64},
+        "pyproject.toml": {"sha256": "b" * 64},
+        "src/main.py": {"sha256": "c" * 64},
+    }
+    updated = dict(cloned, **{"src/main.py": {"sha256": "d" * 64}})
+    links = {
+        "clone": Link(name="clone", products=cloned),
+        "update": Link(name="update", materials=cloned, products=updated),
+    }
+    update = Step(name="update",
+                  expected_materials=[
+                      ["MATCH", "src/*", "WITH", "PRODUCTS", "FROM", "clone"],
+                      ["ALLOW", "*"],
+                  ],
+                  expected_products=[
+                      ["MODIFY", "src/main.py"],
+                      ["MATCH", "*", "WITH", "MATERIALS", "FROM", "update"],
+                      ["DISALLOW", "*"],
+                  ])
+    rules.verify_all_item_rules([update], links)
+
+    links["update"].products["backdoor.py"] = {"sha256": "e" * 64}
+    with pytest.raises(RuleVerificationError):
+        rules.verify_all_item_rules([update], links)
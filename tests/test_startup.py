@@ -0,0 +1,51 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+CLIENT = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.realpath(__file__))), "rstuf-in-toto-client.py")
+HEAVY_MODULES = ("tuf", "requests", "urllib3", "in_toto", "securesystemslib",
+                 "cryptography", "iso8601")
+
+# Run the client as a script and list the heavy modules it imported
+PROBE = """
+import json, os, runpy, sys
+sys.argv = sys.argv[1:]
+sys.path.insert(0, os.path.dirname(sys.argv[0]))
+try:
+    runpy.run_path(sys.argv[0], run_name="__main__")
+except SystemExit:
+    pass
+heavy = {name.split(".")[0] for name in sys.modules} & set(HEAVY)
+print(json.dumps(sorted(heavy)), file=sys.stderr)
+"""
+
+
+def imported_heavy_modules(*args):
+    proc = subprocess.run(
+        [sys.executable, "-c",
+         PROBE.replace("HEAVY", repr(HEAVY_MODULES)), CLIENT, *args],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=False)
+    return json.loads(proc.stderr.splitlines()[-1])
+
+
+@pytest.mark.parametrize("args", [
+    ["--help"],
+    ["download", "--help"],
+    ["upload-file", "--help"],
+])
+def test_light_commands_do_not_import_heavy_modules(args):
+    assert imported_heavy_modules(*args) == []
+
+
+def test_daemon_client_does_not_import_heavy_modules(tmp_path):
+    # No daemon listens there, the thin client fails fast
+    socket_path = str(tmp_path / "missing.sock")
+    assert imported_heavy_modules("download", "--daemon", "--socket",
+                                  socket_path, "target") == []
@@ -0,0 +1,82 @@
+import pytest
+
+from rstuf_in_toto.transport import TransportFetcher
+
+URL = "http://127.0.0.1:8080/timestamp.json"
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, body=b"", headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def iter_content(self, chunk_size):
+        yield self.body
+
+    def raise_for_status(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeTransport:
+    """Answer 304 to any conditional request, as a lenient server would"""
+
+    def __init__(self):
+        self.requests = []
+        self.responses = []
+
+    def request(self, method, url, **kwargs):
+        headers = kwargs.get("headers") or {}
+        self.requests.append(headers)
+        if headers:
+            return FakeResponse(304)
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def fetcher(tmp_path):
+    return TransportFetcher(FakeTransport(), cache_dir=str(tmp_path))
+
+
+def test_strong_etag_is_revalidated(fetcher):
+    fetcher.transport.responses.append(
+        FakeResponse(200, b"v1", {"ETag": '"abc"'}))
+    assert b"".join(fetcher.fetch(URL)) == b"v1"
+    assert b"".join(fetcher.fetch(URL)) == b"v1"
+    assert fetcher.transport.requests[-1] == {"If-None-Match": '"abc"'}
+
+
+def test_last_modified_is_not_used(fetcher):
+    # A timestamp republished within the same second of Last-Modified
+    # must not be answered with the kept body
+    headers = {"Last-Modified": "Sat, 17 Oct 2026 16:00:00 GMT"}
+    fetcher.transport.responses += [
+        FakeResponse(200, b"v1", headers),
+        FakeResponse(200, b"v2", headers),
+    ]
+    assert b"".join(fetcher.fetch(URL)) == b"v1"
+    assert b"".join(fetcher.fetch(URL)) == b"v2"
+    assert fetcher.transport.requests == [{}, {}]
+
+
+def test_weak_etag_is_not_used(fetcher):
+    fetcher.transport.responses += [
+        FakeResponse(200, b"v1", {"ETag": 'W/"abc"'}),
+        FakeResponse(200, b"v2", {"ETag": 'W/"abc"'}),
+    ]
+    assert b"".join(fetcher.fetch(URL)) == b"v1"
+    assert b"".join(fetcher.fetch(URL)) == b"v2"
+
+
+def test_other_files_are_not_kept(fetcher):
+    url = "http://127.0.0.1:8080/1.snapshot.json"
+    fetcher.transport.responses += [
+        FakeResponse(200, b"v1", {"ETag": '"abc"'}),
+        FakeResponse(200, b"v2", {"ETag": '"abc"'}),
+    ]
+    assert b"".join(fetcher.fetch(url)) == b"v1"
+    assert b"".join(fetcher.fetch(url)) == b"v2"
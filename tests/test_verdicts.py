@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from rstuf_in_toto.verdicts import VerdictCache
+
+LAYOUT_EXPIRES = "2999-01-01T00:00:00Z"
+
+
+def test_valid_verdict_is_kept(tmp_path):
+    cache = VerdictCache(str(tmp_path), 60)
+    cache.put("key", "main.py", LAYOUT_EXPIRES)
+
+    assert cache.get("key")["target"] == "main.py"
+
+
+def test_expired_layout_drops_the_verdict(tmp_path):
+    cache = VerdictCache(str(tmp_path), 60)
+    cache.put("key", "main.py", "2000-01-01T00:00:00Z")
+
+    assert cache.get("key") is None
+    assert not (tmp_path / "key.json").exists()
+
+
+@pytest.mark.parametrize("verdict", [
+    "not json",
+    json.dumps([]),
+    json.dumps({"target": "main.py"}),
+    json.dumps({"verified_at": 0, "layout_expires": None}),
+    json.dumps({"verified_at": "0", "layout_expires": LAYOUT_EXPIRES}),
+    json.dumps({"verified_at": 0, "layout_expires": "tomorrow"}),
+])
+def test_malformed_verdict_is_dropped(tmp_path, verdict):
+    cache = VerdictCache(str(tmp_path), 60)
+    (tmp_path / "key.json").write_text(verdict)
+
+    assert cache.get("key") is None
+    assert not (tmp_path / "key.json").exists()
@@ -0,0 +1,173 @@
+import os
+import shutil
+from unittest import mock
+
+import pytest
+from in_toto.models.layout import Layout, Step
+from in_toto.exceptions import SignatureVerificationError
+from in_toto.models.metadata import Envelope, Metablock, Metadata
+from securesystemslib import interface
+from securesystemslib.signer import SSlibSigner
+
+from rstuf_in_toto import verify
+from rstuf_in_toto.record import load_signing_key, run_step
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+PRIVATE_KEY = os.path.join(BASE_DIR, "private_keys", "alice")
+PUBLIC_KEY = os.path.join(BASE_DIR, "layouts", "keys", "alice.pub")
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    verify._key_cache.clear()
+    verify._layout_cache.clear()
+    verify._public_keys.clear()
+    verify.set_cache_dir(None)
+    yield
+    verify.set_cache_dir(None)
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    """A workspace with a signed layout, its key, a link and the target"""
+    key = load_signing_key(PRIVATE_KEY)
+    pubkey = interface.import_rsa_publickey_from_file(PUBLIC_KEY)
+    layout = Layout(keys={pubkey["keyid"]: pubkey},
+                    steps=[
+                        Step(name="create",
+                             pubkeys=[pubkey["keyid"]],
+                             expected_products=[["CREATE", "main.py"],
+                                                ["DISALLOW", "*"]])
+                    ])
+    metadata = Metablock(signed=layout)
+    metadata.create_signature(SSlibSigner(key))
+    metadata.dump(str(tmp_path / "root.layout"))
+    shutil.copy(PUBLIC_KEY, tmp_path / "alice.pub")
+
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "main.py").write_text("print('hello')\n")
+    run_step("create", key, products=["main.py"], base_path=str(project),
+             metadata_directory=str(tmp_path))
+    shutil.move(project / "main.py", tmp_path / "main.py")
+    project.rmdir()
+    return tmp_path
+
+
+def verify_main(workspace, trusted=None):
+    return verify.verify_workspace("main.py", str(workspace),
+                                   str(workspace / "root.layout"),
+                                   [str(workspace / "alice.pub")], trusted)
+
+
+def test_verify_workspace(workspace):
+    result = verify_main(workspace)
+    assert result.success, result.error
+
+    trusted = verify.load_trusted_layout(str(workspace / "root.layout"),
+                                         [str(workspace / "alice.pub")])
+    result = verify_main(workspace, trusted)
+    assert result.success, result.error
+
+
+def test_tampered_link_fails(workspace):
+    [link] = workspace.glob("create.*.link")
+    link.write_text(link.read_text().replace("main.py", "evil.py"))
+    result = verify_main(workspace)
+    assert not result.success
+    assert "ThresholdVerificationError" in result.error
+
+
+@pytest.mark.parametrize("content", ["not json", "{}", '{"signed": {}}'])
+def test_malformed_layout_fails_the_target(workspace, content):
+    (workspace / "root.layout").write_text(content)
+    result = verify_main(workspace)
+    assert not result.success
+    assert result.error
+
+
+@pytest.mark.parametrize("content", ["not json", "{}"])
+def test_malformed_link_fails_the_target(workspace, content):
+    [link] = workspace.glob("create.*.link")
+    link.write_text(content)
+    result = verify_main(workspace)
+    assert not result.success
+    assert result.error
+
+
+def test_malformed_layout_is_not_trusted(client, workspace):
+    (workspace / "root.layout").write_text("not json")
+
+    class Info:
+
+        def __init__(self, custom):
+            self.custom = custom
+
+    infos = {
+        "main.py": Info({"in-toto": ["root.layout"]}),
+        "root.layout": Info({"in-toto": ["alice.pub"]}),
+    }
+    paths = {
+        "root.layout": str(workspace / "root.layout"),
+        "alice.pub": str(workspace / "alice.pub"),
+    }
+    layouts = client.trusted_layouts(["main.py"], infos, paths)
+    assert isinstance(layouts["root.layout"], str)
+
+
+def test_verify_signature_matches_in_toto(workspace):
+    pubkey = interface.import_rsa_publickey_from_file(PUBLIC_KEY)
+    [link] = workspace.glob("create.*.link")
+    metadata = Metadata.load(str(link))
+    metadata.verify_signature(pubkey)
+    verify.verify_signature(metadata, pubkey)
+    verify.verify_signature(metadata, pubkey)
+    assert len(verify._public_keys) == 1
+
+    metadata.signed.name = "tampered"
+    with pytest.raises(SignatureVerificationError):
+        metadata.verify_signature(pubkey)
+    with pytest.raises(SignatureVerificationError):
+        verify.verify_signature(metadata, pubkey)
+
+    metadata.signatures[0]["keyid"] = "0" * 64
+    with pytest.raises(SignatureVerificationError):
+        verify.verify_signature(metadata, pubkey)
+
+
+def test_verify_dsse_link(workspace):
+    key = load_signing_key(PRIVATE_KEY)
+    pubkey = interface.import_rsa_publickey_from_file(PUBLIC_KEY)
+    [link] = workspace.glob("create.*.link")
+    envelope = Envelope.from_signable(Metadata.load(str(link)).signed)
+    envelope.create_signature(SSlibSigner(key))
+    envelope.dump(str(link))
+
+    metadata = Metadata.load(str(link))
+    assert isinstance(metadata, Envelope)
+    verify.verify_signature(metadata, pubkey)
+    assert verify_main(workspace).success
+
+    envelope.signatures[0].signature = "00" * 384
+    envelope.dump(str(link))
+    result = verify_main(workspace)
+    assert not result.success
+    assert result.error.startswith("ThresholdVerificationError")
+
+
+def test_signature_checks_are_cached_on_disk(workspace, tmp_path_factory):
+    cache_dir = tmp_path_factory.mktemp("cache")
+    verify.set_cache_dir(str(cache_dir))
+    layout_path = str(workspace / "root.layout")
+    key_paths = [str(workspace / "alice.pub")]
+    verify.load_trusted_layout(layout_path, key_paths)
+    assert len(os.listdir(cache_dir / "signatures")) == 1
+    assert len(os.listdir(cache_dir / "keys")) == 1
+
+    # A later run only parses the layout
+    verify._key_cache.clear()
+    verify._layout_cache.clear()
+    with mock.patch.object(verify.verifylib,
+                           "verify_metadata_signatures") as check:
+        verify.load_trusted_layout(layout_path, key_paths)
+    check.assert_not_called()